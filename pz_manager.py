@@ -8,12 +8,17 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from pzmanager.core import PZManager
 from pzmanager.utils import run_cmd
+from pzmanager import map_footprint
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="PZ Manager")
-    parser.add_argument("action", nargs="?", default=None, help="Action to perform (start, stop, restart, status, logs, install, backup)")
+    parser.add_argument("action", nargs="?", default=None, help="Action to perform (start, stop, restart, status, logs, install, backup, footprint)")
     parser.add_argument("--instance", default=None, help="Target specific server instance")
     parser.add_argument("--scheduler", action="store_true", help="Run the scheduler process")
+    parser.add_argument("--all", action="store_true", help="With --scheduler: schedule every instance in one process")
+    parser.add_argument("--top", type=int, default=10, help="With footprint: number of regions to list")
+    parser.add_argument("--out", default=None, help="With footprint: write per-cell sizes to a .csv or .json file")
+    parser.add_argument("--rescan", action="store_true", help="With footprint: ignore the cached scan")
     
     args = parser.parse_args()
     
@@ -28,7 +33,9 @@ if __name__ == "__main__":
     try:
         app = PZManager(interactive=is_interactive, instance_name=args.instance)
         
-        if args.scheduler:
+        if args.scheduler and args.all:
+            app.run_scheduler_all()
+        elif args.scheduler:
             app.run_scheduler()
         elif args.action:
             cmd = args.action
@@ -41,6 +48,7 @@ if __name__ == "__main__":
             elif cmd == "logs": run_cmd(f"journalctl -u {svc} -f", shell=True, interactive=False)
             elif cmd == "install": app.install_server()
             elif cmd == "backup": app.submenu_backup()
+            elif cmd == "footprint": map_footprint.run_report(app, top=args.top, out=args.out, rescan=args.rescan)
             else:
                 print(f"Unknown command: {cmd}")
         else:
@@ -0,0 +1,190 @@
+import os
+import json
+import gzip
+import bz2
+import lzma
+import tarfile
+import time
+import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# In-process tar writer that compresses on several cores.
+#
+# The tar stream is cut into fixed size blocks and every block is compressed
+# as an independent gzip/bzip2/xz stream in a process pool. Concatenated
+# streams are valid for all three formats, so 'tar -xf' extracts the result
+# as usual. Python's tarfile does not: its 'r|*' mode stops after the first
+# stream, so readers wrap the file in gzip.GzipFile/bz2.BZ2File/lzma.LZMAFile
+# (which read every stream) and open that with 'r|'.
+#
+# Because every block starts a fresh stream, a member can be read by seeking
+# to its block and decompressing from there. The writer saves a sidecar index
+# (<archive>.idx.json.gz) with the compressed offset of every block and the
+# data offset of every member, which partial restores use.
+
+BLOCK_SIZE = 4 * 1024 * 1024
+# Workers are spawned, not forked: snapshot backups call write_archive from a
+# background thread, and forking a process that runs other threads can copy a
+# lock some thread held at that moment into the child, where nobody releases it.
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+INDEX_SUFFIX = ".idx.json.gz"
+INDEX_VERSION = 1
+
+# codec -> (archive extension, valid levels)
+CODECS = {
+    "gzip": (".tar.gz", range(1, 10)),
+    "bz2": (".tar.bz2", range(1, 10)),
+    "xz": (".tar.xz", range(0, 10)),
+}
+
+def get_extension(codec):
+    return CODECS.get(codec, CODECS["gzip"])[0]
+
+def _compress_block(codec, level, data):
+    # Runs in a worker process
+    if codec == "bz2":
+        return bz2.compress(data, compresslevel=level)
+    if codec == "xz":
+        return lzma.compress(data, preset=level)
+    return gzip.compress(data, compresslevel=level)
+
+class _BlockWriter:
+    """ File-like sink for tarfile that hands full blocks to the pool and writes results in order. """
+    def __init__(self, out, pool, codec, level, max_pending):
+        self.out = out
+        self.pool = pool
+        self.codec = codec
+        self.level = level
+        self.max_pending = max_pending
+        self.buf = bytearray()
+        self.pending = deque()
+        self.raw_bytes = 0
+        self.written = 0
+        self.digest = hashlib.sha256()
+        self.block_offsets = [] # compressed offset of each block
+
+    def write(self, data):
+        self.buf += data
+        while len(self.buf) >= BLOCK_SIZE:
+            self._submit(bytes(self.buf[:BLOCK_SIZE]))
+            del self.buf[:BLOCK_SIZE]
+        return len(data)
+
+    def _submit(self, block):
+        self.raw_bytes += len(block)
+        self.pending.append(self.pool.submit(_compress_block, self.codec, self.level, block))
+        # Bound memory: wait for the oldest block once enough are in flight
+        while len(self.pending) > self.max_pending:
+            self._drain_one()
+
+    def _drain_one(self):
+        data = self.pending.popleft().result()
+        self.block_offsets.append(self.written)
+        self.out.write(data)
+        self.digest.update(data)
+        self.written += len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.buf:
+            self._submit(bytes(self.buf))
+            self.buf = bytearray()
+        while self.pending:
+            self._drain_one()
+
+def _padded(size):
+    return (size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+
+def _add_member(tar, full, arcname, members):
+    """ Adds one path without recursing and records it in the member index. """
+    ti = tar.gettarinfo(full, arcname)
+    if ti is None:
+        return False # sockets, fifos...
+    if ti.isreg():
+        with open(full, 'rb') as f:
+            tar.addfile(ti, f)
+        # Data sits right before the current offset, padded to 512 bytes
+        members[arcname] = ["f", tar.offset - _padded(ti.size), ti.size, ti.mode, ti.mtime]
+    else:
+        tar.addfile(ti)
+        if ti.isdir():
+            members[arcname] = ["d", 0, 0, ti.mode, ti.mtime]
+        elif ti.issym():
+            members[arcname] = ["l", 0, 0, ti.mode, ti.mtime, ti.linkname]
+        elif ti.islnk():
+            members[arcname] = ["h", 0, 0, ti.mode, ti.mtime, ti.linkname]
+    return True
+
+def read_index(archive):
+    """ Returns the member index of an archive, or None if it has none. """
+    path = archive + INDEX_SUFFIX
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_index(archive, codec, block_offsets, members):
+    path = archive + INDEX_SUFFIX
+    tmp = path + ".tmp"
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "codec": codec,
+            "block_size": BLOCK_SIZE,
+            "blocks": block_offsets,
+            "members": members
+        }, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+def write_archive(data_dir, dest, codec="gzip", level=6, workers=0):
+    """
+    Writes data_dir (stored as its basename, like 'tar -C parent base') to dest,
+    plus its member index. workers=0 uses every core. Returns a stats dict.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown backup codec: {codec}")
+    if level not in CODECS[codec][1]:
+        raise ValueError(f"Invalid level {level} for {codec}")
+    workers = workers or os.cpu_count() or 1
+
+    data_dir = os.path.abspath(data_dir)
+    parent = os.path.dirname(data_dir)
+    start = time.time()
+    files = 0
+    members = {}
+    tmp = dest + ".part"
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CONTEXT) as pool, open(tmp, 'wb') as out:
+            sink = _BlockWriter(out, pool, codec, level, max_pending=workers * 2)
+            with tarfile.open(fileobj=sink, mode='w|', format=tarfile.GNU_FORMAT) as tar:
+                for root, dnames, fnames in os.walk(data_dir):
+                    dnames.sort()
+                    _add_member(tar, root, os.path.relpath(root, parent), members)
+                    # Symlinked dirs are not descended into, store them as links
+                    for name in sorted(fnames) + [d for d in dnames if os.path.islink(os.path.join(root, d))]:
+                        full = os.path.join(root, name)
+                        try:
+                            if _add_member(tar, full, os.path.relpath(full, parent), members):
+                                files += 1
+                        except OSError as e:
+                            print(f"[Backup] Skipping {full}: {e}")
+            sink.close()
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+    os.replace(tmp, dest)
+    _write_index(dest, codec, sink.block_offsets, members)
+    return {
+        "files": files,
+        "raw_bytes": sink.raw_bytes,
+        "written": sink.written,
+        "sha256": sink.digest.hexdigest(),
+        "seconds": time.time() - start,
+        "workers": workers
+    }
@@ -0,0 +1,143 @@
+import os
+import re
+import json
+from .const import CONFIG_DIR
+from .utils import atomic_write_json, file_lock
+from . import backup_store
+
+# Persistent index of backup files, so menus don't glob + stat the backup dir
+# on every redraw.
+#
+# Layout of backup_catalog.json:
+#   { "dirs": { <backup_dir>: { "mtime_ns": <dir mtime at last reconcile>,
+#                               "entries": { <file name>: {size, timestamp, instance,
+#                                                          type, file_count, checksum} } } } }
+#
+# Backups written by PZ Manager are recorded directly. Anything else (files
+# copied in or deleted by hand) is picked up by reconcile(), which only lists
+# the directory when its mtime changed since the last pass.
+
+CATALOG_FILE = os.path.join(CONFIG_DIR, "backup_catalog.json")
+LOCK_FILE = CATALOG_FILE + ".lock"
+
+BACKUP_NAME_RE = re.compile(
+    r'^pz_backup_(?P<instance>.+?)_(?P<auto>auto_)?(?P<ts>\d{8}_\d{6})'
+    r'(?P<ext>\.tar\.gz|\.tar\.bz2|\.tar\.xz|\.manifest\.json\.gz)$'
+)
+
+_cache = {"stamp": None, "data": None}
+
+def parse_backup_name(fname):
+    """ Returns (instance, type) for a backup file name, or None if it isn't one. """
+    m = BACKUP_NAME_RE.match(fname)
+    if not m:
+        return None
+    return m.group("instance"), "auto" if m.group("auto") else "manual"
+
+def _stamp():
+    try:
+        st = os.stat(CATALOG_FILE)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _load():
+    # Re-read only when another process rewrote the file
+    stamp = _stamp()
+    if _cache["data"] is not None and stamp == _cache["stamp"]:
+        return _cache["data"]
+    data = {"dirs": {}}
+    if stamp:
+        try:
+            with open(CATALOG_FILE, 'r') as f:
+                data = json.load(f)
+        except Exception:
+            data = {"dirs": {}}
+    data.setdefault("dirs", {})
+    _cache["data"], _cache["stamp"] = data, stamp
+    return data
+
+def _save(data):
+    atomic_write_json(CATALOG_FILE, data)
+    _cache["data"], _cache["stamp"] = data, _stamp()
+
+def _dir_key(backup_dir):
+    return os.path.abspath(backup_dir)
+
+def _make_entry(path, file_count=None, checksum=None, size=None):
+    st = os.stat(path)
+    parsed = parse_backup_name(os.path.basename(path)) or (None, "manual")
+    return {
+        "size": st.st_size if size is None else size,
+        "timestamp": st.st_mtime,
+        "instance": parsed[0],
+        "type": parsed[1],
+        "file_count": file_count,
+        "checksum": checksum
+    }
+
+def record_backup(path, file_count=None, checksum=None, size=None):
+    """ Adds or refreshes the entry of a backup that was just written. size: overrides the file size (dedup manifests). """
+    with file_lock(LOCK_FILE):
+        data = _load()
+        d = data["dirs"].setdefault(_dir_key(os.path.dirname(path)), {"mtime_ns": 0, "entries": {}})
+        d["entries"][os.path.basename(path)] = _make_entry(path, file_count, checksum, size)
+        _save(data)
+
+def forget_backup(path):
+    with file_lock(LOCK_FILE):
+        data = _load()
+        d = data["dirs"].get(_dir_key(os.path.dirname(path)))
+        if d and d["entries"].pop(os.path.basename(path), None) is not None:
+            _save(data)
+
+def reconcile(backup_dir):
+    """
+    Syncs the catalog with the directory listing when the dir mtime changed.
+    New files are stat'ed once; vanished files are dropped.
+    """
+    key = _dir_key(backup_dir)
+    try:
+        mtime_ns = os.stat(backup_dir).st_mtime_ns
+    except OSError:
+        return
+    d = _load()["dirs"].get(key)
+    if d and d.get("mtime_ns") == mtime_ns:
+        return
+
+    with file_lock(LOCK_FILE):
+        data = _load()
+        d = data["dirs"].setdefault(key, {"mtime_ns": 0, "entries": {}})
+        names = {n for n in os.listdir(backup_dir) if parse_backup_name(n)}
+        entries = d["entries"]
+        for gone in set(entries) - names:
+            del entries[gone]
+        for new in names - set(entries):
+            path = os.path.join(backup_dir, new)
+            try:
+                size = None
+                if backup_store.is_manifest(path):
+                    size = backup_store.read_manifest(path).get("bytes_total")
+                entries[new] = _make_entry(path, size=size)
+            except (OSError, ValueError):
+                pass
+        d["mtime_ns"] = mtime_ns
+        _save(data)
+
+def list_backups(backup_dir, instance):
+    """
+    Catalog entries of one instance, newest first.
+    Each entry is a copy of the stored dict with an added 'path'.
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+    reconcile(backup_dir)
+    d = _load()["dirs"].get(_dir_key(backup_dir), {})
+    res = []
+    for fname, entry in d.get("entries", {}).items():
+        if entry.get("instance") != instance: continue
+        e = dict(entry)
+        e["path"] = os.path.join(backup_dir, fname)
+        res.append(e)
+    res.sort(key=lambda e: e["timestamp"], reverse=True)
+    return res
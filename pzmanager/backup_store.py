@@ -0,0 +1,239 @@
+import os
+import json
+import gzip
+import hashlib
+import time
+from collections import Counter
+from .utils import file_lock
+
+# Deduplicated backup store
+#
+# Layout inside the backup dir:
+#   store/objects/ab/abcdef...   gzip-compressed chunk, named by sha256 of the raw data
+#   pz_backup_<inst>_<ts>.manifest.json.gz   one manifest per backup
+#
+# A manifest lists every file of the backup with the chunks it is made of.
+# Files whose size and mtime did not change since the previous manifest reuse
+# its chunk list without being read again, so a backup only writes new data.
+# Chunks are shared between all manifests (and instances) in the same backup
+# dir and are deleted by garbage collection once no manifest references them.
+
+CHUNK_SIZE = 4 * 1024 * 1024
+MANIFEST_SUFFIX = ".manifest.json.gz"
+MANIFEST_VERSION = 1
+
+def is_manifest(path):
+    return path.endswith(MANIFEST_SUFFIX)
+
+def get_store_dir(backup_dir):
+    return os.path.join(backup_dir, "store")
+
+def _lock_path(backup_dir):
+    return os.path.join(get_store_dir(backup_dir), ".lock")
+
+def _object_path(store_dir, digest):
+    return os.path.join(store_dir, "objects", digest[:2], digest)
+
+def read_manifest(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_manifest(path, manifest):
+    tmp = path + ".tmp"
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+def list_manifests(backup_dir, prefix="pz_backup_"):
+    if not os.path.isdir(backup_dir):
+        return []
+    return [os.path.join(backup_dir, f) for f in os.listdir(backup_dir)
+            if f.startswith(prefix) and f.endswith(MANIFEST_SUFFIX)]
+
+def _store_chunk(store_dir, data):
+    """ Writes a chunk unless it is already stored. Returns (digest, bytes_written). """
+    digest = hashlib.sha256(data).hexdigest()
+    path = _object_path(store_dir, digest)
+    if os.path.exists(path):
+        return digest, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=6))
+    os.replace(tmp, path)
+    return digest, os.path.getsize(path)
+
+def _read_chunk(store_dir, digest):
+    with open(_object_path(store_dir, digest), 'rb') as f:
+        return gzip.decompress(f.read())
+
+def _previous_files(backup_dir, prefix):
+    """ Path -> entry map of the newest manifest matching prefix (for change detection). """
+    manifests = list_manifests(backup_dir, prefix)
+    if not manifests:
+        return {}
+    latest = max(manifests, key=os.path.getmtime)
+    try:
+        return {e["path"]: e for e in read_manifest(latest).get("files", [])}
+    except Exception as e:
+        print(f"[Backup] Could not read previous manifest {os.path.basename(latest)}: {e}")
+        return {}
+
+def create_backup(backup_dir, data_dir, name, prefix):
+    """
+    Stores data_dir into the chunk store and writes <name><MANIFEST_SUFFIX>.
+    prefix selects which older manifests are used for change detection
+    (normally 'pz_backup_<inst>_').
+    Returns (manifest_path, stats).
+    """
+    store_dir = get_store_dir(backup_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    parent = os.path.dirname(os.path.abspath(data_dir))
+    stats = {"files": 0, "reused": 0, "bytes_total": 0, "bytes_written": 0}
+
+    # Shared lock: backups may run side by side, GC must wait for them.
+    with file_lock(_lock_path(backup_dir), exclusive=False):
+        previous = _previous_files(backup_dir, prefix)
+        files, dirs, links = [], [], []
+
+        for root, dnames, fnames in os.walk(data_dir):
+            rel_root = os.path.relpath(root, parent)
+            dirs.append(rel_root)
+            # os.walk lists symlinked dirs as dirs without following them
+            for dname in [d for d in dnames if os.path.islink(os.path.join(root, d))]:
+                dnames.remove(dname)
+                links.append({"path": os.path.join(rel_root, dname), "target": os.readlink(os.path.join(root, dname))})
+            dnames.sort()
+            for fname in sorted(fnames):
+                full = os.path.join(root, fname)
+                rel = os.path.join(rel_root, fname)
+                try:
+                    st = os.lstat(full)
+                    if os.path.islink(full):
+                        links.append({"path": rel, "target": os.readlink(full)})
+                        continue
+
+                    prev = previous.get(rel)
+                    if prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+                        chunks = prev["chunks"]
+                        stats["reused"] += 1
+                    else:
+                        chunks = []
+                        with open(full, 'rb') as f:
+                            while True:
+                                data = f.read(CHUNK_SIZE)
+                                if not data: break
+                                digest, written = _store_chunk(store_dir, data)
+                                chunks.append(digest)
+                                stats["bytes_written"] += written
+
+                    files.append({
+                        "path": rel,
+                        "size": st.st_size,
+                        "mtime_ns": st.st_mtime_ns,
+                        "mode": st.st_mode & 0o7777,
+                        "chunks": chunks
+                    })
+                    stats["files"] += 1
+                    stats["bytes_total"] += st.st_size
+                except OSError as e:
+                    # File vanished or unreadable, same as tar's warning + continue
+                    print(f"[Backup] Skipping {rel}: {e}")
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "created": time.time(),
+            "root": os.path.basename(os.path.abspath(data_dir)),
+            "dirs": dirs,
+            "links": links,
+            "files": files,
+            "bytes_total": stats["bytes_total"]
+        }
+        dest = os.path.join(backup_dir, name + MANIFEST_SUFFIX)
+        write_manifest(dest, manifest)
+
+    return dest, stats
+
+def restore_backup(manifest_path, dest_parent, select=None):
+    """
+    Rebuilds the files of a manifest under dest_parent.
+    Like 'tar -x', existing files are overwritten and extra files are left alone.
+    select is an optional predicate on the stored path for partial restores.
+    Returns the number of files written.
+    """
+    backup_dir = os.path.dirname(manifest_path)
+    store_dir = get_store_dir(backup_dir)
+    manifest = read_manifest(manifest_path)
+    count = 0
+
+    with file_lock(_lock_path(backup_dir), exclusive=False):
+        for d in manifest.get("dirs", []):
+            if select and not select(d): continue
+            os.makedirs(os.path.join(dest_parent, d), exist_ok=True)
+
+        for entry in manifest.get("files", []):
+            if select and not select(entry["path"]): continue
+            target = os.path.join(dest_parent, entry["path"])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = target + ".pzrestore"
+            with open(tmp, 'wb') as f:
+                for digest in entry["chunks"]:
+                    f.write(_read_chunk(store_dir, digest))
+            os.chmod(tmp, entry.get("mode", 0o644))
+            os.utime(tmp, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            os.replace(tmp, target)
+            count += 1
+
+        for link in manifest.get("links", []):
+            if select and not select(link["path"]): continue
+            target = os.path.join(dest_parent, link["path"])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.lexists(target):
+                os.remove(target)
+            os.symlink(link["target"], target)
+
+    return count
+
+def collect_garbage(backup_dir):
+    """
+    Reference-counts chunks over every manifest in backup_dir and deletes
+    the ones nobody references anymore. Returns (objects_removed, bytes_freed).
+    """
+    store_dir = get_store_dir(backup_dir)
+    objects_dir = os.path.join(store_dir, "objects")
+    if not os.path.isdir(objects_dir):
+        return 0, 0
+
+    removed = freed = 0
+    with file_lock(_lock_path(backup_dir), exclusive=True):
+        refs = Counter()
+        for m in list_manifests(backup_dir):
+            try:
+                for entry in read_manifest(m).get("files", []):
+                    refs.update(entry["chunks"])
+            except Exception as e:
+                # Never delete anything based on an incomplete reference count
+                print(f"[Backup] GC aborted, unreadable manifest {os.path.basename(m)}: {e}")
+                return 0, 0
+
+        for sub in os.scandir(objects_dir):
+            if not sub.is_dir(): continue
+            for obj in os.scandir(sub.path):
+                # Leftover .tmp files from interrupted writes go as well
+                if "." not in obj.name and refs[obj.name] > 0:
+                    continue
+                try:
+                    size = obj.stat().st_size
+                    os.remove(obj.path)
+                    removed += 1
+                    freed += size
+                except OSError as e:
+                    print(f"[Backup] Failed to remove object {obj.name}: {e}")
+
+    return removed, freed
+
+def delete_backup(manifest_path, gc=True):
+    os.remove(manifest_path)
+    if gc:
+        return collect_garbage(os.path.dirname(manifest_path))
+    return 0, 0
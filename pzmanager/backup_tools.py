@@ -1,28 +1,146 @@
 import os
-import glob
+import re
+import sys
+import hashlib
+import shutil
+import threading
+import subprocess
 from datetime import datetime
 from .const import *
-from .utils import print_header, run_cmd, InteractiveMenu, safe_input
+from .utils import print_header, run_cmd, InteractiveMenu, safe_input, file_lock
+from . import backup_store
+from . import archive_writer
+from . import backup_catalog
+from . import partial_restore
+from . import map_tools
 
-def get_recent_backups(mgr):
+def get_backup_entries(mgr):
+    """
+    Catalog entries (size, timestamp, type, file_count, checksum, path) for the
+    current instance, newest first. Strict per-instance separation, old
+    non-prefixed backups are not listed.
+    """
     b_dir = mgr.config.get("backup_dir", DEFAULT_BACKUP_DIR)
-    if not os.path.exists(b_dir):
-        return []
-    
-    inst = mgr.current_instance
-    # Sort by mtime descending. Filter for current instance.
-    # Pattern: pz_backup_{inst}_*.tar.gz
-    # Use glob pattern to filter automatically
-    pattern = os.path.join(b_dir, f"pz_backup_{inst}_*.tar.gz")
-    files = glob.glob(pattern)
-    
-    # Backwards compatibility: If instance is 'default', also include old non-prefixed backups?
-    # Or strict separation? Let's go with strict separation to encourage migration, 
-    # but maybe we should display ALL only if specific flag? 
-    # For now, stick to instance specific to prevent confusion.
-    
-    files.sort(key=os.path.getmtime, reverse=True)
-    return files
+    return backup_catalog.list_backups(b_dir, mgr.current_instance)
+
+def get_recent_backups(mgr):
+    # Paths only, newest first. Tar archives (.tar.gz/.bz2/.xz) and dedup manifests.
+    return [e["path"] for e in get_backup_entries(mgr)]
+
+def _tar_to_file(parent, base, dest, check, interactive):
+    """
+    'tar -czf' through a pipe so the checksum is computed while writing.
+    Returns (sha256 hex digest, number of non-directory members), or None if
+    tar failed or was cancelled (the partial file is removed).
+    """
+    digest = hashlib.sha256()
+    proc = None
+    index = dest + ".index" # tar's verbose listing, one member per line
+    try:
+        with open(dest, 'wb') as out:
+            proc = subprocess.Popen(["tar", "-czvf", "-", f"--index-file={index}", "-C", parent, base], stdout=subprocess.PIPE)
+            for chunk in iter(lambda: proc.stdout.read(1024 * 1024), b""):
+                out.write(chunk)
+                digest.update(chunk)
+            rc = proc.wait()
+    except KeyboardInterrupt:
+        if proc and proc.poll() is None:
+            proc.terminate()
+            proc.wait()
+        _remove_partial(dest)
+        _remove_partial(index)
+        print(f"\n{C_YELLOW}Cancelled.{C_RESET}")
+        return None
+
+    try:
+        with open(index, 'rb') as f:
+            # Directories end in '/' and aren't counted, as in the other formats
+            count = sum(1 for line in f if line.strip() and not line.rstrip(b"\n").endswith(b"/"))
+    except OSError:
+        count = None
+    _remove_partial(index)
+
+    # Exit code 1 is 'some files changed while reading', the archive is still usable
+    if rc > 1:
+        _remove_partial(dest)
+        print(f"{C_RED}Command failed: tar exited with status {rc}{C_RESET}")
+        if check:
+            if interactive:
+                safe_input("Press Enter to continue...")
+            else:
+                sys.exit(1)
+        return None
+    return digest.hexdigest(), count
+
+def _remove_partial(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def write_backup(mgr, data_dir, name, check=False, interactive=False):
+    """
+    Writes data_dir as backup 'name' (no extension) in the format selected by
+    'backup_format': 'tar' (tar.gz via the tar binary), 'parallel' (multi-core
+    in-process writer) or 'dedup' (chunk store + manifest).
+    Returns the backup path, or None if no backup was written.
+    """
+    b_dir = mgr.config["backup_dir"]
+    fmt = mgr.config.get("backup_format", "tar")
+    if fmt == "dedup":
+        dest, stats = backup_store.create_backup(b_dir, data_dir, name, f"pz_backup_{mgr.current_instance}_")
+        print(f"[Backup] {stats['files']} files, {stats['reused']} unchanged, "
+              f"{stats['bytes_written'] / (1024 * 1024):.1f} MB of new data stored.")
+        with open(dest, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        # The manifest itself is tiny, list the size of the data it covers
+        backup_catalog.record_backup(dest, file_count=stats["files"], checksum=checksum, size=stats["bytes_total"])
+        return dest
+
+    if fmt == "parallel":
+        codec = mgr.config.get("backup_codec", "gzip")
+        dest = os.path.join(b_dir, name + archive_writer.get_extension(codec))
+        stats = archive_writer.write_archive(
+            data_dir, dest,
+            codec=codec,
+            level=int(mgr.config.get("backup_level", 6)),
+            workers=int(mgr.config.get("backup_workers", 0))
+        )
+        mb = stats["raw_bytes"] / (1024 * 1024)
+        print(f"[Backup] Compressed {mb:.1f} MB with {stats['workers']} workers in {stats['seconds']:.1f}s "
+              f"({mb / max(stats['seconds'], 0.001):.1f} MB/s).")
+        backup_catalog.record_backup(dest, file_count=stats["files"], checksum=stats["sha256"])
+        return dest
+
+    dest = os.path.join(b_dir, name + ".tar.gz")
+    parent = os.path.dirname(data_dir)
+    base = os.path.basename(data_dir)
+    res = _tar_to_file(parent, base, dest, check, interactive)
+    if res is None:
+        return None
+    checksum, count = res
+    backup_catalog.record_backup(dest, file_count=count, checksum=checksum)
+    return dest
+
+def remove_backups(files):
+    """ Deletes backup files/manifests, then garbage collects the chunk store once. """
+    gc_dirs = set()
+    for f in files:
+        try:
+            os.remove(f)
+            backup_catalog.forget_backup(f)
+            if os.path.exists(f + archive_writer.INDEX_SUFFIX):
+                os.remove(f + archive_writer.INDEX_SUFFIX)
+            print(f"  Deleted {os.path.basename(f)}")
+            if backup_store.is_manifest(f):
+                gc_dirs.add(os.path.dirname(f))
+        except Exception as e:
+            print(f"  Failed to delete {f}: {e}")
+
+    for d in gc_dirs:
+        removed, freed = backup_store.collect_garbage(d)
+        if removed:
+            print(f"  Freed {freed / (1024 * 1024):.1f} MB ({removed} unreferenced chunks)")
 
 def backup_data(mgr):
     if mgr.interactive: print_header("Backup")
@@ -36,21 +154,18 @@ def backup_data(mgr):
     os.makedirs(mgr.config["backup_dir"], exist_ok=True)
     
     inst = mgr.current_instance
-    fname = f"pz_backup_{inst}_{ts}.tar.gz"
-    
-    dest = os.path.join(mgr.config["backup_dir"], fname)
+    name = f"pz_backup_{inst}_{ts}"
     
     print(f"Backing up {data_dir}...")
-    parent = os.path.dirname(data_dir)
-    base = os.path.basename(data_dir)
-    run_cmd(["tar", "-czf", dest, "-C", parent, base], interactive=mgr.interactive)
-    print(f"Backup saved to {dest}")
+    dest = write_backup(mgr, data_dir, name, check=True, interactive=mgr.interactive)
+    if dest:
+        print(f"Backup saved to {dest}")
     mgr.wait_input("Press Enter...")
 
 def manage_backups_menu(mgr):
-    files = get_recent_backups(mgr)
+    entries = get_backup_entries(mgr)
     
-    if not files:
+    if not entries:
         if mgr.interactive:
             print_header("Manage Backups")
             print("No backup files found.")
@@ -58,10 +173,15 @@ def manage_backups_menu(mgr):
         return
         
     items = []
-    for f in files:
+    for e in entries:
+        f = e["path"]
         fname = os.path.basename(f)
-        size = os.path.getsize(f) / (1024 * 1024)
-        items.append((f"{fname} ({size:.1f} MB)", f))
+        info = f"{e['size'] / (1024 * 1024):.1f} MB"
+        if e.get("file_count") is not None:
+            info += f", {e['file_count']} files"
+        if backup_store.is_manifest(f):
+            info = "dedup, " + info
+        items.append((f"{fname} ({info})", f))
     items.append(("Back", 'b'))
     
     menu = InteractiveMenu(items, title="Select Backup to Manage")
@@ -72,6 +192,7 @@ def manage_backups_menu(mgr):
     # Submenu for Action
     action_items = [
         ("Restore this Backup", 'restore'),
+        ("Restore Selected Cells/Files", 'partial'),
         ("Delete this Backup", 'delete'),
         ("Back", 'b')
     ]
@@ -81,6 +202,8 @@ def manage_backups_menu(mgr):
     
     if action == 'restore':
         process_restore(mgr, backup_file)
+    elif action == 'partial':
+        process_partial_restore(mgr, backup_file)
     elif action == 'delete':
         process_delete(mgr, backup_file)
 
@@ -96,21 +219,59 @@ def process_restore(mgr, backup_file):
     val = safe_input(f"\n{C_YELLOW}Are you sure? (type 'yes' to confirm): {C_RESET}")
     if (val or "").lower() == 'yes':
         os.makedirs(parent, exist_ok=True)
-        run_cmd(["tar", "-xzf", backup_file, "-C", parent], interactive=mgr.interactive)
+        if backup_store.is_manifest(backup_file):
+            count = backup_store.restore_backup(backup_file, parent)
+            print(f"Restored {count} files.")
+        else:
+            # -x without a codec flag lets GNU tar detect gzip/bzip2/xz
+            run_cmd(["tar", "-xf", backup_file, "-C", parent], interactive=mgr.interactive)
         print("Restore complete.")
         mgr.wait_input("Press Enter...")
 
+def process_partial_restore(mgr, backup_file):
+    data_dir = os.path.join(mgr.config["install_dir"], "Zomboid")
+    parent = os.path.dirname(data_dir)
+    save_rel = os.path.relpath(map_tools.get_save_dir(mgr), parent)
+
+    print_header("Partial Restore")
+    print(f"Backup: {C_BOLD}{os.path.basename(backup_file)}{C_RESET}")
+    print(f"Cells are matched in {save_rel}")
+    print(f"{C_YELLOW}Stop the server first, or it will overwrite restored files on its next save.{C_RESET}\n")
+
+    rect_raw = safe_input("Cell rectangles (e.g. 100_200..140_260, comma separated, blank for none): ")
+    if rect_raw is None: return
+    glob_raw = safe_input("File globs below Zomboid/ (e.g. Saves/Multiplayer/*/players.db, blank for none): ")
+    if glob_raw is None: return
+
+    try:
+        rects = [map_tools.parse_rect(r) for r in rect_raw.split(",") if r.strip()]
+    except ValueError as e:
+        print(f"{C_RED}{e}{C_RESET}")
+        mgr.wait_input("Press Enter...")
+        return
+    patterns = [g.strip() for g in glob_raw.split(",") if g.strip()]
+    if not rects and not patterns:
+        print("Nothing selected.")
+        mgr.wait_input("Press Enter...")
+        return
+
+    val = safe_input(f"\n{C_YELLOW}Overwrite the selected files in {data_dir}? (type 'yes' to confirm): {C_RESET}")
+    if (val or "").lower() == 'yes':
+        select = partial_restore.build_selector(save_rel, rects=rects, patterns=patterns)
+        try:
+            count = partial_restore.restore_selected(backup_file, select, parent)
+            print(f"Restored {count} files.")
+        except Exception as e:
+            print(f"{C_RED}Partial restore failed: {e}{C_RESET}")
+        mgr.wait_input("Press Enter...")
+
 def process_delete(mgr, backup_file):
     print_header("Delete Confirmation")
     print(f"Deleting: {C_BOLD}{os.path.basename(backup_file)}{C_RESET}")
     
     val = safe_input(f"\n{C_RED}Are you sure you want to delete this file? (yes/no): {C_RESET}")
     if (val or "").lower() == 'yes':
-        try:
-            os.remove(backup_file)
-            print("Deleted.")
-        except Exception as e:
-            print(f"Error: {e}")
+        remove_backups([backup_file])
         mgr.wait_input("Press Enter...")
 
 def cleanup_old_backups(mgr):
@@ -119,38 +280,154 @@ def cleanup_old_backups(mgr):
     if len(files) > retention:
         to_del = files[retention:]
         print(f"[Backup] Cleaning up {len(to_del)} old backups (Retention: {retention})...")
-        for f in to_del:
-            try:
-                os.remove(f)
-                print(f"  Deleted {os.path.basename(f)}")
-            except Exception as e:
-                print(f"  Failed to delete {f}: {e}")
-
-def perform_auto_backup(mgr):
+        remove_backups(to_del)
+
+def perform_auto_backup(mgr, data_dir=None, ts=None):
+    """ ts: the time the data is from (YYYYmmdd_HHMMSS), default now. """
     if not mgr.config.get("auto_backup", True):
         return
         
     print("[Backup] Performing Auto-Backup...")
     # Modified backup logic for non-interactive / minimal output
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ts = ts or datetime.now().strftime("%Y%m%d_%H%M%S")
     os.makedirs(mgr.config["backup_dir"], exist_ok=True)
     
     inst = mgr.current_instance
-    fname = f"pz_backup_{inst}_auto_{ts}.tar.gz"
+    name = f"pz_backup_{inst}_auto_{ts}"
     
-    dest = os.path.join(mgr.config["backup_dir"], fname)
-    data_dir = os.path.join(mgr.config["install_dir"], "Zomboid")
+    if data_dir is None:
+        data_dir = os.path.join(mgr.config["install_dir"], "Zomboid")
     
     if not os.path.exists(data_dir):
         print(f"[Backup] Data dir {data_dir} missing. Skipping.")
         return
 
-    parent = os.path.dirname(data_dir)
-    base = os.path.basename(data_dir)
-    
     # Run silently-ish
-    run_cmd(["tar", "-czf", dest, "-C", parent, base], check=False, interactive=False)
+    dest = write_backup(mgr, data_dir, name)
+    if dest is None:
+        raise RuntimeError("tar failed, no backup written")
     print(f"[Backup] Saved to {dest}")
     
     cleanup_old_backups(mgr)
+    return dest
+
+# --- Snapshot Backups (fast restarts) ---
+# A snapshot is a plain copy of Zomboid/ in a staging folder. It is taken while
+# the server is stopped and compressed later, once the server is back up.
+#
+#   .staging/<instance>_<YYYYmmdd_HHMMSS>/Zomboid/   the copy
+#   .staging/<instance>_<YYYYmmdd_HHMMSS>/.complete  written once the copy finished
+#   .staging/<instance>_<YYYYmmdd_HHMMSS>.lock       held while it is created or archived
+#
+# The backup is named after the snapshot time, not the time it was compressed.
+# Snapshots left behind by a process that died are swept when the scheduler starts.
+
+_archive_threads = []
+SNAPSHOT_COMPLETE = ".complete"
+
+def get_staging_dir(mgr):
+    return os.path.join(mgr.config["backup_dir"], ".staging")
+
+def _snapshot_lock(snap_root, blocking=True):
+    return file_lock(snap_root + ".lock", blocking=blocking)
+
+def _remove_snapshot(snap_root):
+    shutil.rmtree(snap_root, ignore_errors=True)
+    _remove_partial(snap_root + ".lock")
+
+def create_snapshot(mgr):
+    """
+    Copies Zomboid/ into the staging dir and returns the copied data dir.
+    Mode 'reflink' uses copy-on-write clones where the filesystem supports them
+    (full copy otherwise). Mode 'hardlink' is near instant but only safe if the
+    game replaces save files rather than rewriting them in place.
+    Raises on failure so the caller can fall back to a regular backup.
+    """
+    data_dir = os.path.join(mgr.config["install_dir"], "Zomboid")
+    if not os.path.exists(data_dir):
+        raise FileNotFoundError(f"Data dir {data_dir} missing")
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    snap_root = os.path.join(get_staging_dir(mgr), f"{mgr.current_instance}_{ts}")
+    snap_dir = os.path.join(snap_root, os.path.basename(data_dir))
+    with _snapshot_lock(snap_root):
+        os.makedirs(snap_root, exist_ok=True)
+        mode = mgr.config.get("backup_snapshot_mode", "reflink")
+        res = None
+        if mode == "hardlink":
+            res = subprocess.run(["cp", "-al", data_dir, snap_dir], capture_output=True, text=True)
+            if res.returncode != 0:
+                # Usually means staging is on another filesystem. Copy instead.
+                print(f"[Backup] Hardlink snapshot failed ({res.stderr.strip()}), falling back to copy.")
+                shutil.rmtree(snap_dir, ignore_errors=True)
+        if res is None or res.returncode != 0:
+            res = subprocess.run(["cp", "-a", "--reflink=auto", data_dir, snap_dir], capture_output=True, text=True)
+        if res.returncode != 0:
+            _remove_snapshot(snap_root)
+            raise RuntimeError(f"Snapshot copy failed: {res.stderr.strip()}")
+        open(os.path.join(snap_root, SNAPSHOT_COMPLETE), 'w').close()
+    return snap_dir
+
+def archive_snapshot(mgr, snap_dir, on_done=None):
+    """ Compresses a snapshot into a regular auto backup named after the snapshot time, then removes it. """
+    snap_root = os.path.dirname(snap_dir)
+    ts = os.path.basename(snap_root)[-15:] # <instance>_YYYYmmdd_HHMMSS
+    with _snapshot_lock(snap_root):
+        try:
+            if not os.path.exists(os.path.join(snap_root, SNAPSHOT_COMPLETE)):
+                msg = "Snapshot gone, already archived by another process."
+            else:
+                dest = perform_auto_backup(mgr, data_dir=snap_dir, ts=ts)
+                msg = f"Snapshot archived to {dest}" if dest else "Snapshot archive skipped."
+        except Exception as e:
+            msg = f"Snapshot archive FAILED: {e}"
+        finally:
+            _remove_snapshot(snap_root)
+    print(f"[Backup] {msg}")
+    if on_done: on_done(msg)
+
+def sweep_snapshots(mgr, on_done=None):
+    """
+    Deals with snapshots of this instance that a dead process left in staging:
+    complete ones are archived in the background, interrupted copies deleted.
+    Snapshots another process is still working on are left alone. Returns how many were found.
+    """
+    staging = get_staging_dir(mgr)
+    pattern = re.compile(re.escape(mgr.current_instance) + r"_\d{8}_\d{6}$")
+    try:
+        names = sorted(n for n in os.listdir(staging) if pattern.match(n) and os.path.isdir(os.path.join(staging, n)))
+    except OSError:
+        return 0
+    found = 0
+    for name in names:
+        snap_root = os.path.join(staging, name)
+        try:
+            with _snapshot_lock(snap_root, blocking=False):
+                if not os.path.isdir(snap_root):
+                    continue # Finished meanwhile
+                complete = os.path.exists(os.path.join(snap_root, SNAPSHOT_COMPLETE))
+                if not complete:
+                    _remove_snapshot(snap_root)
+        except BlockingIOError:
+            continue # Being created or archived right now
+        found += 1
+        if complete:
+            print(f"[Backup] Archiving leftover snapshot {name}...")
+            archive_snapshot_async(mgr, os.path.join(snap_root, "Zomboid"), on_done=on_done)
+        else:
+            msg = f"Removed interrupted snapshot {name}."
+            print(f"[Backup] {msg}")
+            if on_done: on_done(msg)
+    return found
+
+def archive_snapshot_async(mgr, snap_dir, on_done=None):
+    """ Runs archive_snapshot in a background worker thread. """
+    t = threading.Thread(target=archive_snapshot, args=(mgr, snap_dir, on_done), name="pz-backup-archive")
+    t.start()
+    _archive_threads[:] = [x for x in _archive_threads if x.is_alive()]
+    _archive_threads.append(t)
+    return t
 
+def wait_for_background_archives(timeout=None):
+    for t in list(_archive_threads):
+        t.join(timeout)
@@ -8,6 +8,7 @@ DEFAULT_STEAMCMD_DIR = os.path.expanduser("~/steamcmd")
 DEFAULT_BACKUP_DIR = os.path.expanduser("~/pzbackups")
 DEFAULT_SERVICE_NAME = "pzserver"
 DEFAULT_SERVER_NAME = "servertest"
+SCHEDULER_DAEMON_SERVICE = "pzmanager-scheduler" # One scheduler for every instance
 CONFIG_DIR = os.path.expanduser("~/.config/pz_manager")
 GLOBAL_CONFIG_FILE = os.path.join(CONFIG_DIR, "global.json")
 INSTANCES_DIR = os.path.join(CONFIG_DIR, "instances")
@@ -3,28 +3,50 @@ import sys
 import json
 import subprocess
 import shutil
+import copy
 import time
 from .const import *
-from .utils import print_header, run_cmd, InteractiveMenu, format_info_box, get_existing_server_names, safe_input
+from .utils import print_header, run_cmd, InteractiveMenu, format_info_box, get_existing_server_names, safe_input, file_stamp, save_json_merged
 from . import steam_tools
 from . import service_tools
 from . import scheduler
 from . import backup_tools
+from . import archive_writer
+from . import map_prune
+from . import map_footprint
 from .mod_manager import InternalModManager
-from .rcon import RCONClient
+from .rcon import RCONClient, execute_on_many, kick_command, broadcast_command
+
+def _read_config(path):
+    """ Parsed JSON object of a config file. Raises OSError or ValueError. """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("not a JSON object")
+    return data
 
 class PZManager:
-    def __init__(self, interactive=True, instance_name=None):
+    def __init__(self, interactive=True, instance_name=None, remember_instance=True):
         self.interactive = interactive
         self.global_config = {}
         self.config = {}
         self.current_instance = "default"
+        # What the config files held when last read or written, and their (mtime, size).
+        # Saving is skipped while the config still equals this.
+        self._saved_global = None
+        self._global_stamp = None
+        self._saved_config = None
+        self._config_stamp = None
+        # Why the instance file couldn't be read, None when it could. Nothing is
+        # written to a file we failed to read, so a hand edit is never lost.
+        self.config_error = None
+        self._global_error = None
         
         self.ensure_struct()
         self.load_global_config()
         
         if instance_name:
-            self.load_instance_config(instance_name)
+            self.load_instance_config(instance_name, remember=remember_instance)
         else:
             # Load the last active instance or default
             tgt = self.global_config.get("last_instance", "default")
@@ -38,30 +60,70 @@ class PZManager:
             shutil.move(OLD_CONFIG_FILE, os.path.join(INSTANCES_DIR, "default.json"))
 
     def load_global_config(self):
-        if os.path.exists(GLOBAL_CONFIG_FILE):
+        # Updated in place, the scheduler daemon keeps a reference to it
+        stamp = file_stamp(GLOBAL_CONFIG_FILE)
+        data = {}
+        if stamp:
             try:
-                with open(GLOBAL_CONFIG_FILE, 'r') as f:
-                    self.global_config = json.load(f)
-            except: self.global_config = {}
+                data = _read_config(GLOBAL_CONFIG_FILE)
+            except Exception as e:
+                # Keep what we have and leave the file alone until it's fixed
+                self._global_stamp, self._global_error = stamp, str(e)
+                print(f"{C_RED}Error loading {GLOBAL_CONFIG_FILE}: {e}. Not saving it until it's fixed.{C_RESET}")
+                self.global_config.setdefault("last_instance", "default")
+                return
+        self._global_stamp, self._global_error = stamp, None
+        self._saved_global = copy.deepcopy(data) if stamp else None
+        self.global_config.clear()
+        self.global_config.update(data)
         self.global_config.setdefault("last_instance", "default")
         self.save_global_config()
 
     def save_global_config(self):
-        with open(GLOBAL_CONFIG_FILE, 'w') as f:
-            json.dump(self.global_config, f, indent=4)
-
-    def load_instance_config(self, inst_name):
-        self.current_instance = inst_name
+        """ Writes global.json if it changed since it was loaded or last saved. """
+        if self._global_error:
+            return False
+        res = self._write_if_dirty(GLOBAL_CONFIG_FILE, self.global_config, self._saved_global)
+        if res:
+            self._saved_global, self._global_stamp = res
+        return bool(res)
+
+    def _write_if_dirty(self, path, data, saved):
+        # Returns (new snapshot, stamp) after a write, None when data has no changes
+        if saved is not None and data == saved:
+            return None
+        written, stamp = save_json_merged(path, data, saved)
+        if written != data:
+            # Keys another process changed meanwhile
+            data.clear()
+            data.update(written)
+        return copy.deepcopy(written), stamp
+
+    def load_instance_config(self, inst_name, remember=True):
         p = os.path.join(INSTANCES_DIR, f"{inst_name}.json")
-        
-        if os.path.exists(p):
+        stamp = file_stamp(p)
+        reloading = inst_name == self.current_instance and self._config_stamp is not None
+        self.current_instance = inst_name
+        self._config_stamp = stamp # A broken file is retried once it changes again
+        self.config_error = None
+
+        if stamp:
             try:
-                with open(p, 'r') as f:
-                    self.config = json.load(f)
+                data = _read_config(p)
             except Exception as e:
-                print(f"{C_RED}Error loading instance '{inst_name}': {e}{C_RESET}")
+                # A typo in a hand edit or an editor caught mid-write: never replace it with defaults
+                self.config_error = str(e)
+                keep = "the loaded config" if reloading else "defaults"
+                print(f"{C_RED}Error loading instance '{inst_name}': {e}. Using {keep}, not saving until the file is fixed.{C_RESET}")
+                if reloading:
+                    return
+                self._saved_config = None
                 self.config = {}
+            else:
+                self.config = data
+                self._saved_config = copy.deepcopy(data)
         else:
+            self._saved_config = None
             self.config = {}
             if inst_name == "default":
                  # If default doesn't exist (fresh install), defaults will set
@@ -86,22 +148,61 @@ class PZManager:
         self.config.setdefault("branch", "unstable")
         self.config.setdefault("auto_backup", True)
         self.config.setdefault("backup_retention", 5)
+        self.config.setdefault("restart_backup_mode", "inline")
+        self.config.setdefault("backup_format", "tar")
+        self.config.setdefault("backup_codec", "gzip")
+        self.config.setdefault("backup_level", 6)
+        self.config.setdefault("backup_workers", 0)
         self.config.setdefault("enable_mod_update_check", False)
+        self.config.setdefault("scheduler_enabled", True) # Picked up by the multi-instance scheduler
+        self.config.setdefault("prune_on_restart", False)
+        self.config.setdefault("prune_stale_days", 30)
+        self.config.setdefault("prune_min_kb", 0)
         
-        self.save_config()
+        if not self.config_error:
+            self.save_config() # Only writes if defaults were added
         
         # Update global last used
-        self.global_config["last_instance"] = inst_name
-        self.save_global_config()
+        if remember:
+            self.global_config["last_instance"] = inst_name
+            self.save_global_config()
 
     def load_config(self):
         # Legacy/Alias wrapper just in case
         self.load_instance_config(self.current_instance)
 
     def save_config(self):
+        """ Writes the instance JSON if the config changed since it was loaded or last saved. """
+        if self.config_error:
+            print(f"{C_YELLOW}Not saving '{self.current_instance}': its file could not be read ({self.config_error}).{C_RESET}")
+            return False
+        p = os.path.join(INSTANCES_DIR, f"{self.current_instance}.json")
+        res = self._write_if_dirty(p, self.config, self._saved_config)
+        if res:
+            self._saved_config, self._config_stamp = res
+        return bool(res)
+
+    def reload_if_changed(self):
+        """
+        Re-reads the config files if another process or an editor changed them
+        since we loaded or saved them. Costs a stat per file when nothing changed.
+        Returns the previous instance config if it was reloaded, else None.
+        """
+        self.reload_global_if_changed()
         p = os.path.join(INSTANCES_DIR, f"{self.current_instance}.json")
-        with open(p, 'w') as f:
-            json.dump(self.config, f, indent=4)
+        stamp = file_stamp(p)
+        if stamp is None or stamp == self._config_stamp:
+            return None # Deleted instances keep running on the config they had
+        prev = self.config
+        self.load_instance_config(self.current_instance, remember=False)
+        return prev
+
+    def reload_global_if_changed(self):
+        """ Re-reads global.json in place if it changed. Returns True if it was reloaded. """
+        if file_stamp(GLOBAL_CONFIG_FILE) not in (None, self._global_stamp):
+            self.load_global_config()
+            return True
+        return False
 
     def list_instances(self):
         res = []
@@ -126,15 +227,21 @@ class PZManager:
     def run_scheduler(self):
         scheduler.run_scheduler(self)
 
+    def run_scheduler_all(self):
+        # Instances are loaded without touching last_instance
+        make_mgr = lambda name: PZManager(interactive=False, instance_name=name, remember_instance=False)
+        scheduler.run_scheduler_daemon(make_mgr, self.list_instances, self.global_config, self.reload_global_if_changed)
+
     def main_menu(self):
         last_index = 0
         while True:
+            self.reload_if_changed() # Edited by another session or by hand
             def info():
                 sched_svc = self.config['service_name'] + "-scheduler"
                 is_active = False
                 try:
-                    out = subprocess.run(f"systemctl is-active {sched_svc}", shell=True, capture_output=True, text=True).stdout.strip()
-                    is_active = (out == "active")
+                    out = subprocess.run(f"systemctl is-active {sched_svc} {SCHEDULER_DAEMON_SERVICE}", shell=True, capture_output=True, text=True).stdout.split()
+                    is_active = (out[:1] == ["active"]) or (out[1:2] == ["active"] and self.config.get("scheduler_enabled", True))
                 except: pass
                 
                 next_restart = scheduler.get_next_restart_info(self) if is_active else "Scheduler Inactive"
@@ -209,6 +316,7 @@ class PZManager:
             items = []
             items.append(("Refresh", "refresh"))
             items.append(("Broadcast Message", "broadcast"))
+            items.append(("Broadcast to All Instances", "broadcast_all"))
             items.append((f"{C_YELLOW}--- Online Players ---{C_RESET}", None))
 
             for p in raw_players:
@@ -224,7 +332,8 @@ class PZManager:
             choice = menu.show() # choice is the 'value' of the tuple
 
             if choice == 'back' or choice is None:
-                rcon.quit()
+                # Only disconnect, quit() would shut the game server down
+                rcon.close()
                 return
             elif choice == 'refresh':
                 continue
@@ -234,6 +343,11 @@ class PZManager:
                     rcon.broadcast(msg)
                     print("Message sent.")
                     time.sleep(1)
+            elif choice == 'broadcast_all':
+                msg = safe_input("Enter message for every instance: ")
+                if msg:
+                    self.rcon_all_instances([broadcast_command(msg)])
+                    self.wait_input()
             else:
                 # Player selected
                 self.submenu_player_actions(rcon, choice)
@@ -242,6 +356,7 @@ class PZManager:
         while True:
             items = [
                 (f"Kick {player_name}", 'kick'),
+                (f"Kick {player_name} from All Instances", 'kick_all'),
                 (f"Ban {player_name}", 'ban'),
                 ("Back", 'b')
             ]
@@ -255,6 +370,11 @@ class PZManager:
                 print(f"Kicked {player_name}")
                 time.sleep(1)
                 return
+            elif c == 'kick_all':
+                reason = safe_input("Reason (optional): ")
+                self.rcon_all_instances([kick_command(player_name, reason if reason else "Kicked by Admin")])
+                self.wait_input()
+                return
             elif c == 'ban':
                 reason = safe_input("Reason (optional): ")
                 rcon.ban(player_name, reason=reason if reason else "Banned by Admin")
@@ -262,6 +382,35 @@ class PZManager:
                 time.sleep(1)
                 return
 
+    def rcon_all_instances(self, commands):
+        """
+        Sends commands to every instance's server at once (one concurrent RCON
+        connection per server) and prints which ones were reached.
+        """
+        targets = {}
+        for name in self.list_instances():
+            mgr = self if name == self.current_instance else PZManager(interactive=False, instance_name=name, remember_instance=False)
+            if mgr.config_error: continue
+            c = mgr.config
+            # Instances sharing one server (same host and port) get the commands once
+            targets.setdefault((c["rcon_host"], int(c["rcon_port"])), (c["rcon_password"], []))[1].append(name)
+        if not targets:
+            print("No instances.")
+            return {}
+        print(f"Sending to {len(targets)} server(s)...")
+        keys = list(targets)
+        results = execute_on_many([(h, p, targets[(h, p)][0]) for h, p in keys], commands)
+        res = {}
+        for key, out in zip(keys, results):
+            names = ", ".join(targets[key][1])
+            if out is None:
+                print(f" {C_RED}{names}: not reachable{C_RESET}")
+            else:
+                print(f" {C_GREEN}{names}: sent{C_RESET}")
+            for name in targets[key][1]:
+                res[name] = out
+        return res
+
     def submenu_instances(self):
         last_index = 0
         while True:
@@ -362,7 +511,12 @@ class PZManager:
                     "Restart Schedule": str(self.config['restart_times']),
                     "Auto Backup": str(self.config.get("auto_backup", True)),
                     "Backup Retention": str(self.config.get("backup_retention", 5)),
-                    "Mod Update Check": str(self.config.get("enable_mod_update_check", False))
+                    "Restart Backup Mode": self.config.get("restart_backup_mode", "inline"),
+                    "Backup Format": self.config.get("backup_format", "tar"),
+                    "Compression": f"{self.config.get('backup_codec', 'gzip')} L{self.config.get('backup_level', 6)}, workers: {self.config.get('backup_workers', 0) or 'all'}",
+                    "Mod Update Check": str(self.config.get("enable_mod_update_check", False)),
+                    "Stale Cell Pruning": (f"on restart, {self.config.get('prune_stale_days', 30)}+ days"
+                                           if self.config.get("prune_on_restart", False) else "Off")
                 })
 
             sname = self.config['server_name']
@@ -373,7 +527,11 @@ class PZManager:
                 (f"Restart Schedule", '4', "Set times for automated daily restarts (e.g. 0, 6, 12, 18)."),
                 (f"Auto Backup", 'toggle_backup', f"State: {self.config.get('auto_backup', True)}. Toggle backups before scheduled restarts."),
                 (f"Backup Retention", 'set_retention', f"Keep last {self.config.get('backup_retention', 5)} backups. Clean older ones."),
+                (f"Restart Backup Mode", 'toggle_backup_mode', f"Mode: {self.config.get('restart_backup_mode', 'inline')}. 'snapshot' copies saves while stopped and compresses after the server is back up."),
+                (f"Backup Format", 'toggle_backup_format', f"Format: {self.config.get('backup_format', 'tar')}. 'parallel' compresses on all cores, 'dedup' stores only changed files in a shared chunk store."),
+                (f"Backup Compression", 'set_compression', "Codec, level and worker count used by the 'parallel' backup format."),
                 (f"Mod Update Check", 'toggle_mod_check', f"State: {str(self.config.get('enable_mod_update_check', False))}. Auto-restart if mods update on Workshop."),
+                (f"Stale Cell Pruning", 'set_prune', f"State: {self.config.get('prune_on_restart', False)}. Delete map cells untouched for {self.config.get('prune_stale_days', 30)}+ days on every restart."),
                 (f"RCON Connection", '5', "Configure IP/Port/Password for remote console access."),
                 ("Back", 'b', "Return to Main Menu.")
             ]
@@ -414,10 +572,53 @@ class PZManager:
                 if val and val.isdigit():
                     self.config["backup_retention"] = int(val)
                     self.save_config()
+            elif choice == 'toggle_backup_mode':
+                curr = self.config.get("restart_backup_mode", "inline")
+                self.config["restart_backup_mode"] = "snapshot" if curr == "inline" else "inline"
+                self.save_config()
+            elif choice == 'toggle_backup_format':
+                formats = ["tar", "parallel", "dedup"]
+                curr = self.config.get("backup_format", "tar")
+                idx = formats.index(curr) if curr in formats else -1
+                self.config["backup_format"] = formats[(idx + 1) % len(formats)]
+                self.save_config()
+            elif choice == 'set_compression':
+                codec = safe_input(f"Codec ({', '.join(archive_writer.CODECS)}) [Current: {self.config.get('backup_codec', 'gzip')}]: ")
+                if codec:
+                    if codec in archive_writer.CODECS:
+                        self.config["backup_codec"] = codec
+                    else:
+                        print("Unknown codec.")
+                levels = archive_writer.CODECS.get(self.config.get("backup_codec", "gzip"), archive_writer.CODECS["gzip"])[1]
+                curr = self.config.get("backup_level", 6)
+                if curr not in levels:
+                    # Left over from another codec; the archive writer would refuse it
+                    curr = min(max(curr, levels[0]), levels[-1])
+                    self.config["backup_level"] = curr
+                    print(f"Level reset to {curr} for this codec.")
+                level = safe_input(f"Level ({levels[0]}-{levels[-1]}) [Current: {curr}]: ")
+                if level and level.isdigit() and int(level) in levels:
+                    self.config["backup_level"] = int(level)
+                workers = safe_input(f"Worker processes (0 = all cores) [Current: {self.config.get('backup_workers', 0)}]: ")
+                if workers and workers.isdigit():
+                    self.config["backup_workers"] = int(workers)
+                self.save_config()
             elif choice == 'toggle_mod_check':
                 curr = self.config.get("enable_mod_update_check", False)
                 self.config["enable_mod_update_check"] = not curr
                 self.save_config()
+            elif choice == 'set_prune':
+                curr = self.config.get("prune_on_restart", False)
+                yn = safe_input(f"Prune stale cells on restart? (y/n) [Current: {'y' if curr else 'n'}]: ")
+                if yn and yn.lower() in ('y', 'n'):
+                    self.config["prune_on_restart"] = yn.lower() == 'y'
+                days = safe_input(f"Days without changes before a cell is stale [Current: {self.config.get('prune_stale_days', 30)}]: ")
+                if days and days.isdigit() and int(days) > 0:
+                    self.config["prune_stale_days"] = int(days)
+                min_kb = safe_input(f"Skip cells smaller than (KB, 0 = none) [Current: {self.config.get('prune_min_kb', 0)}]: ")
+                if min_kb and min_kb.isdigit():
+                    self.config["prune_min_kb"] = int(min_kb)
+                self.save_config()
             elif choice == '5':
                 self.submenu_rcon()
 
@@ -467,19 +668,19 @@ class PZManager:
         last_index = 0
         while True:
             def info():
-                files = backup_tools.get_recent_backups(self)
+                # Served from the backup catalog, no per-file stat on redraw
+                entries = backup_tools.get_backup_entries(self)
                 data = {"Backup Directory": self.config['backup_dir']}
                 
-                if not files:
+                if not entries:
                     data["Status"] = "No backups found"
                 else:
-                    data["Total Backups"] = str(len(files))
+                    data["Total Backups"] = str(len(entries))
                     # List top 5
-                    for i, f in enumerate(files[:5]):
-                        size = os.path.getsize(f) / (1024 * 1024) # MB
-                        dt = os.path.getmtime(f)
-                        date_str = backup_tools.datetime.fromtimestamp(dt).strftime("%Y-%m-%d %H:%M")
-                        fname = os.path.basename(f)
+                    for i, e in enumerate(entries[:5]):
+                        size = e["size"] / (1024 * 1024) # MB
+                        date_str = backup_tools.datetime.fromtimestamp(e["timestamp"]).strftime("%Y-%m-%d %H:%M")
+                        fname = os.path.basename(e["path"])
                         data[f"#{i+1}"] = f"{fname} ({size:.1f} MB) - {date_str}"
                 
                 return format_info_box(data)
@@ -487,6 +688,8 @@ class PZManager:
             items = [
                 ("Create Backup", '1'),
                 ("Manage Backups (Restore/Delete)", '2'),
+                ("Prune Stale Map Cells", '3'),
+                ("Save Footprint (Disk Use per Map Area)", '4'),
                 ("Back", 'b')
             ]
             menu = InteractiveMenu(items, title="Backup / Restore", info_text=info, default_index=last_index)
@@ -496,6 +699,35 @@ class PZManager:
             if c == 'b' or c == 'q' or c is None: return
             elif c == '1': backup_tools.backup_data(self)
             elif c == '2': backup_tools.manage_backups_menu(self)
+            elif c == '3': self.prune_stale_cells()
+            elif c == '4':
+                print_header("Save Footprint")
+                map_footprint.run_report(self)
+                self.wait_input("Press Enter...")
+
+    def prune_stale_cells(self):
+        print_header("Prune Stale Map Cells")
+        days = self.config.get("prune_stale_days", 30)
+        print(f"Protected zones: {map_prune.get_protect_file(self)}")
+        try:
+            stats = map_prune.prune_stale_cells(self, days, dry_run=True)
+        except OSError as e:
+            print(f"{C_RED}Scan failed: {e}{C_RESET}")
+            self.wait_input("Press Enter...")
+            return
+        for line in map_prune.format_report(stats):
+            print(line)
+        if stats["stale"]:
+            print(f"\n{C_YELLOW}Stop the server first, or it will write the cells back on its next save.{C_RESET}")
+            val = safe_input(f"{C_RED}Delete these {len(stats['stale'])} cells? (type 'yes' to confirm): {C_RESET}")
+            if (val or "").lower() == 'yes':
+                stats = map_prune.delete_stale(stats) # Exactly the cells listed above
+                print(f"Deleted {stats['deleted']} files, {stats['freed'] / (1024 * 1024):.1f} MB freed.")
+                if stats["skipped"]:
+                    print(f"Kept {stats['skipped']} cells that were modified after the scan.")
+                for err in stats["errors"][:10]:
+                    print(f"{C_RED}Failed to delete {err}{C_RESET}")
+        self.wait_input("Press Enter...")
 
     def manage_mods(self):
         # Initialize internal mod manager if needed
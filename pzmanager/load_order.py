@@ -0,0 +1,167 @@
+import sys
+import time
+import heapq
+import random
+import argparse
+
+# Load order solver for the Mods= list.
+#
+# Kahn's algorithm over the active mods: a mod becomes ready once everything it
+# requires is placed, and among ready mods the one earliest in the current list
+# goes first. So the user's order only changes where a require= forces it.
+# Mods caught in a cycle can't be ordered; they are reported with the chain
+# and appended in their current order instead of being dropped.
+
+class LoadOrderResult:
+    """
+    order: the sorted mod ids
+    cycles: lists of mod ids forming a loop, first id repeated at the end
+    inactive: {required id: [mods requiring it]} for installed but inactive mods
+    missing: {required id: [mods requiring it]} for mods that aren't installed at all
+    moved: number of mods whose position changed
+    """
+    def __init__(self, order, cycles, inactive, missing, moved):
+        self.order = order
+        self.cycles = cycles
+        self.inactive = inactive
+        self.missing = missing
+        self.moved = moved
+
+    @property
+    def ok(self):
+        return not (self.cycles or self.inactive or self.missing)
+
+def _find_cycles(nodes, requires):
+    """ Iterative DFS over the mods Kahn couldn't place. Returns one chain per cycle found. """
+    cycles = []
+    members = set(nodes)
+    state = {} # 1 = on stack, 2 = done
+    for start in nodes:
+        if state.get(start): continue
+        stack = [(start, iter(requires.get(start, ())))]
+        path = [start]
+        state[start] = 1
+        while stack:
+            node, it = stack[-1]
+            for dep in it:
+                if dep not in members: continue
+                if state.get(dep) == 1:
+                    cycles.append(path[path.index(dep):] + [dep])
+                elif not state.get(dep):
+                    state[dep] = 1
+                    path.append(dep)
+                    stack.append((dep, iter(requires.get(dep, ()))))
+                    break
+            else:
+                state[node] = 2
+                path.pop()
+                stack.pop()
+    return cycles
+
+def solve(mods, requires, available=None):
+    """
+    mods: active mod ids in their current order
+    requires: {mod id: [required mod ids]}
+    available: ids of installed mods, to tell inactive requirements from missing ones
+    """
+    # Duplicates keep their first position
+    pos = {}
+    for m in mods:
+        if m not in pos: pos[m] = len(pos)
+    active = list(pos)
+    available = set(available or ())
+
+    dependents = {m: [] for m in active}
+    indegree = dict.fromkeys(active, 0)
+    inactive, missing = {}, {}
+    for m in active:
+        for dep in dict.fromkeys(requires.get(m, ())):
+            if dep == m: continue
+            if dep in pos:
+                dependents[dep].append(m)
+                indegree[m] += 1
+            else:
+                (inactive if dep in available else missing).setdefault(dep, []).append(m)
+
+    ready = [pos[m] for m in active if indegree[m] == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        m = active[heapq.heappop(ready)]
+        order.append(m)
+        for d in dependents[m]:
+            indegree[d] -= 1
+            if indegree[d] == 0:
+                heapq.heappush(ready, pos[d])
+
+    cycles = []
+    if len(order) < len(active):
+        stuck = [m for m in active if indegree[m] > 0]
+        stuck_set = set(stuck)
+        cycles = _find_cycles(stuck, {m: [d for d in requires.get(m, ()) if d in stuck_set] for m in stuck})
+        order += stuck
+
+    moved = sum(1 for i, m in enumerate(order) if pos[m] != i)
+    return LoadOrderResult(order, cycles, inactive, missing, moved)
+
+def describe(result):
+    """ Human readable problems, one per line. """
+    lines = []
+    for c in result.cycles:
+        lines.append("Cycle: " + " -> ".join(c))
+    for dep, by in sorted(result.inactive.items()):
+        lines.append(f"Inactive requirement: {dep} (required by {', '.join(by)})")
+    for dep, by in sorted(result.missing.items()):
+        lines.append(f"Missing requirement: {dep} (required by {', '.join(by)}) - not installed")
+    return lines
+
+# --- Benchmark ---
+
+def make_graph(count, max_requires=3, cycles=0, seed=1):
+    """ Random DAG of count mods (each requires up to max_requires earlier ones), plus some back edges. """
+    rng = random.Random(seed)
+    mods = [f"Mod{i}" for i in range(count)]
+    requires = {}
+    for i, m in enumerate(mods):
+        if i: requires[m] = [mods[rng.randrange(i)] for _ in range(rng.randint(0, max_requires))]
+    for _ in range(cycles):
+        a, b = sorted(rng.sample(range(count), 2))
+        requires.setdefault(mods[a], []).append(mods[b])
+    order = list(mods)
+    rng.shuffle(order)
+    return order, requires
+
+def run_benchmark(count=5000, max_requires=3, cycles=0, rounds=5):
+    order, requires = make_graph(count, max_requires, cycles)
+    times = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        res = solve(order, requires)
+        times.append(time.perf_counter() - t0)
+    # A long chain, which a recursive sort would need 'count' frames for
+    chain = [f"Mod{i}" for i in range(count)]
+    t0 = time.perf_counter()
+    solve(list(reversed(chain)), {chain[i]: [chain[i - 1]] for i in range(1, count)})
+    return {
+        "mods": count,
+        "edges": sum(len(v) for v in requires.values()),
+        "best_ms": min(times) * 1000,
+        "moved": res.moved,
+        "cycles": len(res.cycles),
+        "chain_ms": (time.perf_counter() - t0) * 1000
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load order solver benchmark")
+    parser.add_argument("--mods", type=int, default=5000)
+    parser.add_argument("--requires", type=int, default=3, help="Max requirements per mod")
+    parser.add_argument("--cycles", type=int, default=0, help="Back edges to add")
+    args = parser.parse_args(argv)
+    r = run_benchmark(args.mods, args.requires, args.cycles)
+    print(f"{r['mods']} mods, {r['edges']} requires: {r['best_ms']:.1f} ms "
+          f"({r['moved']} moved, {r['cycles']} cycles reported)")
+    print(f"{r['mods']}-long chain: {r['chain_ms']:.1f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
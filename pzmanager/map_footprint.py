@@ -0,0 +1,225 @@
+import os
+import csv
+import json
+import math
+import time
+from array import array
+from .const import CONFIG_DIR
+from .utils import atomic_write_json, file_lock
+from . import map_tools
+
+# Disk usage of a save per map cell and per region (REGION_CELLS x REGION_CELLS
+# cells), for finding the parts of the map that fill the disk.
+#
+# The save dir is streamed once with scandir (one stat per cell file); sizes are
+# collected in flat arrays and summed into array-backed grids over the bounding
+# box, so a million files need no per-file objects.
+#
+# Results are cached in footprint_cache.json per save dir, keyed by the dir's
+# mtime: creating or deleting cells bumps it, the game rewriting an existing
+# cell in place does not, so use rescan for an exact figure on a live server.
+
+CACHE_FILE = os.path.join(CONFIG_DIR, "footprint_cache.json")
+REGION_CELLS = 10
+SHADES = " .:-=+*#%@"
+HEATMAP_WIDTH = 64
+HEATMAP_HEIGHT = 24
+
+class Footprint:
+    def __init__(self, x0, y0, width, height, cell_bytes, cell_files, kinds, other_bytes, files, seconds=0.0, cached=False):
+        self.x0, self.y0 = x0, y0 # Cell coordinates of grid[0]
+        self.width, self.height = width, height
+        self.cell_bytes = cell_bytes # array('q'), row-major: index (y - y0) * width + (x - x0)
+        self.cell_files = cell_files # array('l'), same layout
+        self.kinds = kinds # {"map": bytes, "chunkdata": bytes, "zpop": bytes}
+        self.other_bytes = other_bytes # Non-cell files in the save dir (players.db, ...)
+        self.files = files
+        self.seconds = seconds
+        self.cached = cached
+
+    @property
+    def total_bytes(self):
+        return sum(self.kinds.values())
+
+    def cells(self):
+        """ Yields (x, y, bytes, files) for every cell with data. """
+        w = self.width
+        for i, b in enumerate(self.cell_bytes):
+            if b:
+                yield self.x0 + i % w, self.y0 + i // w, b, self.cell_files[i]
+
+    def regions(self, size=REGION_CELLS):
+        """ {(rx, ry): [bytes, cells]}, region rx covering cells rx*size .. rx*size+size-1. """
+        res = {}
+        for x, y, b, _ in self.cells():
+            r = res.setdefault((x // size, y // size), [0, 0])
+            r[0] += b
+            r[1] += 1
+        return res
+
+    def top_regions(self, n=10, size=REGION_CELLS):
+        return sorted(self.regions(size).items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+
+    def to_json(self):
+        return {
+            "x0": self.x0, "y0": self.y0, "width": self.width, "height": self.height,
+            "cells": [[x, y, b, n] for x, y, b, n in self.cells()],
+            "kinds": self.kinds, "other_bytes": self.other_bytes, "files": self.files
+        }
+
+    @classmethod
+    def from_json(cls, d):
+        w, h = d["width"], d["height"]
+        cell_bytes, cell_files = array('q', [0]) * (w * h), array('l', [0]) * (w * h)
+        for x, y, b, n in d["cells"]:
+            i = (y - d["y0"]) * w + (x - d["x0"])
+            cell_bytes[i], cell_files[i] = b, n
+        return cls(d["x0"], d["y0"], w, h, cell_bytes, cell_files, d["kinds"], d["other_bytes"], d["files"], cached=True)
+
+def scan(save_dir):
+    """ Streams the save dir into a Footprint. """
+    t0 = time.time()
+    xs, ys, sizes = array('l'), array('l'), array('q')
+    kinds = dict.fromkeys(map_tools.CELL_PREFIXES, 0)
+    other = 0
+    match = map_tools.CELL_FILE_RE.match
+    with os.scandir(save_dir) as it:
+        for e in it:
+            try:
+                if e.is_dir(follow_symlinks=False): continue
+                size = e.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue # Deleted while scanning
+            m = match(e.name)
+            if not m:
+                other += size
+                continue
+            xs.append(int(m.group(2)))
+            ys.append(int(m.group(3)))
+            sizes.append(size)
+            kinds[m.group(1)] += size
+
+    if xs:
+        x0, y0 = min(xs), min(ys)
+        w, h = max(xs) - x0 + 1, max(ys) - y0 + 1
+    else:
+        x0 = y0 = 0
+        w = h = 0
+    cell_bytes = array('q', [0]) * (w * h)
+    cell_files = array('l', [0]) * (w * h)
+    for x, y, s in zip(xs, ys, sizes):
+        i = (y - y0) * w + (x - x0)
+        cell_bytes[i] += s
+        cell_files[i] += 1
+    return Footprint(x0, y0, w, h, cell_bytes, cell_files, kinds, other, len(sizes), time.time() - t0)
+
+def _dir_stamp(save_dir):
+    st = os.stat(save_dir)
+    return [st.st_mtime_ns, st.st_ino]
+
+def load(save_dir, rescan=False):
+    """ Footprint of save_dir, from the cache when the directory hasn't changed. Raises OSError. """
+    save_dir = os.path.abspath(save_dir)
+    stamp = _dir_stamp(save_dir)
+    if not rescan:
+        try:
+            with open(CACHE_FILE, 'r') as f:
+                hit = json.load(f).get(save_dir)
+            if hit and hit["stamp"] == stamp:
+                return Footprint.from_json(hit["data"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    fp = scan(save_dir)
+    try:
+        with file_lock(CACHE_FILE + ".lock"):
+            try:
+                with open(CACHE_FILE, 'r') as f:
+                    data = json.load(f)
+            except Exception:
+                data = {}
+            data[save_dir] = {"stamp": stamp, "data": fp.to_json()}
+            atomic_write_json(CACHE_FILE, data)
+    except Exception as e:
+        print(f"Could not save footprint cache: {e}")
+    return fp
+
+def heatmap(fp, max_width=HEATMAP_WIDTH, max_height=HEATMAP_HEIGHT):
+    """ Text heatmap lines, one character per block of cells, darker = more bytes (log scale). """
+    if not fp.width:
+        return []
+    # Terminal characters are about twice as tall as wide
+    sx = max(1, -(-fp.width // max_width), -(-fp.height // (2 * max_height)))
+    sy = 2 * sx
+    cols, rows = -(-fp.width // sx), -(-fp.height // sy)
+    grid = array('q', [0]) * (cols * rows)
+    for x, y, b, _ in fp.cells():
+        grid[((y - fp.y0) // sy) * cols + (x - fp.x0) // sx] += b
+    peak = max(grid)
+    if not peak:
+        return [] # Only empty cell files
+    low = min(v for v in grid if v)
+    span = math.log(peak / low) or 1.0
+    steps = len(SHADES) - 2
+    lines = [f"{fp.x0}_{fp.y0} .. {fp.x0 + fp.width - 1}_{fp.y0 + fp.height - 1}, "
+             f"{sx}x{sy} cells per char, '{SHADES[1]}' {low / 1024:.0f} KB .. '{SHADES[-1]}' {peak / (1024 * 1024):.1f} MB"]
+    for r in range(rows):
+        row = grid[r * cols:(r + 1) * cols]
+        lines.append("".join(SHADES[1 + int(math.log(v / low) / span * steps)] if v else SHADES[0] for v in row))
+    return lines
+
+def format_report(fp, top=10, size=REGION_CELLS):
+    mb = lambda b: b / (1024 * 1024)
+    src = "cached" if fp.cached else f"scanned in {fp.seconds:.2f}s"
+    lines = [
+        f"{fp.files} cell files, {mb(fp.total_bytes):.1f} MB ({src}), other files {mb(fp.other_bytes):.1f} MB",
+        "  " + ", ".join(f"{k} {mb(v):.1f} MB" for k, v in fp.kinds.items())
+    ]
+    regions = fp.top_regions(top, size)
+    if regions:
+        lines.append(f"\nLargest regions ({size}x{size} cells):")
+        for (rx, ry), (b, n) in regions:
+            x1, y1 = rx * size, ry * size
+            lines.append(f"  {x1}_{y1}..{x1 + size - 1}_{y1 + size - 1}  {mb(b):8.1f} MB  {n} cells")
+    return lines
+
+def write_output(fp, path, size=REGION_CELLS):
+    """ Per-cell rows as CSV, or cells and regions as JSON when path ends in .json. """
+    if path.endswith(".json"):
+        data = {
+            "cells": [{"x": x, "y": y, "bytes": b, "files": n} for x, y, b, n in fp.cells()],
+            "regions": [{"x": rx * size, "y": ry * size, "size": size, "bytes": b, "cells": n}
+                        for (rx, ry), (b, n) in sorted(fp.regions(size).items())],
+            "kinds": fp.kinds,
+            "other_bytes": fp.other_bytes
+        }
+        with open(path, 'w') as f:
+            f.write(json.dumps(data))
+    else:
+        with open(path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(["x", "y", "region_x", "region_y", "bytes", "files"])
+            for x, y, b, n in fp.cells():
+                w.writerow([x, y, x // size * size, y // size * size, b, n])
+
+def run_report(mgr, top=10, out=None, rescan=False):
+    """ Prints the footprint of the instance's save, optionally writing it to out. """
+    save_dir = map_tools.get_save_dir(mgr)
+    try:
+        fp = load(save_dir, rescan=rescan)
+    except OSError as e:
+        print(f"Cannot read save dir {save_dir}: {e}")
+        return None
+    for line in heatmap(fp):
+        print(line)
+    print()
+    for line in format_report(fp, top):
+        print(line)
+    if out:
+        try:
+            write_output(fp, out)
+        except OSError as e:
+            print(f"Cannot write {out}: {e}")
+            return fp
+        print(f"\nWrote {out}")
+    return fp
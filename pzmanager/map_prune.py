@@ -0,0 +1,138 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import map_tools
+
+# Deletes map cells nobody has been to in a while, so the save dir stops
+# growing with every explored corner of the map. A cell counts as untouched
+# when none of its map/chunkdata/zpop files changed for prune_stale_days.
+# Cells in Zomboid/Lua/protected_zones.txt (reset_zones.txt syntax, ranges
+# and !exclusions included) are never pruned.
+#
+# The game regenerates a deleted cell the next time someone walks into it,
+# so this loses player changes there (bases, loot, dead zombies).
+
+DEFAULT_STALE_DAYS = 30
+REPORT_TOP = 10 # Largest stale cells listed in the dry-run report
+
+def get_protect_file(mgr):
+    return os.path.join(mgr.config['install_dir'], "Zomboid/Lua/protected_zones.txt")
+
+def load_protected(mgr):
+    """ ZoneIndex of protected cells, empty if there is no file. """
+    try:
+        return map_tools.load_zones(get_protect_file(mgr))
+    except FileNotFoundError:
+        return map_tools.ZoneIndex()
+
+def select_stale(cells, days, protect=None, min_bytes=0, now=None):
+    """
+    cells: index_cell_stats output. Returns the stale cells, largest first, and
+    how many stale cells were kept because they are protected.
+    """
+    cutoff = (now or time.time()) - days * 86400
+    stale, kept = [], 0
+    for xy, (mtime, size, _) in cells.items():
+        if mtime >= cutoff or size < min_bytes: continue
+        if protect is not None and xy in protect:
+            kept += 1
+            continue
+        stale.append(xy)
+    stale.sort(key=lambda xy: cells[xy][1], reverse=True)
+    return stale, kept
+
+def prune_stale_cells(mgr, days=None, dry_run=True):
+    """
+    Finds (and unless dry_run, deletes) the stale cells of the instance's save.
+    Only delete with the server stopped. Returns a stats dict.
+    """
+    if days is None:
+        days = int(mgr.config.get("prune_stale_days", DEFAULT_STALE_DAYS))
+    min_bytes = int(mgr.config.get("prune_min_kb", 0)) * 1024
+    save_dir = map_tools.get_save_dir(mgr)
+    t0 = time.time()
+    cells = map_tools.index_cell_stats(save_dir)
+    stale, kept = select_stale(cells, days, load_protected(mgr), min_bytes, now=t0)
+
+    stats = {
+        "days": days,
+        "save_dir": save_dir,
+        "cutoff": t0 - days * 86400,
+        "cells": len(cells),
+        "total_bytes": sum(c[1] for c in cells.values()),
+        "stale": stale,
+        "stale_names": {xy: cells[xy][2] for xy in stale},
+        "stale_bytes": sum(cells[xy][1] for xy in stale),
+        "stale_files": sum(len(cells[xy][2]) for xy in stale),
+        "largest": [(xy, cells[xy][1]) for xy in stale[:REPORT_TOP]],
+        "protected": kept,
+        "deleted": 0,
+        "freed": 0,
+        "skipped": 0,
+        "errors": [],
+        "dry_run": dry_run
+    }
+    stats["seconds"] = time.time() - t0
+    if not dry_run:
+        delete_stale(stats)
+    return stats
+
+def _delete_cell(save_dir, names, cutoff):
+    # Re-checked right before unlinking: a cell written since the scan is kept whole
+    paths = [os.path.join(save_dir, name) for name in names]
+    for p in paths:
+        try:
+            if os.lstat(p).st_mtime >= cutoff:
+                return None
+        except FileNotFoundError:
+            continue
+        except OSError:
+            return None
+    return [map_tools.delete_file(p) for p in paths]
+
+def delete_stale(stats, workers=map_tools.DELETE_WORKERS):
+    """
+    Deletes exactly the cells listed in a prune_stale_cells result (what the
+    dry run showed), skipping any that were modified since. Updates and returns stats.
+    """
+    t0 = time.time()
+    save_dir, cutoff, names = stats["save_dir"], stats["cutoff"], stats["stale_names"]
+    stale = stats["stale"]
+    if stale:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(stale)))) as pool:
+            for res in pool.map(lambda xy: _delete_cell(save_dir, names[xy], cutoff), stale):
+                if res is None:
+                    stats["skipped"] += 1
+                    continue
+                for ok, size, err in res:
+                    if ok:
+                        stats["deleted"] += 1
+                        stats["freed"] += size
+                    elif err:
+                        stats["errors"].append(err)
+    stats["dry_run"] = False
+    stats["seconds"] += time.time() - t0
+    return stats
+
+def format_report(stats):
+    """ Report lines for a prune_stale_cells result. """
+    mb = lambda b: b / (1024 * 1024)
+    lines = [
+        f"Scanned {stats['cells']} cells ({mb(stats['total_bytes']):.1f} MB) in {stats['seconds']:.2f}s.",
+        f"Untouched for {stats['days']}+ days: {len(stats['stale'])} cells, {stats['stale_files']} files, "
+        f"{mb(stats['stale_bytes']):.1f} MB ({100 * stats['stale_bytes'] / max(stats['total_bytes'], 1):.0f}% of the save)."
+    ]
+    if stats["protected"]:
+        lines.append(f"Kept {stats['protected']} stale cells inside protected zones.")
+    if stats["dry_run"]:
+        for (x, y), size in stats["largest"]:
+            lines.append(f"    {x}_{y}  {mb(size):.2f} MB")
+        if len(stats["stale"]) > len(stats["largest"]):
+            lines.append(f"    ... and {len(stats['stale']) - len(stats['largest'])} more")
+    else:
+        lines.append(f"Deleted {stats['deleted']} files, {mb(stats['freed']):.1f} MB freed.")
+        if stats["skipped"]:
+            lines.append(f"Kept {stats['skipped']} cells that were modified after the scan.")
+        if stats["errors"]:
+            lines.append(f"{len(stats['errors'])} files could not be deleted, e.g. {stats['errors'][0]}")
+    return lines
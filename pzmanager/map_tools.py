@@ -0,0 +1,205 @@
+import os
+import re
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+# Helpers for the per-cell files of a multiplayer save:
+#   map_X_Y.bin, chunkdata_X_Y.bin, zpop_X_Y.bin
+
+CELL_PREFIXES = ("map", "chunkdata", "zpop")
+CELL_FILE_RE = re.compile(r'^(map|chunkdata|zpop)_(-?\d+)_(-?\d+)\.bin$')
+
+def get_save_dir(mgr):
+    return os.path.join(mgr.config['install_dir'], f"Zomboid/Saves/Multiplayer/{mgr.config['server_name']}")
+
+def parse_cell_file(fname):
+    """ 'map_10_20.bin' -> ('map', 10, 20), None for anything else. """
+    m = CELL_FILE_RE.match(fname)
+    if not m:
+        return None
+    return m.group(1), int(m.group(2)), int(m.group(3))
+
+def cell_files(x, y):
+    return [f"{p}_{x}_{y}.bin" for p in CELL_PREFIXES]
+
+def parse_cell(text):
+    """ 'X_Y' -> (x, y). Raises ValueError on bad input. """
+    parts = text.strip().split("_")
+    if len(parts) != 2:
+        raise ValueError(f"Invalid cell '{text}', expected X_Y")
+    return int(parts[0]), int(parts[1])
+
+def parse_rect(text):
+    """
+    'X_Y' or 'X1_Y1..X2_Y2' -> (x1, y1, x2, y2), inclusive and normalized so
+    that x1 <= x2 and y1 <= y2.
+    """
+    if ".." in text:
+        a, b = text.split("..", 1)
+        x1, y1 = parse_cell(a)
+        x2, y2 = parse_cell(b)
+    else:
+        x1, y1 = x2, y2 = parse_cell(text)
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+DELETE_WORKERS = 8 # unlink is mostly waiting on the filesystem, threads overlap it
+
+def index_cells(save_dir):
+    """
+    One pass over the save dir: {(x, y): [file names]} for every cell file.
+    Uses the names scandir returns, so no file is stat'ed.
+    """
+    cells = {}
+    with os.scandir(save_dir) as it:
+        for e in it:
+            m = CELL_FILE_RE.match(e.name)
+            if m:
+                cells.setdefault((int(m.group(2)), int(m.group(3))), []).append(e.name)
+    return cells
+
+def index_cell_stats(save_dir):
+    """
+    Like index_cells, with sizes and times: {(x, y): [newest mtime, total bytes, [file names]]}.
+    Costs one stat per cell file.
+    """
+    cells = {}
+    with os.scandir(save_dir) as it:
+        for e in it:
+            m = CELL_FILE_RE.match(e.name)
+            if not m: continue
+            try:
+                st = e.stat(follow_symlinks=False)
+            except OSError:
+                continue # Deleted while we were scanning
+            key = (int(m.group(2)), int(m.group(3)))
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [st.st_mtime, st.st_size, [e.name]]
+            else:
+                if st.st_mtime > cell[0]: cell[0] = st.st_mtime
+                cell[1] += st.st_size
+                cell[2].append(e.name)
+    return cells
+
+def delete_file(path):
+    """ Removes one file. Returns (deleted, bytes freed, error or None); a missing file is not an error. """
+    try:
+        size = os.lstat(path).st_size
+        os.unlink(path)
+        return True, size, None
+    except FileNotFoundError:
+        return False, 0, None # Already gone
+    except OSError as e:
+        return False, 0, f"{os.path.basename(path)}: {e}"
+
+def delete_files(paths, workers=DELETE_WORKERS):
+    """ Removes paths on a thread pool. Returns (deleted, bytes freed, [errors]). """
+    deleted = freed = 0
+    errors = []
+    if not paths:
+        return deleted, freed, errors
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths)))) as pool:
+        for ok, size, err in pool.map(delete_file, paths):
+            if ok:
+                deleted += 1
+                freed += size
+            elif err:
+                errors.append(err)
+    return deleted, freed, errors
+
+# --- Reset zones ---
+#
+# reset_zones.txt holds one entry per line (the ResetZone mod writes plain X_Y):
+#   10_20               one cell
+#   100_200..140_260    every cell of the rectangle, corners included
+#   !120_230..125_235   never reset these (safehouses), wins over any include
+#   # comment
+# The list compiles to a ZoneIndex: per x column, sorted disjoint y intervals.
+
+def _merge(intervals):
+    out = []
+    for a, b in sorted(intervals):
+        if out and a <= out[-1][1] + 1:
+            if b > out[-1][1]: out[-1][1] = b
+        else:
+            out.append([a, b])
+    return out
+
+def _subtract(inc, exc):
+    # Both merged and sorted
+    out = []
+    j = 0
+    for a, b in inc:
+        while j < len(exc) and exc[j][1] < a:
+            j += 1
+        k = j
+        while a <= b and k < len(exc) and exc[k][0] <= b:
+            if exc[k][0] > a:
+                out.append((a, exc[k][0] - 1))
+            a = max(a, exc[k][1] + 1)
+            k += 1
+        if a <= b:
+            out.append((a, b))
+    return out
+
+class ZoneIndex:
+    def __init__(self, include=(), exclude=()):
+        """ include/exclude: (x1, y1, x2, y2) rects as returned by parse_rect. """
+        cols, ex = {}, {}
+        for target, rects in ((cols, include), (ex, exclude)):
+            for x1, y1, x2, y2 in rects:
+                for x in range(x1, x2 + 1):
+                    target.setdefault(x, []).append((y1, y2))
+        self.cols = {}
+        for x, ivs in cols.items():
+            ivs = _subtract(_merge(ivs), _merge(ex.get(x, ())))
+            if ivs:
+                self.cols[x] = ([a for a, _ in ivs], [b for _, b in ivs])
+        self.bad = 0 # Unparsable lines, set by load_zones
+
+    def __contains__(self, cell):
+        col = self.cols.get(cell[0])
+        if not col: return False
+        i = bisect.bisect_right(col[0], cell[1]) - 1
+        return i >= 0 and cell[1] <= col[1][i]
+
+    def __len__(self):
+        """ Number of cells covered. """
+        return sum(b - a + 1 for starts, ends in self.cols.values() for a, b in zip(starts, ends))
+
+    def match(self, cells):
+        """ The given (x, y) cells that fall inside the zones. """
+        return [c for c in cells if c in self]
+
+def parse_zones(lines):
+    """ Builds a ZoneIndex from reset_zones.txt lines. """
+    include, exclude = [], []
+    bad = 0
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if not line: continue
+        target = include
+        if line.startswith("!"):
+            target, line = exclude, line[1:].strip()
+        try:
+            target.append(parse_rect(line))
+        except ValueError:
+            bad += 1
+    index = ZoneIndex(include, exclude)
+    index.bad = bad
+    return index
+
+# path -> ((mtime_ns, size), ZoneIndex); an unchanged zone file costs one stat
+_zone_cache = {}
+
+def load_zones(path):
+    """ Compiled ZoneIndex of a zone file, reused until the file changes. Raises OSError. """
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    hit = _zone_cache.get(path)
+    if hit and hit[0] == stamp:
+        return hit[1]
+    with open(path, 'r') as f:
+        index = parse_zones(f)
+    _zone_cache[path] = (stamp, index)
+    return index
@@ -0,0 +1,129 @@
+import os
+import json
+from .const import CONFIG_DIR
+from .utils import atomic_write_json, file_lock
+
+# File overlap analysis: two active mods shipping the same media/... path
+# override each other, and the one later in Mods= wins.
+#
+# The file lists live next to mod_index.json, keyed by the same item stamp
+# (mods dir mtime, ACF timeupdated), so only items that changed are walked again:
+#   { <workshop content dir>: { <wid>: { "stamp": [...], "files": { <folder>: [relpath, ...] } } } }
+
+FILES_INDEX = os.path.join(CONFIG_DIR, "mod_files.json")
+
+def _is_version_dir(name):
+    # B42 layout: mods/<Mod>/common/media/..., mods/<Mod>/42/media/...
+    return name == "common" or name.replace(".", "").isdigit()
+
+def scan_mod_files(mod_path):
+    """ Relative media/ paths a mod provides, with the B42 version folder stripped. """
+    found = set()
+    stack = [(mod_path, "")]
+    while stack:
+        path, rel = stack.pop()
+        try:
+            it = os.scandir(path)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                name = rel + e.name
+                if e.is_dir(follow_symlinks=False):
+                    if not rel and _is_version_dir(e.name):
+                        stack.append((e.path, "")) # Treat as the mod root
+                    elif rel or e.name == "media":
+                        stack.append((e.path, name + "/"))
+                elif rel:
+                    found.add(name)
+    return sorted(found)
+
+class ModFileIndex:
+    def __init__(self, mod_index):
+        self.mod_index = mod_index
+        self.content_dir = mod_index.content_dir
+        self.items = self._load()
+        self.rescanned = 0
+
+    def _load(self):
+        try:
+            with open(FILES_INDEX, 'r') as f:
+                return json.load(f).get(self.content_dir, {})
+        except Exception:
+            return {}
+
+    def _save(self, changed):
+        try:
+            with file_lock(FILES_INDEX + ".lock"):
+                try:
+                    with open(FILES_INDEX, 'r') as f:
+                        data = json.load(f)
+                except Exception:
+                    data = {}
+                mine = data.setdefault(self.content_dir, {})
+                for wid in changed:
+                    mine[wid] = self.items[wid]
+                atomic_write_json(FILES_INDEX, data)
+        except Exception as e:
+            print(f"Could not save mod file index: {e}")
+
+    def refresh(self, wids):
+        """ Walks the items whose mod index stamp changed. Returns how many were walked. """
+        wids = [str(w) for w in wids]
+        self.mod_index.refresh(wids)
+        changed = []
+        for wid in wids:
+            item = self.mod_index.items.get(wid, {})
+            cur = self.items.get(wid)
+            if cur and cur.get("stamp") == item.get("stamp"):
+                continue
+            self.items[wid] = {
+                "stamp": item.get("stamp"),
+                "files": {m["folder"]: scan_mod_files(m["path"]) for m in item.get("mods", [])}
+            }
+            changed.append(wid)
+        if changed:
+            self.rescanned += len(changed)
+            self._save(changed)
+        return len(changed)
+
+    def mod_files(self, wid, folder):
+        return self.items.get(str(wid), {}).get("files", {}).get(folder, [])
+
+def find_conflicts(mods, workshop_items, file_index):
+    """
+    Paths provided by more than one active mod.
+    Returns {relpath: [mod ids in load order]}; the last one is what the game uses.
+    """
+    file_index.refresh(workshop_items)
+    by_id = file_index.mod_index.mods_by_id(workshop_items)
+    providers = {}
+    for m in dict.fromkeys(mods):
+        entry = by_id.get(m)
+        if not entry: continue
+        for path in file_index.mod_files(entry["wid"], entry["folder"]):
+            providers.setdefault(path, []).append(m)
+    return {p: ms for p, ms in providers.items() if len(ms) > 1}
+
+def group_conflicts(conflicts):
+    """ [(mod ids, paths)] grouped by the set of mods involved, biggest overlap first. """
+    groups = {}
+    for path, ms in conflicts.items():
+        groups.setdefault(tuple(ms), []).append(path)
+    return sorted(((ms, sorted(paths)) for ms, paths in groups.items()), key=lambda g: (-len(g[1]), g[0]))
+
+def format_report(conflicts, samples=5):
+    """ Report lines for the menu. """
+    if not conflicts:
+        return ["No file conflicts between active mods."]
+    groups = group_conflicts(conflicts)
+    lines = [f"{len(conflicts)} overlapping files in {len(groups)} mod group(s). Later mods in Mods= win."]
+    for ms, paths in groups:
+        lines.append("")
+        names = ms if len(ms) <= 6 else ms[:2] + (f"... {len(ms) - 4} more ...",) + ms[-2:]
+        lines.append(f"{' < '.join(names)}: {len(paths)} file(s), {ms[-1]} wins")
+        for p in paths[:samples]:
+            lines.append(f"    {p}")
+        if len(paths) > samples:
+            lines.append(f"    ... and {len(paths) - samples} more")
+    return lines
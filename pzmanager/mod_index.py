@@ -0,0 +1,145 @@
+import os
+import json
+from .const import CONFIG_DIR
+from .utils import atomic_write_json, file_lock
+from .vdf import parse_workshop_acf
+
+# Persistent index of the mods inside downloaded workshop items, so sorting and
+# the mod menus don't list directories and re-read every mod.info each time.
+#
+# Layout of mod_index.json:
+#   { <workshop content dir>: { <wid>: { "stamp": [mods dir mtime_ns, acf timeupdated],
+#                                        "mods": [ {folder, id, name, require, version, path} ] } } }
+#
+# An item is rescanned only when its stamp changed: adding/removing a mod
+# folder touches the mods dir, and a Steam update bumps timeupdated in the ACF.
+
+INDEX_FILE = os.path.join(CONFIG_DIR, "mod_index.json")
+WORKSHOP_CONTENT = "steamapps/workshop/content/108600"
+ACF_FILE = "steamapps/workshop/appworkshop_108600.acf"
+
+def parse_mod_info(path):
+    """ Reads the fields we use from a mod.info. """
+    info = {"id": None, "name": None, "require": [], "version": None}
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            key, sep, val = line.partition("=")
+            if not sep: continue
+            key, val = key.strip().lower(), val.strip()
+            if key == "id":
+                info["id"] = val
+            elif key == "name":
+                info["name"] = val
+            elif key == "require":
+                # require=mod1,mod2 (B42 also writes \ModId entries)
+                info["require"] = [r.strip().lstrip("\\") for r in val.split(",") if r.strip().lstrip("\\")]
+            elif key == "modversion":
+                info["version"] = val
+    return info
+
+def _find_mod_info(mod_dir):
+    # B41 keeps mod.info at the top, B42 in a version folder (42, 42.0, ...)
+    p = os.path.join(mod_dir, "mod.info")
+    if os.path.isfile(p):
+        return p
+    try:
+        subs = sorted((e.name for e in os.scandir(mod_dir) if e.is_dir()), reverse=True)
+    except OSError:
+        return None
+    for sub in subs:
+        p = os.path.join(mod_dir, sub, "mod.info")
+        if os.path.isfile(p):
+            return p
+    return None
+
+def scan_item(item_dir):
+    """ Entries for every mod folder of one workshop item. """
+    mods_dir = os.path.join(item_dir, "mods")
+    res = []
+    try:
+        entries = sorted(os.scandir(mods_dir), key=lambda e: e.name)
+    except OSError:
+        return res
+    for e in entries:
+        if not e.is_dir(): continue
+        info_path = _find_mod_info(e.path)
+        entry = {"folder": e.name, "id": e.name, "name": e.name, "require": [], "version": None, "path": e.path}
+        if info_path:
+            try:
+                info = parse_mod_info(info_path)
+                entry.update({k: v for k, v in info.items() if v})
+            except OSError:
+                pass
+        res.append(entry)
+    return res
+
+class ModIndex:
+    def __init__(self, install_dir):
+        self.install_dir = install_dir
+        self.content_dir = os.path.join(install_dir, WORKSHOP_CONTENT)
+        self.acf_path = os.path.join(install_dir, ACF_FILE)
+        self.items = self._load()
+        self.rescanned = 0 # Items re-read since this object was created
+
+    def _load(self):
+        try:
+            with open(INDEX_FILE, 'r') as f:
+                return json.load(f).get(self.content_dir, {})
+        except Exception:
+            return {}
+
+    def _save(self, changed):
+        # Merge our items into whatever other processes wrote meanwhile
+        try:
+            with file_lock(INDEX_FILE + ".lock"):
+                try:
+                    with open(INDEX_FILE, 'r') as f:
+                        data = json.load(f)
+                except Exception:
+                    data = {}
+                mine = data.setdefault(self.content_dir, {})
+                for wid in changed:
+                    if wid in self.items: mine[wid] = self.items[wid]
+                    else: mine.pop(wid, None)
+                atomic_write_json(INDEX_FILE, data)
+        except Exception as e:
+            print(f"Could not save mod index: {e}")
+
+    def _stamp(self, wid, acf):
+        try:
+            mtime = os.stat(os.path.join(self.content_dir, wid, "mods")).st_mtime_ns
+        except OSError:
+            mtime = None
+        return [mtime, acf.get(wid, 0)]
+
+    def refresh(self, wids):
+        """ Rescans the items whose stamp changed. Returns how many were rescanned. """
+        acf = parse_workshop_acf(self.acf_path)
+        changed = []
+        for wid in (str(w) for w in wids):
+            stamp = self._stamp(wid, acf)
+            cur = self.items.get(wid)
+            if cur and cur.get("stamp") == stamp:
+                continue
+            self.items[wid] = {"stamp": stamp, "mods": scan_item(os.path.join(self.content_dir, wid))}
+            changed.append(wid)
+        if changed:
+            self.rescanned += len(changed)
+            self._save(changed)
+        return len(changed)
+
+    def item_mods(self, wid):
+        """ Index entries of one workshop item (refreshed if it changed). """
+        wid = str(wid)
+        self.refresh([wid])
+        return self.items[wid]["mods"]
+
+    def mods_by_id(self, wids):
+        """ {mod id: entry + 'wid'} over the given workshop items. First item wins on duplicate ids. """
+        self.refresh(wids)
+        res = {}
+        for wid in (str(w) for w in wids):
+            for m in self.items.get(wid, {}).get("mods", []):
+                if m["id"] not in res:
+                    res[m["id"]] = dict(m, wid=wid)
+        return res
@@ -5,6 +5,10 @@ import time
 from .const import *
 from .utils import print_header, InteractiveMenu, SelectionMenu, ReorderMenu, get_key, clear_screen, safe_input
 from .steam_integration import SteamIntegration
+from .steam_tools import download_workshop_items
+from .mod_index import ModIndex
+from . import load_order
+from .mod_conflicts import ModFileIndex, find_conflicts, format_report
 import itertools
 
 class InternalModManager:
@@ -15,6 +19,8 @@ class InternalModManager:
         self.workshop_items = []
         self.mods = []
         self.steam_int = SteamIntegration()
+        self.mod_index = ModIndex(install_dir)
+        self.file_index = ModFileIndex(self.mod_index)
         self.title_cache = {}
 
     def load(self):
@@ -57,18 +63,18 @@ class InternalModManager:
         cmd = [steam, "+force_install_dir", self.install_dir, "+login", "anonymous", "+workshop_download_item", "108600", str(wid), "+quit"]
         subprocess.run(cmd)
 
+    def download_many(self, wids, verbose=True):
+        """ Downloads several workshop items in one steamcmd session. See steam_tools.download_workshop_items. """
+        return download_workshop_items(self.steamcmd_dir, self.install_dir, wids, verbose=verbose)
+
     def get_mods_for_item(self, wid):
-        path = os.path.join(self.install_dir, "steamapps/workshop/content/108600", str(wid), "mods")
-        found = []
-        if os.path.exists(path):
-            for d in os.listdir(path):
-                found.append(d)
-        return found
+        # Mod folders of the item, from the index (only rescanned when the item changed)
+        return [m["folder"] for m in self.mod_index.item_mods(wid)]
 
     def get_workshop_title(self, wid):
         # Use SteamIntegration to get title
         wid = str(wid)
-        details = self.steam_int.get_item_details([wid])
+        details = self.steam_int.get_item_details([wid], fields=("title",))
         info = details.get(wid)
         if info:
             return info.get("title", f"Unknown ({wid})")
@@ -87,81 +93,15 @@ class InternalModManager:
 
     def sort_mods_by_dependency(self):
         """
-        Sorts self.mods based on require= in mod.info
+        Sorts self.mods based on require= in mod.info.
+        Returns the LoadOrderResult (cycles, inactive/missing requirements).
         """
-        # 1. Build Dependency Graph
-        # Map: ModID -> { set of required ModIDs }
-        adj = {}
-        all_available_mods = {} # Map ModID -> (WorkshopID, Path)
-        
-        # Scan all installed workshop items to find ModIDs
-        for wid in self.workshop_items:
-            path = os.path.join(self.install_dir, "steamapps/workshop/content/108600", str(wid), "mods")
-            if os.path.exists(path):
-                for d in os.listdir(path):
-                    mod_info_path = os.path.join(path, d, "mod.info")
-                    if os.path.exists(mod_info_path):
-                        # Parse
-                        m_id = d # Default folder name
-                        requires = []
-                        try:
-                            with open(mod_info_path, "r", encoding="utf-8", errors="ignore") as f:
-                                for line in f:
-                                    if line.startswith("id="):
-                                        m_id = line.split("=", 1)[1].strip()
-                                    elif line.startswith("require="):
-                                        # require=mod1,mod2
-                                        req_str = line.split("=", 1)[1].strip()
-                                        requires = [r.strip() for r in req_str.split(",") if r.strip()]
-                        except: pass
-                        
-                        all_available_mods[m_id] = wid
-                        adj[m_id] = set(requires)
-
-        # 2. Build subgraph of active mods only
-        active = set(self.mods)
-        # Verify all active mods are found?
-        
-        # 3. Topological Sort
-        # Provide order
-        ordered = []
-        visited = set()
-        temp = set()
-
-        def visit(node):
-            if node in temp:
-                # Cycle detected
-                return
-            if node in visited:
-                return
-            if node not in active:
-                # Dependency not active? 
-                # Should we auto-activate or just ignore ordering constraint for missing node?
-                return 
-
-            temp.add(node)
-            
-            # Visit dependencies first
-            reqs = adj.get(node, set())
-            for r in reqs:
-                visit(r)
-                
-            temp.remove(node)
-            visited.add(node)
-            ordered.append(node)
-
-        for m in self.mods:
-             # Just strict order?
-             # Note: if cycle, simple DFS might fail or infinite recursion without temp check
-             visit(m)
-             
-        # Add any disconnected components (should be covered by loop but verify)
-        # ordered contains sorted list
-        # However, visit might skip nodes if 'active' check prevents it?
-        # Actually visit(m) ensures we process all requested mods.
-        
-        # Replace
-        self.mods = ordered
+        # ModIDs of all installed workshop items, from the mod index
+        index = self.mod_index.mods_by_id(self.workshop_items)
+        requires = {m_id: entry["require"] for m_id, entry in index.items()}
+        res = load_order.solve(self.mods, requires, available=index)
+        self.mods = res.order
+        return res
 
     def run(self):
         if not self.load(): return
@@ -170,7 +110,7 @@ class InternalModManager:
         while True:
             # OPTIMIZATION: Batch fetch details for all items to populate cache
             # This avoids N+1 API calls during the sort loop and rendering
-            self.steam_int.get_item_details(self.workshop_items)
+            self.steam_int.get_item_details(self.workshop_items, fields=("title",))
             
             # Sort workshop items by title
             self.workshop_items.sort(key=lambda x: self.get_workshop_title(x).lower())
@@ -187,7 +127,9 @@ class InternalModManager:
             items_display.append(("Add Workshop Item", 'add', "Add a new mod by ID (checks dependencies)"))
             items_display.append(("Global Mod Load Order (Manual)", 'order', "Reorder the active mods list manually"))
             items_display.append(("Auto-Sort Load Order (Dependency Check)", 'sort', "Sort active mods based on 'require=' fields"))
+            items_display.append(("File Conflicts Report", 'conflicts', "Files shipped by more than one active mod, and which one wins"))
             items_display.append(("Update Workshop Names (Cache)", 'cache', "Refresh titles from Steam Workshop"))
+            items_display.append(("Download / Update All Items", 'download_all', "Download every workshop item in one SteamCMD session"))
             items_display.append((f"{C_YELLOW}--- Active Workshop Items ---{C_RESET}", None, ""))
             
             for i, wid in enumerate(self.workshop_items):
@@ -221,11 +163,34 @@ class InternalModManager:
                         if (yn or 'y').lower() == 'y':
                             self.download(wid)
             
+            elif choice == 'download_all':
+                if self.workshop_items:
+                    res = self.download_many(self.workshop_items)
+                    if res["failed"]:
+                        print(f"{C_RED}Failed: {', '.join(f'{w} ({r})' for w, r in res['failed'].items())}{C_RESET}")
+                    safe_input("Press Enter to continue...")
+
             elif choice == 'sort':
                 print("Sorting mods...")
                 old_mods = list(self.mods)
-                self.sort_mods_by_dependency()
-                
+                res = self.sort_mods_by_dependency()
+
+                # Offer to switch on requirements that are installed but inactive
+                while res.inactive:
+                    for line in load_order.describe(res):
+                        if line.startswith("Inactive"):
+                            print(f" {C_YELLOW}{line}{C_RESET}")
+                    ans = safe_input(f"\nActivate {len(res.inactive)} required mod(s)? (Y/n): ")
+                    if ans is None or ans.lower() not in ('', 'y', 'yes'): # Ctrl+C cancels
+                        break
+                    self.mods.extend(sorted(res.inactive))
+                    res = self.sort_mods_by_dependency()
+
+                # Cycles and mods that aren't installed need the user's attention
+                for line in load_order.describe(res):
+                    if not line.startswith("Inactive"):
+                        print(f" {C_RED}{line}{C_RESET}")
+
                 if old_mods == self.mods:
                     print(f"{C_GREEN}Load order is already optimal.{C_RESET}")
                 else:
@@ -248,11 +213,22 @@ class InternalModManager:
                 safe_input("\nPress Enter...")
                 self.save()
 
+            elif choice == 'conflicts':
+                print("Indexing mod files...")
+                t0 = time.time()
+                conflicts = find_conflicts(self.mods, self.workshop_items, self.file_index)
+                print(f"Done in {time.time() - t0:.2f}s ({self.file_index.rescanned} item(s) rescanned).\n")
+                for line in format_report(conflicts):
+                    print(line)
+                safe_input("\nPress Enter...")
+
             elif choice == 'cache':
                 print("Refreshing Workshop Cache from Steam API...")
                 # Force refresh calls API regardless of cache age
                 self.steam_int.get_item_details(self.workshop_items, force_refresh=True)
+                removed = self.steam_int.evict_unreferenced()
                 print("Cache updated. Titles and dependencies refreshed.")
+                if removed: print(f"Removed {removed} entries no instance uses anymore.")
                 time.sleep(1)
 
             elif choice == 'order': # Global Order
@@ -264,8 +240,8 @@ class InternalModManager:
                 
                 for wid in self.workshop_items:
                     wid_colors[wid] = next(cyc)
-                    for m in self.get_mods_for_item(wid):
-                        mod_map[m] = wid
+                for m_id, entry in self.mod_index.mods_by_id(self.workshop_items).items():
+                    mod_map[m_id] = mod_map[entry["folder"]] = entry["wid"]
                         
                 def renderer(m):
                     wid = mod_map.get(m)
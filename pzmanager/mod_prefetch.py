@@ -0,0 +1,77 @@
+import os
+import time
+import threading
+from .mod_manager import InternalModManager
+from .update_checker import ModUpdateChecker
+
+# Downloads updated workshop items while the restart countdown is running.
+#
+# steamcmd writes into the server's own workshop dir and ACF
+# (steamapps/workshop/appworkshop_108600.acf), so once the ACF timeupdated of
+# every item has caught up with Steam the server finds nothing to download
+# when it boots. The download time is what players no longer wait for.
+
+class ModPrefetch:
+    """
+    One background steamcmd session for a set of workshop IDs.
+    remote: Steam details ({wid: {time_updated, ...}}) the items are verified against.
+    """
+    def __init__(self, mgr, ids, remote):
+        self.mgr = mgr
+        self.ids = [str(w) for w in ids]
+        self.remote = remote or {}
+        self.attempts = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.missing = list(self.ids)
+        self.error = None
+        self._thread = None
+
+    @property
+    def done(self):
+        return self._thread is not None and not self._thread.is_alive()
+
+    @property
+    def ok(self):
+        return self.done and not self.missing
+
+    def start(self):
+        self.attempts += 1
+        self._thread = threading.Thread(target=self._run, name="pz-mod-prefetch", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        cfg = self.mgr.config
+        mm = InternalModManager(cfg['install_dir'], cfg['steamcmd_dir'], cfg['server_name'])
+        t0 = time.time()
+        try:
+            res = mm.download_many(self.missing, verbose=False)
+            if res["failed"]:
+                self.error = ", ".join(f"{w}: {r}" for w, r in res["failed"].items())
+        except Exception as e:
+            self.error = str(e)
+        self.seconds += time.time() - t0
+        self.verify()
+
+    def verify(self):
+        """ Items whose ACF timeupdated is still older than Steam's time_updated end up in .missing. """
+        local = ModUpdateChecker(self.mgr).parse_acf()
+        self.missing = [w for w in self.ids
+                        if local.get(w, 0) < self.remote.get(w, {}).get("time_updated", 0)]
+        content = os.path.join(self.mgr.config['install_dir'], "steamapps", "workshop", "content", "108600")
+        self.bytes = sum(_dir_size(os.path.join(content, w)) for w in self.ids)
+        return not self.missing
+
+    def summary(self):
+        return f"{len(self.ids) - len(self.missing)}/{len(self.ids)} items, {self.bytes / 1048576:.1f} MB in {self.seconds:.1f}s"
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                pass
+    return total
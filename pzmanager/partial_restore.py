@@ -0,0 +1,160 @@
+import os
+import bz2
+import gzip
+import lzma
+import fnmatch
+import tarfile
+from . import archive_writer
+from . import backup_store
+from . import map_tools
+
+# Restores a subset of a backup (a few map cells, players.db, ...) instead of
+# extracting everything over Zomboid/.
+#
+# - Archives with a member index (parallel writer) are read by seeking to the
+#   compressed block that holds each member, so only those blocks are inflated.
+# - Other tar archives are streamed once, writing only the selected members.
+# - Dedup manifests simply restore the matching entries.
+
+READ_SIZE = 1024 * 1024
+
+# Use tar-like extraction rules on Pythons that have extraction filters
+_EXTRACT_KW = {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+
+def build_selector(save_rel, rects=None, patterns=None, root="Zomboid"):
+    """
+    Returns a predicate over member names such as
+    'Zomboid/Saves/Multiplayer/servertest/map_10_20.bin'.
+    rects: (x1, y1, x2, y2) cell rectangles, matched against cell files in save_rel.
+    patterns: globs, matched against the full name or the name below root.
+    """
+    rects = rects or []
+    patterns = patterns or []
+    save_rel = save_rel.rstrip("/")
+    root_prefix = root.rstrip("/") + "/"
+
+    def select(name):
+        name = name.rstrip("/")
+        if rects and os.path.dirname(name) == save_rel:
+            cell = map_tools.parse_cell_file(os.path.basename(name))
+            if cell:
+                _, x, y = cell
+                for x1, y1, x2, y2 in rects:
+                    if x1 <= x <= x2 and y1 <= y <= y2:
+                        return True
+        if patterns:
+            short = name[len(root_prefix):] if name.startswith(root_prefix) else name
+            for p in patterns:
+                if fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(short, p):
+                    return True
+        return False
+
+    return select
+
+def _open_stream(f, codec):
+    if codec == "bz2": return bz2.BZ2File(f)
+    if codec == "xz": return lzma.LZMAFile(f)
+    return gzip.GzipFile(fileobj=f)
+
+def _skip(stream, count):
+    while count > 0:
+        data = stream.read(min(READ_SIZE, count))
+        if not data:
+            raise EOFError("Archive ended early")
+        count -= len(data)
+
+def _write_file(stream, target, size, mode, mtime):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = target + ".pzrestore"
+    with open(tmp, 'wb') as out:
+        left = size
+        while left > 0:
+            data = stream.read(min(READ_SIZE, left))
+            if not data:
+                raise EOFError("Archive ended early")
+            out.write(data)
+            left -= len(data)
+    os.chmod(tmp, mode)
+    os.utime(tmp, (mtime, mtime))
+    os.replace(tmp, target)
+
+def _restore_indexed(archive, index, select, dest_parent):
+    members = index["members"]
+    block_size = index["block_size"]
+    blocks = index["blocks"]
+    codec = index.get("codec", "gzip")
+
+    wanted = []
+    for name, m in members.items():
+        if not select(name): continue
+        kind = m[0]
+        if kind == "h":
+            # Hard link: read the data of the member it points to
+            src = members.get(m[5])
+            if not src or src[0] != "f": continue
+            wanted.append((src[1], name, src[2], m[3], m[4]))
+        elif kind == "f":
+            wanted.append((m[1], name, m[2], m[3], m[4]))
+        elif kind == "d":
+            os.makedirs(os.path.join(dest_parent, name), exist_ok=True)
+        elif kind == "l":
+            target = os.path.join(dest_parent, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.lexists(target): os.remove(target)
+            os.symlink(m[5], target)
+
+    wanted.sort()
+    count = 0
+    with open(archive, 'rb') as f:
+        stream = None
+        pos = 0
+        for offset, name, size, mode, mtime in wanted:
+            # Keep reading forward if the member is close, otherwise seek to its block
+            if stream is None or offset < pos or offset - pos > block_size:
+                block = offset // block_size
+                f.seek(blocks[block])
+                stream = _open_stream(f, codec)
+                pos = block * block_size
+            _skip(stream, offset - pos)
+            _write_file(stream, os.path.join(dest_parent, name), size, mode, mtime)
+            pos = offset + size
+            count += 1
+    return count
+
+# Leading bytes of each compressed format
+_MAGIC = ((b"\x1f\x8b", "gzip"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"))
+
+def _detect_codec(f):
+    head = f.read(6)
+    f.seek(0)
+    for magic, codec in _MAGIC:
+        if head.startswith(magic):
+            return codec
+    return None
+
+def _restore_streaming(archive, select, dest_parent):
+    # tarfile's own 'r|*' decompressor stops after the first stream of a
+    # multi-stream archive (what archive_writer writes), the gzip/bz2/lzma
+    # file objects read them all
+    count = 0
+    with open(archive, 'rb') as f:
+        codec = _detect_codec(f)
+        stream = _open_stream(f, codec) if codec else f
+        with stream, tarfile.open(fileobj=stream, mode='r|') as tar:
+            for ti in tar:
+                if select(ti.name):
+                    tar.extract(ti, path=dest_parent, **_EXTRACT_KW)
+                    if not ti.isdir(): count += 1
+    return count
+
+def restore_selected(backup_file, select, dest_parent):
+    """ Restores the members matching select under dest_parent. Returns the file count. """
+    if backup_store.is_manifest(backup_file):
+        return backup_store.restore_backup(backup_file, dest_parent, select=select)
+
+    index = archive_writer.read_index(backup_file)
+    if index:
+        return _restore_indexed(backup_file, index, select, dest_parent)
+
+    print("No member index for this archive, scanning the whole file...")
+    return _restore_streaming(backup_file, select, dest_parent)
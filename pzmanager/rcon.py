@@ -1,125 +1,353 @@
-import socket
-import struct
-import re
 import time
+import struct
+import asyncio
 
-class RCONClient:
-    def __init__(self, host, port, password):
+# Source RCON packet types
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+MAX_REQUEST_ID = 0x7FFFFFFF
+DEFAULT_TIMEOUT = 5
+# Without sentinel support, a response is complete once the server stays quiet this long
+QUIET_TIME = 0.2
+
+def pack(path_id, type_id, body):
+    size = len(body.encode('utf-8')) + 10
+    return struct.pack('<iii', size, path_id, type_id) + body.encode('utf-8') + b'\x00\x00'
+
+def parse_players(raw):
+    """ Parses the 'players' command output into a list of dict {name} """
+    # Format:
+    # Players connected (1):
+    # - Konijima
+    players = []
+    for line in raw.split('\n'):
+        line = line.strip()
+        if not line: continue
+        if "Players connected" in line: continue
+        
+        # Remove generic list bullet points if present, but also accept plain names
+        # Standard: "- Name"
+        if line.startswith("-") or line.startswith("*"):
+            name = line[1:].strip()
+        else:
+            name = line
+        
+        if name:
+            players.append({"name": name})
+    return players
+
+def kick_command(user, reason="Kicked by Admin"):
+    return f'kickuser "{user}" -r "{reason}"'
+
+def broadcast_command(message):
+    # PZ specific command usually: servermsg "message"
+    return f'servermsg "{message}"'
+
+class AsyncRCONClient:
+    """
+    asyncio Source RCON client.
+    Every command gets its own request id. Right after the command an empty
+    RESPONSE_VALUE packet (the sentinel) is sent; servers answer packets in
+    order, so the echo of the sentinel marks the end of a response that may be
+    split over several packets. A reader task demultiplexes responses by id,
+    so any number of commands can be in flight on one connection.
+    """
+    def __init__(self, host, port, password, timeout=DEFAULT_TIMEOUT):
         self.host = host
         self.port = int(port)
         self.password = password
-        self.sock = None
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self._loop = None
+        self._reader_task = None
+        self._last_id = 0
+        # None = unknown, False = server does not echo the sentinel
+        self.sentinel_supported = None
+        self.last_error = None
+        self._reset_state()
 
-    def connect(self):
+    def _reset_state(self):
+        self._pending = {}    # request id -> (future, list of body chunks)
+        self._sentinels = {}  # sentinel id -> request id
+        self._quiet = {}      # request id -> timer handle (no-sentinel mode)
+        self._ignored = {}    # ids whose packets are dropped (fire-and-forget, used sentinels)
+        self._auth_future = None
+
+    @property
+    def connected(self):
+        return self.writer is not None
+
+    def _new_id(self):
+        self._last_id = self._last_id % (MAX_REQUEST_ID - 1) + 1
+        return self._last_id
+
+    def _ignore(self, req_id):
+        # Bounded: only recent ids can still have packets on the wire
+        self._ignored[req_id] = True
+        while len(self._ignored) > 64:
+            del self._ignored[next(iter(self._ignored))]
+
+    async def connect(self):
+        await self.close()
+        self._reset_state()
         try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.settimeout(5)
-            self.sock.connect((self.host, self.port))
-            if not self.auth():
-                print(f"[RCON] Auth Failed for {self.host}:{self.port}")
-                self.sock.close()
-                self.sock = None
-                return False
-            return True
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
         except Exception as e:
             print(f"[RCON] Connection Failed: {e}")
-            self.sock = None
+            self.last_error = f"Connection failed: {e}"
+            self.reader = self.writer = None
             return False
 
-    def pack(self, path_id, type_id, body):
-        size = len(body) + 10
-        return struct.pack('<iii', size, path_id, type_id) + body.encode('utf-8') + b'\x00\x00'
+        # Futures and timers are created on this loop, even when submit() is
+        # called from outside it (blocking facade)
+        self._loop = asyncio.get_event_loop()
+        self._reader_task = self._loop.create_task(self._read_loop())
+        if not await self.auth():
+            print(f"[RCON] Auth Failed for {self.host}:{self.port}")
+            self.last_error = "Auth failed"
+            await self.close()
+            return False
+        return True
 
-    def auth(self):
-        self.sock.send(self.pack(1, 3, self.password))
+    async def auth(self):
+        self._auth_future = self._loop.create_future()
+        self.writer.write(pack(self._new_id(), SERVERDATA_AUTH, self.password))
         try:
-            response = self.sock.recv(4096)
-            if len(response) >= 12:
-                # 12 byte header: size(4), request_id(4), type(4)
-                size, req_id, typ = struct.unpack('<iii', response[:12])
-                return req_id != -1
+            return await asyncio.wait_for(self._auth_future, self.timeout)
+        except Exception:
             return False
-        except: return False
 
-    def send(self, command):
-        if not self.sock: 
-            if not self.connect(): return
+    async def close(self):
+        """ Closes the connection without sending anything to the server. """
+        if self._reader_task:
+            self._reader_task.cancel()
+            try: await self._reader_task
+            except BaseException: pass
+            self._reader_task = None
+        if self.writer:
+            try: self.writer.close()
+            except Exception: pass
+        self.reader = self.writer = None
+        self._fail_pending(ConnectionError("Connection closed"))
+
+    def _fail_pending(self, exc):
+        for fut, _ in self._pending.values():
+            if not fut.done():
+                fut.set_exception(exc)
+                fut.exception() # Mark retrieved, nobody may be waiting on it
+        self._pending.clear()
+        if self._auth_future and not self._auth_future.done():
+            self._auth_future.set_result(False)
+
+    async def _read_loop(self):
         try:
-            self.sock.send(self.pack(2, 2, command))
-            return True
-        except:
-            self.sock = None
+            while True:
+                # Header: size(4), then request_id(4), type(4), body, 2 null bytes
+                size = struct.unpack('<i', await self.reader.readexactly(4))[0]
+                if size < 10:
+                    raise ConnectionError(f"Invalid packet size {size}")
+                data = await self.reader.readexactly(size)
+                req_id, typ = struct.unpack('<ii', data[:8])
+                body = data[8:-2].decode('utf-8', errors='ignore').strip('\x00')
+                self._dispatch(req_id, typ, body)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Connection is gone, wake up everyone waiting on it
+            self.writer = None
+            self._fail_pending(e if isinstance(e, ConnectionError) else ConnectionError(str(e)))
+
+    def _dispatch(self, req_id, typ, body):
+        if typ == SERVERDATA_AUTH_RESPONSE and self._auth_future and not self._auth_future.done():
+            self._auth_future.set_result(req_id != -1)
+            return
+
+        owner = self._sentinels.pop(req_id, None)
+        if owner is not None:
+            # Echo of the sentinel: everything for owner has arrived.
+            # Source servers follow up with a second packet on the same id, drop it.
+            self._ignore(req_id)
+            self.sentinel_supported = True
+            self._finish(owner)
+            return
+        if req_id in self._ignored or req_id not in self._pending:
+            return
+
+        self._pending[req_id][1].append(body)
+        if self.sentinel_supported is False:
+            # Complete once no more packets follow shortly
+            handle = self._quiet.pop(req_id, None)
+            if handle: handle.cancel()
+            self._quiet[req_id] = self._loop.call_later(QUIET_TIME, self._finish, req_id)
+
+    def _finish(self, req_id):
+        # The entry stays in _pending until collect() picks the result up
+        self._quiet.pop(req_id, None)
+        entry = self._pending.get(req_id)
+        if entry and not entry[0].done():
+            entry[0].set_result("".join(entry[1]))
+
+    def submit(self, command):
+        """ Sends a command without waiting. Returns its request id for collect(). """
+        req_id = self._new_id()
+        packets = pack(req_id, SERVERDATA_EXECCOMMAND, command)
+        if self.sentinel_supported is not False:
+            sentinel_id = self._new_id()
+            self._sentinels[sentinel_id] = req_id
+            packets += pack(sentinel_id, SERVERDATA_RESPONSE_VALUE, "")
+        self._pending[req_id] = (self._loop.create_future(), [])
+        self.writer.write(packets)
+        return req_id
+
+    async def collect(self, req_id):
+        """ Waits for the complete response of req_id and returns its text. """
+        entry = self._pending.get(req_id)
+        if entry is None:
+            return ""
+        fut, chunks = entry
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), self.timeout)
+        except asyncio.TimeoutError:
+            if not chunks:
+                raise
+            # Data but no sentinel echo: take what we got and stop sending sentinels
+            self.sentinel_supported = False
+            self._sentinels.clear()
+            await asyncio.sleep(QUIET_TIME)
+            self._finish(req_id)
+            return await fut
+        finally:
+            self._pending.pop(req_id, None)
+
+    async def send(self, command):
+        """ Fire-and-forget, the response (if any) is dropped. """
+        if not self.connected and not await self.connect():
             return False
+        req_id = self._new_id()
+        self._ignore(req_id)
+        self.writer.write(pack(req_id, SERVERDATA_EXECCOMMAND, command))
+        await self.writer.drain()
+        return True
 
-    def execute(self, command, retry=True):
+    async def execute(self, command, retry=True):
         """ Sends command and returns response text """
-        if not self.sock:
-             if not self.connect(): return ""
-        try:
-            # Packet type 2 is SERVERDATA_EXECCOMMAND
-            # Use specific ID to track response? currently just using 2
-            req_id = 100
-            self.sock.send(self.pack(req_id, 2, command))
-            
-            # Read response
-            # Header: size(4), request_id(4), type(4)
-            header = self.sock.recv(12)
-            if len(header) < 12: 
-                raise ConnectionError("Incomplete header")
-            
-            size, res_id, typ = struct.unpack('<iii', header)
-            
-            # Body length = Size - 4 (ID) - 4 (Type)
-            body_len = size - 8
-            if body_len < 0: return ""
-            
-            data = b""
-            while len(data) < body_len:
-                chunk = self.sock.recv(min(4096, body_len - len(data)))
-                if not chunk: break
-                data += chunk
-                
-            # Remove null terminators
-            return data.decode('utf-8', errors='ignore').strip('\x00')
+        return (await self.execute_many([command], retry=retry))[0]
 
+    async def execute_many(self, commands, retry=True):
+        """
+        Sends all commands at once on this connection and returns their
+        responses in the same order. Failed commands yield "".
+        """
+        if not self.connected and not await self.connect():
+            return ["" for _ in commands]
+        try:
+            ids = [self.submit(c) for c in commands]
+            await self.writer.drain()
+            return list(await asyncio.gather(*[self.collect(i) for i in ids]))
         except Exception as e:
-            self.sock = None
+            self.last_error = f"Connection lost: {e}"
+            await self.close()
             if retry:
                 # Try Once More
                 print(f"[RCON] Connection lost ({e}), reconnecting...")
-                return self.execute(command, retry=False)
-            return ""
+                return await self.execute_many(commands, retry=False)
+            return ["" for _ in commands]
+
+async def _execute_on(target, commands):
+    client = AsyncRCONClient(*target)
+    try:
+        if not await client.connect():
+            return None
+        return await client.execute_many(commands)
+    finally:
+        await client.close()
+
+def execute_on_many(targets, commands):
+    """
+    Runs the same commands on several servers concurrently.
+    targets: list of (host, port, password). Returns one result list per
+    target, or None where the connection/auth failed.
+    """
+    async def run_all():
+        return await asyncio.gather(*[_execute_on(t, commands) for t in targets])
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run_all())
+    finally:
+        loop.close()
+
+class RCONClient:
+    """
+    Blocking facade over AsyncRCONClient with a private event loop, for the
+    menus and the scheduler.
+    """
+    def __init__(self, host, port, password):
+        self.host = host
+        self.port = int(port)
+        self.password = password
+        self._loop = asyncio.new_event_loop()
+        self._client = AsyncRCONClient(host, port, password)
+
+    def __del__(self):
+        try:
+            if not self._loop.is_closed():
+                self._run(self._client.close())
+                self._loop.close()
+        except Exception:
+            pass
+
+    def _run(self, coro):
+        return self._loop.run_until_complete(coro)
+
+    @property
+    def sock(self):
+        # Kept for callers that test 'rcon.sock' for a live connection
+        return self._client.writer
+
+    @property
+    def sentinel_supported(self):
+        return self._client.sentinel_supported
+
+    @property
+    def last_error(self):
+        return self._client.last_error
+
+    def pack(self, path_id, type_id, body):
+        return pack(path_id, type_id, body)
+
+    def connect(self):
+        return self._run(self._client.connect())
+
+    def close(self):
+        """ Closes the socket without sending anything to the server. """
+        self._run(self._client.close())
+
+    def submit(self, command):
+        return self._client.submit(command)
+
+    def collect(self, req_id):
+        return self._run(self._client.collect(req_id))
+
+    def send(self, command):
+        return self._run(self._client.send(command))
+
+    def execute(self, command, retry=True):
+        """ Sends command and returns response text """
+        return self._run(self._client.execute(command, retry=retry))
+
+    def execute_many(self, commands, retry=True):
+        """ Sends commands concurrently on one connection, returns responses in order. """
+        return self._run(self._client.execute_many(commands, retry=retry))
 
     def get_players(self):
         """ Returns list of dict {name, unknown} """
-        raw = self.execute("players")
-        # Format:
-        # Players connected (1):
-        # - Konijima
-        
-        # Debugging: Dump raw response to a file just in case
-        # try:
-        #     with open("last_rcon_players.log", "w") as f:
-        #         f.write(raw)
-        # except: pass
-            
-        lines = raw.split('\n')
-        players = []
-        for line in lines:
-            line = line.strip()
-            if not line: continue
-            if "Players connected" in line: continue
-            
-            # Remove generic list bullet points if present, but also accept plain names
-            # Standard: "- Name"
-            if line.startswith("-") or line.startswith("*"):
-                name = line[1:].strip()
-            else:
-                name = line
-            
-            if name:
-                players.append({"name": name})
-        return players
+        return parse_players(self.execute("players"))
 
     def is_admin_online(self):
         """ Checks if the 'admin' account is online """
@@ -130,7 +358,7 @@ class RCONClient:
         return False
 
     def kick(self, user, reason="Kicked by Admin"):
-        self.execute(f'kickuser "{user}" -r "{reason}"')
+        self.execute(kick_command(user, reason))
         
     def ban(self, user, ip=False, reason="Banned by Admin"):
         cmd = 'banuser' if not ip else 'banid' 
@@ -138,10 +366,122 @@ class RCONClient:
         self.execute(f'banuser "{user}" -r "{reason}"')
 
     def broadcast(self, message):
-        # PZ specific command usually: servermsg "message"
-        self.execute(f'servermsg "{message}"')
+        self.execute(broadcast_command(message))
 
 
     def quit(self):
         self.send("quit")
         self.send("save") # Just in case
+
+class RCONSession:
+    """
+    Long-lived RCON connection for the scheduler.
+    Connects lazily, reconnects with exponential backoff while the server is
+    unreachable, sends a keepalive when idle and keeps connection metrics.
+    Unlike RCONClient.quit(), close() never sends anything to the server.
+    """
+    def __init__(self, host, port, password, keepalive=120, min_backoff=5, max_backoff=300, on_event=None):
+        self.client = RCONClient(host, port, password)
+        self.keepalive_interval = keepalive
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.on_event = on_event
+
+        self.state = "disconnected" # connected / disconnected / backoff
+        self.connects = 0
+        self.reconnects = 0
+        self.failures = 0 # consecutive failed attempts
+        self.last_rtt = None
+        self.avg_rtt = None
+        self.last_error = None
+        self.connected_since = None
+        self._next_attempt = 0
+        self._last_activity = 0
+
+    def _event(self, msg):
+        if self.on_event:
+            self.on_event(msg)
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self._event(f"RCON session {state}" + (f" ({self.last_error})" if state != "connected" and self.last_error else ""))
+
+    def _failed(self):
+        self.failures += 1
+        self.last_error = self.client.last_error or self.last_error
+        delay = min(self.max_backoff, self.min_backoff * (2 ** (self.failures - 1)))
+        self._next_attempt = time.monotonic() + delay
+        self.connected_since = None
+        self._set_state("backoff")
+
+    @property
+    def connected(self):
+        return self.client.sock is not None
+
+    def ensure_connected(self):
+        """ Connects if needed. Returns False while backing off or unreachable. """
+        if self.connected:
+            return True
+        if time.monotonic() < self._next_attempt:
+            return False
+        if not self.client.connect():
+            self._failed()
+            return False
+        if self.connects > 0:
+            self.reconnects += 1
+        self.connects += 1
+        self.failures = 0
+        self.connected_since = time.time()
+        self._last_activity = time.monotonic()
+        self._set_state("connected")
+        return True
+
+    def execute(self, command):
+        """ Returns the response text, or None if the server could not be reached. """
+        if not self.ensure_connected():
+            return None
+        t0 = time.monotonic()
+        res = self.client.execute(command, retry=False)
+        if not self.connected:
+            self._failed()
+            return None
+        self.last_rtt = time.monotonic() - t0
+        self.avg_rtt = self.last_rtt if self.avg_rtt is None else 0.8 * self.avg_rtt + 0.2 * self.last_rtt
+        self._last_activity = time.monotonic()
+        return res
+
+    def broadcast(self, message):
+        return self.execute(f'servermsg "{message}"') is not None
+
+    def tick(self):
+        """ Call periodically: reconnects when due and keeps an idle connection alive. """
+        if not self.ensure_connected():
+            return
+        if time.monotonic() - self._last_activity >= self.keepalive_interval:
+            self.execute("players")
+
+    def quit_server(self):
+        """ Asks the game server to save and quit (restarts only), then drops the connection. """
+        if self.ensure_connected():
+            self.client.quit()
+        self.close()
+
+    def close(self):
+        """ Drops the connection. The next command reconnects right away. """
+        if self.connected:
+            self.client.close()
+        self._next_attempt = 0
+        self.connected_since = None
+        self._set_state("disconnected")
+
+    def metrics(self):
+        return {
+            "state": self.state,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+            "last_rtt_ms": round(self.last_rtt * 1000, 1) if self.last_rtt is not None else None,
+            "avg_rtt_ms": round(self.avg_rtt * 1000, 1) if self.avg_rtt is not None else None,
+            "last_error": self.last_error,
+            "connected_since": self.connected_since
+        }
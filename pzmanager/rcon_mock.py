@@ -0,0 +1,280 @@
+import sys
+import time
+import struct
+import asyncio
+import argparse
+import threading
+from .rcon import (pack, AsyncRCONClient, SERVERDATA_AUTH, SERVERDATA_AUTH_RESPONSE,
+                   SERVERDATA_EXECCOMMAND, SERVERDATA_RESPONSE_VALUE)
+
+# Fake Project Zomboid RCON server for exercising RCONClient, the scheduler
+# countdowns and the player menu without a game server, plus a small client
+# benchmark.
+#
+#   python3 -m pzmanager.rcon_mock --serve --port 27015 --password secret --players 5000
+#   python3 -m pzmanager.rcon_mock --bench --latency 0.002 --players 3000
+
+MAX_BODY = 4096 # Larger responses are split over several packets, like the game does
+
+class MockRCONServer:
+    """
+    Scriptable asyncio RCON server speaking the Source framing.
+    latency: delay before each response (seconds); pipelined commands are answered concurrently
+    fragment_size: write responses to the socket in pieces of this many bytes
+    fail_auth: reject every password
+    players: number of synthetic players returned by 'players'
+    echo_sentinel: answer empty RESPONSE_VALUE packets like Source servers do
+    handlers: {command: fn(args) -> str} to override or add commands
+    Every received command is appended to .received.
+    """
+    def __init__(self, password="secret", host="127.0.0.1", port=0, latency=0.0, fragment_size=None,
+                 fail_auth=False, players=0, echo_sentinel=True, handlers=None):
+        self.password = password
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fragment_size = fragment_size
+        self.fail_auth = fail_auth
+        self.players = [f"Survivor{i}" for i in range(players)]
+        self.echo_sentinel = echo_sentinel
+        self.handlers = dict(handlers or {})
+        self.received = []
+        self.connections = 0
+        self._server = None
+        self._tasks = set()
+        self._loop = None
+        self._thread = None
+
+    # --- Commands ---
+
+    def respond(self, command):
+        name, _, args = command.partition(" ")
+        if name in self.handlers:
+            return self.handlers[name](args)
+        if name == "players":
+            lines = [f"Players connected ({len(self.players)}):"] + [f"-{p}" for p in self.players]
+            return "\n".join(lines) + "\n"
+        if name == "servermsg":
+            return "Message sent."
+        if name == "kickuser":
+            return f"User {args.split(' ')[0]} kicked."
+        if name == "banuser":
+            return f"User {args.split(' ')[0]} is now banned"
+        if name in ("save", "quit"):
+            return "Saved" if name == "save" else "Quit"
+        return f"Unknown command {name}"
+
+    # --- Protocol ---
+
+    async def _write(self, writer, data):
+        if self.fragment_size:
+            for i in range(0, len(data), self.fragment_size):
+                writer.write(data[i:i + self.fragment_size])
+                await writer.drain()
+        else:
+            writer.write(data)
+            await writer.drain()
+
+    async def _reply(self, data):
+        # One latency per request; concurrent requests wait out theirs together
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return data
+
+    async def _send_replies(self, writer, queue):
+        # Replies leave in request order, whatever order they finish in
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            await self._write(writer, await item if isinstance(item, asyncio.Task) else item)
+
+    async def _handle(self, reader, writer):
+        """
+        Reads requests as they arrive and answers commands concurrently, so a
+        client pipelining N commands waits about one latency, not N. Sentinels
+        are echoed at once but queued behind the replies they follow.
+        """
+        self.connections += 1
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        queue = asyncio.Queue()
+        sender = asyncio.create_task(self._send_replies(writer, queue))
+        pending = set()
+        authed = False
+
+        def reply(data):
+            t = asyncio.create_task(self._reply(data))
+            pending.add(t)
+            t.add_done_callback(pending.discard)
+            queue.put_nowait(t)
+
+        try:
+            while True:
+                size = struct.unpack('<i', await reader.readexactly(4))[0]
+                data = await reader.readexactly(size)
+                req_id, typ = struct.unpack('<ii', data[:8])
+                body = data[8:-2].decode('utf-8', errors='ignore')
+
+                if typ == SERVERDATA_AUTH:
+                    authed = not self.fail_auth and body == self.password
+                    reply(pack(req_id, SERVERDATA_RESPONSE_VALUE, "") +
+                          pack(req_id if authed else -1, SERVERDATA_AUTH_RESPONSE, ""))
+                elif not authed:
+                    break
+                elif typ == SERVERDATA_EXECCOMMAND:
+                    self.received.append(body)
+                    text = self.respond(body)
+                    reply(b"".join(pack(req_id, SERVERDATA_RESPONSE_VALUE, text[i:i + MAX_BODY])
+                                   for i in range(0, max(len(text), 1), MAX_BODY)))
+                    if body == "quit":
+                        break
+                elif typ == SERVERDATA_RESPONSE_VALUE and self.echo_sentinel:
+                    queue.put_nowait(pack(req_id, SERVERDATA_RESPONSE_VALUE, "") +
+                                     pack(req_id, SERVERDATA_RESPONSE_VALUE, "\x00\x01\x00\x00"))
+            # Let the replies already queued go out before closing
+            queue.put_nowait(None)
+            await sender
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            for t in [sender, *pending]:
+                t.cancel()
+            await asyncio.gather(sender, *pending, return_exceptions=True)
+            self._tasks.discard(task)
+            writer.close()
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            # Drop client connections that are still open
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def start_in_thread(self):
+        """ Runs the server on its own loop in a daemon thread, for blocking clients. """
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="pz-rcon-mock", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop_thread(self):
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+
+# --- Benchmark ---
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values: return 0.0
+    idx = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[idx]
+
+async def _bench(server, count, batch, command):
+    client = AsyncRCONClient(server.host, server.port, server.password)
+    if not await client.connect():
+        raise RuntimeError("Could not connect to mock server")
+
+    # One command at a time: latency distribution
+    latencies = []
+    t0 = time.perf_counter()
+    for _ in range(count):
+        t = time.perf_counter()
+        await client.execute(command)
+        latencies.append(time.perf_counter() - t)
+    seq_time = time.perf_counter() - t0
+
+    # Pipelined batches on the same connection: throughput
+    t0 = time.perf_counter()
+    done = 0
+    while done < count:
+        n = min(batch, count - done)
+        await client.execute_many([command] * n)
+        done += n
+    batch_time = time.perf_counter() - t0
+
+    await client.close()
+    return {
+        "sequential_cmds_per_sec": count / seq_time,
+        "batched_cmds_per_sec": count / batch_time,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000
+    }
+
+def run_benchmark(count=2000, batch=50, command="servermsg \"bench\"", **server_opts):
+    """ Starts a mock server and measures commands/sec and latency percentiles of the client. """
+    server = MockRCONServer(**server_opts).start_in_thread()
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_bench(server, count, batch, command))
+    finally:
+        loop.close()
+        server.stop_thread()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock PZ RCON server / RCON client benchmark")
+    parser.add_argument("--serve", action="store_true", help="Run a mock server until Ctrl+C")
+    parser.add_argument("--bench", action="store_true", help="Benchmark the RCON client")
+    parser.add_argument("--port", type=int, default=27015)
+    parser.add_argument("--password", default="secret")
+    parser.add_argument("--players", type=int, default=0, help="Synthetic player count")
+    parser.add_argument("--latency", type=float, default=0.0, help="Response delay in seconds")
+    parser.add_argument("--fragment", type=int, default=None, help="Write responses in pieces of N bytes")
+    parser.add_argument("--fail-auth", action="store_true")
+    parser.add_argument("--no-sentinel", action="store_true", help="Do not echo sentinel packets")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--command", default="servermsg \"bench\"")
+    args = parser.parse_args(argv)
+
+    opts = dict(password=args.password, latency=args.latency, fragment_size=args.fragment,
+                fail_auth=args.fail_auth, players=args.players, echo_sentinel=not args.no_sentinel)
+
+    if args.bench:
+        res = run_benchmark(count=args.count, batch=args.batch, command=args.command, **opts)
+        print(f"Commands: {args.count} x '{args.command}'")
+        print(f"Sequential: {res['sequential_cmds_per_sec']:.0f} cmd/s "
+              f"(p50 {res['p50_ms']:.2f} ms, p99 {res['p99_ms']:.2f} ms, max {res['max_ms']:.2f} ms)")
+        print(f"Batched ({args.batch}/batch): {res['batched_cmds_per_sec']:.0f} cmd/s")
+    elif args.serve:
+        server = MockRCONServer(port=args.port, **opts)
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(server.start())
+        print(f"Mock RCON server on {server.host}:{server.port} (password '{server.password}'). Ctrl+C to stop.")
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loop.run_until_complete(server.stop())
+            loop.close()
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
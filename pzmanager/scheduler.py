@@ -1,11 +1,17 @@
 import os
 import time
+import threading
 import subprocess
 from datetime import datetime, timedelta
-from .const import LOGS_DIR
-from .rcon import RCONClient
+from .const import LOGS_DIR, INSTANCES_DIR
+from .rcon import RCONSession
 from . import backup_tools
+from . import map_tools
+from . import map_prune
 from .update_checker import ModUpdateChecker
+from .steam_integration import SteamIntegration
+from .mod_prefetch import ModPrefetch
+from .timer_queue import TimerQueue
 
 def log_scheduler_event(instance_name, msg):
     try:
@@ -17,26 +23,25 @@ def log_scheduler_event(instance_name, msg):
     except Exception as e:
         print(f"Logging failed: {e}")
 
-def get_next_restart_info(mgr):
-    restart_times = mgr.config.get("restart_times", [0, 6, 12, 18])
-    if not restart_times: return "Not Scheduled"
-    
-    now = datetime.now()
-    current_hour = now.hour
-    current_min = now.minute
-    
-    # Calculate next restart
-    min_diff = 9999
-    
+def next_restart_time(restart_times, now=None):
+    """ datetime of the next full hour in restart_times strictly after now, or None. """
+    if not restart_times: return None
+    now = now or datetime.now()
+    base = now.replace(minute=0, second=0, microsecond=0)
+    best = None
     for h in restart_times:
-        diff = (h * 60) - ((current_hour * 60) + current_min)
-        if diff <= 0: diff += 24 * 60
-        if diff < min_diff: min_diff = diff
-            
-    hours_left = min_diff // 60
-    mins_left = min_diff % 60
-    
-    dt_next = now + timedelta(minutes=min_diff)
+        dt = base.replace(hour=int(h) % 24)
+        if dt <= now: dt += timedelta(days=1)
+        if best is None or dt < best: best = dt
+    return best
+
+def get_next_restart_info(mgr):
+    dt_next = next_restart_time(mgr.config.get("restart_times", [0, 6, 12, 18]))
+    if not dt_next: return "Not Scheduled"
+
+    mins = int((dt_next - datetime.now()).total_seconds() + 59) // 60
+    hours_left = mins // 60
+    mins_left = mins % 60
     time_str = dt_next.strftime("%H:%M")
     
     return f"{time_str} (in {hours_left}h {mins_left}m)"
@@ -47,23 +52,41 @@ def restart_service_process(mgr, inst):
     
     print("[Scheduler] Stopping service...")
     subprocess.run(f"sudo systemctl stop {svc}", shell=True)
+    stopped_at = time.time()
     log_scheduler_event(inst, "Service stopped.")
     
     # Auto Backup
+    snapshot = None
     if mgr.config.get("auto_backup", True):
-        try:
-            backup_tools.perform_auto_backup(mgr)
-            log_scheduler_event(inst, "Auto-backup completed successfully.")
-        except Exception as e:
-            print(f"[Scheduler] Auto-backup failed: {e}")
-            log_scheduler_event(inst, f"Auto-backup FAILED: {e}")
+        if mgr.config.get("restart_backup_mode", "inline") == "snapshot":
+            # Only copy while stopped, compress once the server is back up
+            try:
+                snapshot = backup_tools.create_snapshot(mgr)
+                log_scheduler_event(inst, f"Snapshot taken in {time.time() - stopped_at:.1f}s.")
+            except Exception as e:
+                print(f"[Scheduler] Snapshot failed: {e}")
+                log_scheduler_event(inst, f"Snapshot FAILED: {e}. Falling back to inline backup.")
+
+        if snapshot is None:
+            try:
+                backup_tools.perform_auto_backup(mgr)
+                log_scheduler_event(inst, "Auto-backup completed successfully.")
+            except Exception as e:
+                print(f"[Scheduler] Auto-backup failed: {e}")
+                log_scheduler_event(inst, f"Auto-backup FAILED: {e}")
             
     # Cleanup Map
     perform_map_cleanup(mgr)
+    if mgr.config.get("prune_on_restart", False):
+        perform_stale_prune(mgr)
     
     print("[Scheduler] Starting service...")
     subprocess.run(f"sudo systemctl start {svc}", shell=True)
-    log_scheduler_event(inst, "Service restart command issued.")
+    downtime = time.time() - stopped_at
+    log_scheduler_event(inst, f"Service restart command issued. Downtime: {downtime:.1f}s.")
+
+    if snapshot:
+        backup_tools.archive_snapshot_async(mgr, snapshot, on_done=lambda msg: log_scheduler_event(inst, msg))
 
 def perform_map_cleanup(mgr):
     print("[Scheduler] Performing Map Cleanup...")
@@ -87,122 +110,573 @@ def perform_map_cleanup(mgr):
         log_scheduler_event(inst, msg)
         return
         
+    t0 = time.time()
     try:
-        with open(list_file, 'r') as f:
-            lines = f.readlines()
+        zones = map_tools.load_zones(list_file) # Cached until the file changes
     except Exception as e:
         print(f"[Scheduler] Failed to read reset_zones: {e}")
         return
-        
-    count = 0
-    for line in lines:
-        xy = line.strip() # "10_10"
-        if not xy: continue
-        
-        # Targets
-        targets = [
-            f"map_{xy}.bin",
-            f"chunkdata_{xy}.bin",
-            f"zpop_{xy}.bin"
-        ]
-        
-        for t in targets:
-            p = os.path.join(save_dir, t)
-            if os.path.exists(p):
-                try:
-                    os.remove(p)
-                    count += 1
-                except Exception as e:
-                    print(f"Failed to delete {t}: {e}")
-                    
-    msg = f"Cleanup Complete. Deleted {count} map/chunk files."
+    if zones.bad:
+        print(f"[Scheduler] Ignored {zones.bad} invalid lines in {list_file}")
+
+    # One directory pass instead of three stats per zone, then only the cells that exist
+    try:
+        cells = map_tools.index_cells(save_dir)
+    except OSError as e:
+        print(f"[Scheduler] Failed to scan {save_dir}: {e}")
+        return
+    scanned = time.time() - t0
+    hits = zones.match(cells)
+    targets = [os.path.join(save_dir, name) for xy in hits for name in cells[xy]]
+
+    count, freed, errors = map_tools.delete_files(targets)
+    for err in errors[:10]:
+        print(f"Failed to delete {err}")
+    if len(errors) > 10:
+        print(f"... and {len(errors) - 10} more failures")
+
+    msg = (f"Cleanup Complete. Deleted {count} map/chunk files in {len(hits)} of {len(zones)} zone cells, "
+           f"{freed / (1024 * 1024):.1f} MB freed in {time.time() - t0:.2f}s "
+           f"(scan {scanned:.2f}s, {sum(len(v) for v in cells.values())} cell files).")
+    if errors:
+        msg += f" {len(errors)} files could not be deleted."
     print(f"[Scheduler] {msg}")
     log_scheduler_event(inst, msg)
 
-def trigger_mod_restart_sequence(mgr, rcon):
-    # 5 Minute countdown
+def perform_stale_prune(mgr):
     inst = mgr.current_instance
-    log_scheduler_event(inst, "Initiating Mod Update Restart Sequence (5 min)")
-    
-    if rcon.sock is None: rcon.connect()
-    
-    for i in range(5, 0, -1):
-        msg = f"WARNING: Critical Mod Update Detected! Restart in {i} minutes."
-        print(f"[Scheduler] {msg}")
-        if rcon.sock: rcon.broadcast(msg)
-        time.sleep(60)
-        
-    if rcon.sock:
-        rcon.broadcast("Server restarting for updates NOW...")
+    print("[Scheduler] Pruning stale map cells...")
+    try:
+        stats = map_prune.prune_stale_cells(mgr, dry_run=False)
+    except OSError as e:
+        print(f"[Scheduler] Stale cell prune failed: {e}")
+        log_scheduler_event(inst, f"Stale cell prune FAILED: {e}")
+        return
+    msg = (f"Pruned {len(stats['stale']) - stats['skipped']} cells untouched for {stats['days']}+ days: {stats['deleted']} files, "
+           f"{stats['freed'] / (1024 * 1024):.1f} MB freed in {stats['seconds']:.2f}s "
+           f"({stats['protected']} protected cells kept).")
+    if stats["skipped"]:
+        msg += f" {stats['skipped']} cells modified during the prune were kept."
+    if stats["errors"]:
+        msg += f" {len(stats['errors'])} files could not be deleted."
+    print(f"[Scheduler] {msg}")
+    log_scheduler_event(inst, msg)
+
+def create_rcon_session(mgr):
+    inst = mgr.current_instance
+    return RCONSession(
+        mgr.config["rcon_host"], mgr.config["rcon_port"], mgr.config["rcon_password"],
+        on_event=lambda msg: log_scheduler_event(inst, msg)
+    )
+
+def announce_restart_now(mgr, rcon, message):
+    # Last warning, then let the game save and quit before the service is stopped
+    if rcon.broadcast(message):
         time.sleep(5)
-        rcon.quit()
-        
-    restart_service_process(mgr, inst)
+        rcon.quit_server()
+    log_scheduler_event(mgr.current_instance, f"RCON metrics: {rcon.metrics()}")
+
+RESTART_WARNINGS = [60, 30, 10, 5, 1] # Minutes before a scheduled restart
+MOD_COUNTDOWN = 5 # Minutes of warnings before a mod update restart
+MOD_CHECK_INTERVAL = 15 * 60
+WARNING_GRACE = 90 # A warning more late than this is dropped, not sent
+RCON_TICK_INTERVAL = 30
+DEFAULT_COALESCE_MINUTES = 30 # Restart requests closer than this become one restart
+DEFAULT_PREFETCH_WAIT_MINUTES = 10 # How long a restart may wait for mod downloads
+PREFETCH_ATTEMPTS = 2
+
+# Restarts run on worker threads so the queue keeps timing other instances'
+# warnings; this keeps two of them (stop, backup, cleanup, start) from overlapping.
+_restart_lock = threading.Lock()
+
+# reason -> (warning, final message). When reasons merge, the first one listed wins.
+RESTART_MESSAGES = {
+    "mods": ("WARNING: Critical Mod Update Detected! Restart in {m} minutes.", "Server restarting for updates NOW..."),
+    "scheduled": ("WARNING: Scheduled Restart in {m} minutes!", "Server restarting NOW for Scheduled Maintenance..."),
+}
+
+class RestartCountdown:
+    """
+    Warnings followed by one restart at a wall-clock time. Further requests that
+    land close to it are merged in: the restart moves to the earliest time, the
+    warnings still ahead are re-armed and the reasons are kept for the messages.
+    """
+    def __init__(self, sched, at, reason, warnings):
+        self.sched = sched
+        self.at = at
+        self.reasons = [reason]
+        self.warnings = set(warnings)
+        self.jobs = []
+        self.warned = False
+        self.prefetch = None # ModPrefetch running during the countdown
+        self.hold_until = None # Latest time the restart waits for the prefetch
+
+    @property
+    def reason(self):
+        for r in RESTART_MESSAGES:
+            if r in self.reasons: return r
+        return self.reasons[0]
+
+    def arm(self):
+        queue, inst = self.sched.queue, self.sched.inst
+        self.disarm()
+        now = queue.wall_clock()
+        for m in sorted(self.warnings, reverse=True):
+            if self.at - m * 60 < now: continue # Already inside that window
+            self.jobs.append(queue.call_at(self.at - m * 60, f"{inst}:warn{m}", lambda m=m: self._warn(m), grace=WARNING_GRACE))
+        # No grace: a restart that is late (stall, suspend) still runs, once
+        self.jobs.append(queue.call_at(self.at, f"{inst}:restart", self._fire))
+
+    def disarm(self):
+        for job in self.jobs: self.sched.queue.cancel(job)
+        self.jobs = []
+
+    def merge(self, at, reason, warnings):
+        if reason not in self.reasons: self.reasons.append(reason)
+        self.warnings |= set(warnings)
+        self.at = min(self.at, at)
+        self.arm()
+
+    def _warn(self, m):
+        self.warned = True
+        self.sched._warn(RESTART_MESSAGES.get(self.reason, RESTART_MESSAGES["scheduled"])[0].format(m=m))
+
+    def _fire(self):
+        self.sched.run_countdown(self)
+
+    def describe(self):
+        return f"{'+'.join(self.reasons)} restart at {datetime.fromtimestamp(self.at).strftime('%Y-%m-%d %H:%M')}"
+
+class InstanceScheduler:
+    """
+    Scheduled restarts, their warnings, mod update checks and the RCON keepalive
+    of one instance, as jobs on a TimerQueue. Every pending restart is a
+    RestartCountdown; requests within restart_coalesce_minutes of each other
+    share one, so a scheduled restart inside a mod countdown doesn't restart twice.
+    offset: seconds added to every scheduled restart (staggering several instances)
+    mod_check: schedule its own mod update check; off when a daemon checks for everyone
+    """
+    def __init__(self, mgr, queue, offset=0, mod_check=True):
+        self.mgr = mgr
+        self.queue = queue
+        self.offset = offset
+        self.mod_check = mod_check
+        self.inst = mgr.current_instance
+        self.rcon = create_rcon_session(mgr)
+        self.update_checker = ModUpdateChecker(mgr)
+        self.countdowns = []
+        self.last_restart = 0
+        self.restart_thread = None # Worker running a restart; RCON is left to it meanwhile
+        self._retired_rcon = [] # Sessions replaced during a restart, closed after it
+
+    @property
+    def restarting(self):
+        return self.restart_thread is not None
+
+    def log(self, msg):
+        print(f"[Scheduler] {msg}")
+        log_scheduler_event(self.inst, msg)
+
+    @property
+    def coalesce_window(self):
+        return self.mgr.config.get("restart_coalesce_minutes", DEFAULT_COALESCE_MINUTES) * 60
+
+    def start(self):
+        # Snapshots a crashed scheduler took but never archived
+        backup_tools.sweep_snapshots(self.mgr, on_done=lambda msg: log_scheduler_event(self.inst, msg))
+        self.schedule_next_restart()
+        self.queue.call_every(RCON_TICK_INTERVAL, f"{self.inst}:rcon", self._tick)
+        if self.mod_check and self.mgr.config.get("enable_mod_update_check", False):
+            self.queue.call_every(MOD_CHECK_INTERVAL, f"{self.inst}:modcheck", self.check_mods, first=0)
+
+    def _tick(self):
+        if not self.restarting:
+            self.rcon.tick()
+
+    def _warn(self, msg):
+        print(f"[Scheduler] {msg}")
+        if self.restarting:
+            log_scheduler_event(self.inst, f"Not sent, restart in progress: {msg}")
+            return
+        self.rcon.broadcast(msg)
+
+    # --- Countdowns ---
+
+    def has_countdown(self, reason):
+        return any(reason in cd.reasons for cd in self.countdowns)
+
+    def request_restart(self, at, reason, warnings):
+        """ Queues a restart at a time.time() timestamp, merging with a close one. Returns its countdown. """
+        for cd in self.countdowns:
+            if abs(cd.at - at) <= self.coalesce_window:
+                before = cd.at
+                cd.merge(at, reason, warnings)
+                if reason != "scheduled" or cd.at != before:
+                    self.log(f"Merged {reason} restart into {cd.describe()}.")
+                return cd
+        cd = RestartCountdown(self, at, reason, warnings)
+        self.countdowns.append(cd)
+        cd.arm()
+        log_scheduler_event(self.inst, f"Queued {cd.describe()}.")
+        return cd
+
+    def cancel_countdown(self, cd, announce=True):
+        if cd not in self.countdowns:
+            return
+        cd.disarm()
+        self.countdowns.remove(cd)
+        log_scheduler_event(self.inst, f"Cancelled {cd.describe()}.")
+        if announce and cd.warned:
+            self._warn("The announced restart has been cancelled.")
+
+    def cancel_restarts(self, reason=None, announce=True):
+        """ Cancels every pending countdown, or those with the given reason. Returns how many. """
+        todo = [cd for cd in self.countdowns if reason is None or reason in cd.reasons]
+        for cd in todo:
+            self.cancel_countdown(cd, announce)
+        return len(todo)
+
+    def _hold_for_prefetch(self, cd):
+        """ Postpones the restart by a minute while mod downloads are still running or failed. """
+        pf = cd.prefetch
+        if not pf or pf.ok:
+            return False
+        now = self.queue.wall_clock()
+        if cd.hold_until is None:
+            cd.hold_until = now + self.mgr.config.get("mod_prefetch_max_wait", DEFAULT_PREFETCH_WAIT_MINUTES) * 60
+        if now >= cd.hold_until:
+            self.log(f"Mod pre-download not finished ({pf.summary()}), restarting anyway. The server will download the rest on boot.")
+            return False
+        if pf.done:
+            if pf.attempts >= PREFETCH_ATTEMPTS:
+                self.log(f"Mod pre-download could not be verified for {pf.missing} ({pf.error or 'ACF not updated'}), restarting anyway.")
+                return False
+            self.log(f"Mod pre-download incomplete ({pf.missing}), retrying.")
+            pf.start()
+        if cd.warnings:
+            # First hold only, not every minute
+            self._warn("Restart delayed: finishing mod downloads...")
+        cd.at = min(now + 60, cd.hold_until)
+        cd.warnings = set()
+        cd.arm()
+        return True
+
+    def run_countdown(self, cd):
+        if self.restarting:
+            # Still busy with an earlier restart, which most likely covers this one
+            cd.at = self.queue.wall_clock() + 60
+            cd.warnings = set()
+            cd.arm()
+            return
+        if self._hold_for_prefetch(cd):
+            return
+        if cd.prefetch and cd.prefetch.ok:
+            # These would otherwise have been downloaded by the server while booting
+            self.log(f"Mods pre-downloaded during the countdown ({cd.prefetch.summary()}). "
+                     f"Boot time saved: ~{cd.prefetch.seconds:.0f}s.")
+        if cd in self.countdowns: self.countdowns.remove(cd)
+        cd.disarm()
+        if cd.reason == "scheduled":
+            self.log("Scheduled time reached. Restarting.")
+        else:
+            self.log(f"Restarting ({cd.describe()}).")
+        final = RESTART_MESSAGES.get(cd.reason, RESTART_MESSAGES["scheduled"])[1]
+        self.restart_thread = threading.Thread(target=self._restart, args=(self.mgr, self.rcon, final),
+                                               name=f"restart-{self.inst}")
+        self.restart_thread.start()
+
+    def _restart(self, mgr, rcon, final):
+        # Worker thread. Only touches mgr and rcon, the queue thread leaves both alone until _restart_done
+        try:
+            with _restart_lock:
+                announce_restart_now(mgr, rcon, final)
+                restart_service_process(mgr, self.inst)
+        except Exception as e:
+            self.log(f"Restart failed: {e}")
+        finally:
+            self.queue.call_later(0, f"{self.inst}:restarted", self._restart_done)
+
+    def _restart_done(self):
+        self.restart_thread.join()
+        self.restart_thread = None
+        for rcon in self._retired_rcon:
+            rcon.close()
+        self._retired_rcon = []
+        self.last_restart = self.queue.wall_clock()
+        # Anything due shortly after was covered by this restart
+        for other in list(self.countdowns):
+            if other.at <= self.last_restart + self.coalesce_window:
+                self.log(f"Dropping {other.describe()}, covered by the restart that just ran.")
+                self.cancel_countdown(other, announce=False)
+        if not self.has_countdown("scheduled"):
+            self.schedule_next_restart()
+
+    # --- Scheduled restarts ---
+
+    def schedule_next_restart(self):
+        # Replace a pending scheduled-only countdown (offset or restart_times changed)
+        for cd in list(self.countdowns):
+            if cd.reasons == ["scheduled"]: self.cancel_countdown(cd, announce=False)
+        # Skip restart times that fall right after the last restart
+        after = max(self.queue.wall_clock(), self.last_restart + self.coalesce_window)
+        shift = timedelta(seconds=self.offset)
+        dt_next = next_restart_time(self.mgr.config.get("restart_times", [0, 6, 12, 18]), datetime.fromtimestamp(after) - shift)
+        if not dt_next:
+            return
+        self.request_restart((dt_next + shift).timestamp(), "scheduled", RESTART_WARNINGS)
+
+    def set_offset(self, offset):
+        if offset != self.offset:
+            self.offset = offset
+            self.schedule_next_restart()
+
+    # --- Mod updates ---
+
+    def check_mods(self, remote_data=None, delay=0):
+        """ Returns True if a mod update countdown was started. """
+        if self.has_countdown("mods") or self.restarting:
+            return False # Already counting down, or the server is down for a restart
+        if remote_data is None: print("[Scheduler] Checking for mod updates...")
+        has_updates, updates = self.update_checker.check(remote_data)
+        if has_updates:
+            self.log(f"Mod updates detected for IDs: {updates}")
+            cd = self.start_mod_countdown(delay)
+            if self.mgr.config.get("mod_prefetch", True) and cd.prefetch is None:
+                log_scheduler_event(self.inst, f"Pre-downloading {len(updates)} workshop items during the countdown.")
+                cd.prefetch = ModPrefetch(self.mgr, updates, self.update_checker.last_remote).start()
+        return has_updates
+
+    def start_mod_countdown(self, delay=0):
+        log_scheduler_event(self.inst, f"Initiating Mod Update Restart Sequence ({MOD_COUNTDOWN} min)")
+        at = self.queue.wall_clock() + delay + MOD_COUNTDOWN * 60
+        return self.request_restart(at, "mods", range(MOD_COUNTDOWN, 0, -1))
+
+    # --- Lifecycle ---
+
+    def update_config(self, mgr, previous=None):
+        """ Applies a reloaded config, keeping pending mod countdowns. previous: the old config, if mgr was reloaded in place. """
+        old = self.mgr.config if previous is None else previous
+        self.mgr = mgr
+        self.update_checker.mgr = mgr # Reused: a new one would leave its Steam API pool running
+        if any(old.get(k) != mgr.config.get(k) for k in ("rcon_host", "rcon_port", "rcon_password")):
+            if self.restarting:
+                self._retired_rcon.append(self.rcon) # Still in use by the restart
+            else:
+                self.rcon.close()
+            self.rcon = create_rcon_session(mgr)
+        self.schedule_next_restart()
+
+    def close(self, announce=True):
+        self.cancel_restarts(announce=announce)
+        if self.restart_thread:
+            # Never leave the server stopped halfway through a restart
+            self.log("Waiting for the running restart to finish...")
+            self.restart_thread.join()
+            self.restart_thread = None
+        self.queue.cancel_where(lambda j: j.name.startswith(self.inst + ":"))
+        for rcon in self._retired_rcon + [self.rcon]:
+            rcon.close()
+        self.update_checker.close()
 
 def run_scheduler(mgr):
     print(f"[Scheduler] Starting for instance: {mgr.config['server_name']}")
     log_scheduler_event(mgr.current_instance, "Scheduler service started.")
-    
-    update_checker = ModUpdateChecker(mgr)
-    last_mod_check = 0
-    mod_check_interval = 15 * 60 # 15 mins
-    
-    while True:
+
+    def on_error(job, e):
+        print(f"[Scheduler] Job {job.name} failed: {e}")
+        log_scheduler_event(mgr.current_instance, f"Job {job.name} failed: {e}")
+
+    def on_skip(job, late):
+        log_scheduler_event(mgr.current_instance, f"Skipped {job.name}, {late:.0f}s late.")
+
+    queue = TimerQueue(on_error=on_error, on_skip=on_skip)
+    sched = InstanceScheduler(mgr, queue)
+    sched.start()
+
+    def reload():
+        # One stat while the instance file is unchanged
+        prev = mgr.reload_if_changed()
+        if prev is not None and mgr.config_error:
+            log_scheduler_event(mgr.current_instance, f"Config file unreadable, keeping the current schedule: {mgr.config_error}")
+        elif prev is not None and prev != mgr.config:
+            log_scheduler_event(mgr.current_instance, "Config changed, rescheduling.")
+            sched.update_config(mgr, previous=prev)
+    queue.call_every(RELOAD_INTERVAL, "reload", reload)
+    try:
+        queue.run_forever()
+    finally:
+        sched.close()
+
+# --- Multi-instance daemon ---
+
+DAEMON_LOG = "all" # scheduler_all.log
+RELOAD_INTERVAL = 10
+DEFAULT_STAGGER_MINUTES = 5
+CACHE_EVICT_INTERVAL = 24 * 3600
+
+class SchedulerDaemon:
+    """
+    Schedules every instance in INSTANCES_DIR on one TimerQueue.
+    - Mod checks are merged: one Steam API call covers the mods of all instances.
+    - Instances restarting at the same hour are offset by restart_stagger_minutes,
+      in instance name order, so their backups don't compete for the disk.
+      Restarts run on worker threads, one at a time, so a slow backup doesn't
+      hold up the other instances' warnings.
+    - Instance JSON files are polled and an instance is rescheduled when its
+      config changed, added or removed.
+    make_mgr: name -> manager object loaded for that instance
+    list_instances: () -> instance names
+    global_config: dict with restart_stagger_minutes, read again on every reload
+    reload_global: optional () -> None refreshing global_config in place
+    """
+    def __init__(self, make_mgr, list_instances, global_config=None, queue=None, reload_global=None):
+        self.make_mgr = make_mgr
+        self.list_instances = list_instances
+        self.global_config = global_config if global_config is not None else {}
+        self.reload_global = reload_global
+        self.stagger = self._read_stagger()
+        self.queue = queue or TimerQueue(on_error=self._on_error, on_skip=self._on_skip)
+        self.instances = {} # name -> InstanceScheduler
+        self.stamps = {} # name -> (mtime_ns, size) of its JSON
+        self.steam_int = SteamIntegration()
+
+    def log(self, msg):
+        print(f"[Scheduler] {msg}")
+        log_scheduler_event(DAEMON_LOG, msg)
+
+    def _on_error(self, job, e):
+        self.log(f"Job {job.name} failed: {e}")
+
+    def _on_skip(self, job, late):
+        log_scheduler_event(job.name.split(":")[0], f"Skipped {job.name}, {late:.0f}s late.")
+
+    def _stamp(self, name):
         try:
-            now = datetime.now()
-            current_hour = now.hour
-            current_min = now.minute
-            inst = mgr.current_instance
-            
-            # --- 1. SCHEDULED RESTART LOGIC ---
-            restart_times = mgr.config.get("restart_times", [0, 6, 12, 18])
-            min_diff = 9999
-            for h in restart_times:
-                diff = (h * 60) - ((current_hour * 60) + current_min)
-                if diff <= 0: diff += 24 * 60
-                if diff < min_diff: min_diff = diff
-            
-            rcon = RCONClient(mgr.config["rcon_host"], mgr.config["rcon_port"], mgr.config["rcon_password"])
-            
-            # Warnings
-            if min_diff in [60, 30, 10, 5, 1]:
-                print(f"[Scheduler] Warning: Restart in {min_diff} min")
-                rcon.connect()
-                if rcon.sock:
-                    rcon.broadcast(f"WARNING: Scheduled Restart in {min_diff} minutes!")
-                    rcon.quit()
-
-            # Execute Scheduled Restart
-            if min_diff <= 0: # It matches exactly
-                log_scheduler_event(inst, "Scheduled time reached. Restarting.")
-                rcon.connect()
-                if rcon.sock:
-                    rcon.broadcast("Server restarting NOW for Scheduled Maintenance...")
-                    time.sleep(5)
-                    rcon.quit()
-                
-                restart_service_process(mgr, inst)
-                time.sleep(65) # Skip past this minute
+            st = os.stat(os.path.join(INSTANCES_DIR, f"{name}.json"))
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    # --- Instances ---
+
+    def _add(self, name):
+        mgr = self.make_mgr(name)
+        self.stamps[name] = self._stamp(name) # After loading, which may rewrite the file
+        if mgr.config_error:
+            self.log(f"Instance {name} not scheduled, its file is unreadable: {mgr.config_error}")
+            return
+        if not mgr.config.get("scheduler_enabled", True):
+            return
+        sched = InstanceScheduler(mgr, self.queue, mod_check=False)
+        self.instances[name] = sched
+        sched.start()
+        log_scheduler_event(name, "Scheduled by the multi-instance scheduler.")
+
+    def _remove(self, name):
+        sched = self.instances.pop(name, None)
+        if sched:
+            sched.close()
+        self.stamps.pop(name, None)
+
+    def _read_stagger(self):
+        return self.global_config.get("restart_stagger_minutes", DEFAULT_STAGGER_MINUTES) * 60
+
+    def _restagger(self):
+        # Group instances by restart hours; the n-th of a group restarts n * stagger later
+        seen = {}
+        for name in sorted(self.instances):
+            sched = self.instances[name]
+            key = tuple(sorted(sched.mgr.config.get("restart_times", [])))
+            n = seen.get(key, 0)
+            seen[key] = n + 1
+            sched.set_offset(n * self.stagger)
+
+    def reload(self):
+        """ Picks up added, removed and edited instance files. Returns True if anything changed. """
+        if self.reload_global:
+            self.reload_global()
+        stagger = self._read_stagger()
+        changed = stagger != self.stagger
+        if changed:
+            self.log(f"Restart stagger changed to {stagger // 60:g} minutes.")
+            self.stagger = stagger
+        names = set(self.list_instances())
+        for name in set(self.stamps) - names:
+            self.log(f"Instance {name} removed.")
+            self._remove(name)
+            changed = True
+        for name in sorted(names):
+            stamp = self._stamp(name)
+            if name in self.stamps and stamp == self.stamps[name]:
                 continue
+            if name in self.stamps:
+                old = self.instances.get(name)
+                mgr = self.make_mgr(name)
+                if mgr.config_error:
+                    # Retried when the file changes again; until then the old schedule stands
+                    self.log(f"Instance {name} file unreadable, keeping its schedule: {mgr.config_error}")
+                    self.stamps[name] = stamp
+                    continue
+                if old and mgr.config == old.mgr.config:
+                    # Touched but not changed (e.g. saved again by the menu)
+                    self.stamps[name] = self._stamp(name)
+                    continue
+                self.log(f"Instance {name} changed, rescheduling.")
+                if old and mgr.config.get("scheduler_enabled", True):
+                    # Keep its RCON session and any running mod countdown
+                    old.update_config(mgr)
+                    self.stamps[name] = self._stamp(name)
+                    changed = True
+                    continue
+                self._remove(name)
+            else:
+                self.log(f"Instance {name} added.")
+            self._add(name)
+            changed = True
+        if changed:
+            self._restagger()
+        return changed
 
-            # --- 2. MOD UPDATE LOGIC ---
-            if mgr.config.get("enable_mod_update_check", False):
-                if time.time() - last_mod_check > mod_check_interval:
-                    last_mod_check = time.time()
-                    print("[Scheduler] Checking for mod updates...")
-                    has_updates, updates = update_checker.check()
-                    
-                    if has_updates:
-                        msg = f"Mod updates detected for IDs: {updates}"
-                        print(f"[Scheduler] {msg}")
-                        log_scheduler_event(inst, msg)
-                        
-                        trigger_mod_restart_sequence(mgr, rcon) # This takes 5 mins
-                        time.sleep(60) 
-                        continue
-                        
-        except Exception as e:
-            print(f"[Scheduler] Loop Error: {e}")
-            log_scheduler_event(mgr.current_instance, f"Loop Error: {e}")
-        
-        time.sleep(60)
+    # --- Mod updates ---
+
+    def check_all_mods(self):
+        """ One Steam API request for the union of every instance's mods. """
+        checking = {}
+        for name, sched in self.instances.items():
+            if sched.has_countdown("mods") or sched.restarting or not sched.mgr.config.get("enable_mod_update_check", False):
+                continue
+            checking[name] = [str(w) for w in sched.update_checker.get_installed_workshop_ids()]
+        all_ids = sorted({w for ids in checking.values() for w in ids})
+        if not all_ids:
+            return
+        print(f"[Scheduler] Checking for mod updates ({len(all_ids)} items, {len(checking)} instances)...")
+        remote = self.steam_int.get_item_details(all_ids, force_refresh=True)
+        if not remote:
+            return
+        # Instances updating the same mods are staggered like scheduled restarts
+        started = 0
+        for name in sorted(checking):
+            if self.instances[name].check_mods(remote, delay=started * self.stagger):
+                started += 1
+
+    # --- Loop ---
+
+    def start(self):
+        self.log("Multi-instance scheduler started.")
+        self.reload()
+        self.queue.call_every(RELOAD_INTERVAL, "daemon:reload", self.reload)
+        self.queue.call_every(MOD_CHECK_INTERVAL, "daemon:modcheck", self.check_all_mods, first=0)
+        self.queue.call_every(CACHE_EVICT_INTERVAL, "daemon:cache", self.steam_int.evict_unreferenced)
+
+    def close(self):
+        for name in list(self.instances):
+            self._remove(name)
+        self.steam_int.close()
+
+def run_scheduler_daemon(make_mgr, list_instances, global_config=None, reload_global=None):
+    daemon = SchedulerDaemon(make_mgr, list_instances, global_config, reload_global=reload_global)
+    daemon.start()
+    try:
+        daemon.queue.run_forever()
+    finally:
+        daemon.close()
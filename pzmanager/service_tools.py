@@ -12,6 +12,7 @@ def manage_service_control(mgr):
         
         svc_installed = os.path.exists(f"/etc/systemd/system/{svc}.service")
         sched_installed = os.path.exists(f"/etc/systemd/system/{sched_svc}.service")
+        daemon_installed = os.path.exists(f"/etc/systemd/system/{SCHEDULER_DAEMON_SERVICE}.service")
 
         def info():
             status_out = subprocess.run(f"systemctl is-active {svc}", shell=True, capture_output=True, text=True).stdout.strip()
@@ -20,11 +21,13 @@ def manage_service_control(mgr):
                 "Service": f"{C_BOLD}{svc}{C_RESET}",
                 "Status": f"{color}{status_out}{C_RESET}",
                 "Service File": f"{C_GREEN}Installed{C_RESET}" if svc_installed else f"{C_RED}Missing{C_RESET}",
-                "Scheduler": f"{C_GREEN}Installed{C_RESET}" if sched_installed else f"{C_RED}Missing{C_RESET}"
+                "Scheduler": f"{C_GREEN}Installed{C_RESET}" if sched_installed else f"{C_RED}Missing{C_RESET}",
+                "All-Instances Scheduler": f"{C_GREEN}Installed{C_RESET}" if daemon_installed else f"{C_RED}Missing{C_RESET}"
             })
         
         svc_action_label = "Uninstall Service File" if svc_installed else "Install Service File"
         sched_action_label = "Uninstall Scheduler" if sched_installed else "Install Scheduler (Auto-Restart)"
+        daemon_action_label = "Uninstall All-Instances Scheduler" if daemon_installed else "Install All-Instances Scheduler"
 
         items = [
             ("Start Server", '1', "Start the background service."),
@@ -34,6 +37,7 @@ def manage_service_control(mgr):
             ("Scheduler Activity Logs", '5', "View the logs of the automated scheduler (restarts, backups)."),
             (svc_action_label, '6', "Install/Uninstall the systemd .service file for the main server."),
             (sched_action_label, '7', "Install/Uninstall the systemd .service file for the scheduler."),
+            (daemon_action_label, '8', f"One '{SCHEDULER_DAEMON_SERVICE}' service scheduling every instance (replaces the per-instance schedulers)."),
             ("Back", 'b', "Return to Main Menu.")
         ]
 
@@ -57,6 +61,9 @@ def manage_service_control(mgr):
         elif c == '7':
             if sched_installed: uninstall_service_file(mgr, sched_svc, is_scheduler=True)
             else: install_scheduler_service(mgr)
+        elif c == '8':
+            if daemon_installed: uninstall_service_file(mgr, SCHEDULER_DAEMON_SERVICE, is_scheduler=True)
+            else: install_scheduler_service(mgr, all_instances=True)
         elif c == 'b' or c == 'q' or c is None: return
 
 def view_scheduler_logs(mgr):
@@ -117,10 +124,15 @@ WantedBy=multi-user.target
     print(f"Service {svc_name} installed.")
     mgr.wait_input("Press Enter...")
 
-def install_scheduler_service(mgr):
+def install_scheduler_service(mgr, all_instances=False):
     if mgr.interactive: print_header("Install Scheduler")
     user = os.environ.get("USER", "root")
-    svc_name = mgr.config["service_name"] + "-scheduler"
+    if all_instances:
+        svc_name = SCHEDULER_DAEMON_SERVICE
+        args = "--scheduler --all"
+    else:
+        svc_name = mgr.config["service_name"] + "-scheduler"
+        args = f"--scheduler --instance {mgr.current_instance}"
     # Self path - tricky because now we are a package.
     # We should assume pz_manager.py wrapper is the entry.
     # Or use sys.argv[0] assuming it invoked the wrapper
@@ -133,7 +145,7 @@ After=network.target
 [Service]
 Type=simple
 User={user}
-ExecStart=/usr/bin/python3 {self_path} --scheduler --instance {mgr.current_instance}
+ExecStart=/usr/bin/python3 {self_path} {args}
 Restart=always
 
 [Install]
@@ -149,4 +161,6 @@ WantedBy=multi-user.target
     run_cmd(f"sudo systemctl enable {svc_name}", shell=True, interactive=mgr.interactive)
     run_cmd(f"sudo systemctl start {svc_name}", shell=True, interactive=mgr.interactive)
     print(f"Scheduler {svc_name} installed and started.")
+    if all_instances:
+        print(f"{C_YELLOW}Uninstall the per-instance schedulers, or instances will be restarted twice.{C_RESET}")
     mgr.wait_input("Press Enter...")
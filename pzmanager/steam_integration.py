@@ -1,58 +1,161 @@
 import json
 import os
 import time
-import urllib.request
+import threading
+import http.client
 import urllib.parse
-from datetime import datetime, timedelta
-from .const import CONFIG_DIR
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .const import CONFIG_DIR, INSTANCES_DIR
+from .utils import file_lock, atomic_write_json
 
 CACHE_FILE = os.path.join(CONFIG_DIR, "workshop_cache.json")
-CACHE_DURATION = 86400 # 24 Hours
+CACHE_DURATION = 86400 # 24 Hours, for fields without their own TTL
+CACHE_VERSION = 2
+
+# How long each field is trusted. Titles barely change, time_updated is only
+# trusted briefly (update checks force a refresh anyway).
+FIELD_TTL = {
+    "title": 7 * 86400,
+    "dependencies": CACHE_DURATION,
+    "time_updated": 3600,
+}
+DEFAULT_FIELDS = ("title", "dependencies")
+EVICT_AFTER = 7 * 86400 # Unreferenced entries are only dropped once this old
+
+STEAM_API_URL = "https://api.steampowered.com/ISteamRemoteStorage/GetPublishedFileDetails/v1/"
+CHUNK_SIZE = 50 # IDs per request
+API_WORKERS = 4 # Concurrent requests, kept low to stay friendly with the API
+API_TIMEOUT = 10
+API_RETRIES = 4 # On 429, 5xx and dropped connections
+API_BACKOFF = 1.0 # Seconds, doubled on every retry unless Retry-After says otherwise
+API_MAX_BACKOFF = 30
+
+# workshop_cache.json is shared by the menu, the schedulers and the update
+# checker. Writers take the lock, re-read the file, keep the newer copy of
+# every entry and rename a compact temp file over it, so nobody's entries get
+# lost. Readers never lock; the parsed file is kept per (path, mtime, size).
+#
+#   {"version": 2, "items": {<wid>: {title, time_updated, dependencies, fetched_at}}}
+
+_disk = {"key": None, "items": None}
+
+def _cache_key():
+    try:
+        st = os.stat(CACHE_FILE)
+        return (CACHE_FILE, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (CACHE_FILE, None, None)
+
+def _read_cache():
+    """ Items currently on disk. Treat as read-only, it is shared. """
+    key = _cache_key()
+    if _disk["items"] is not None and _disk["key"] == key:
+        return _disk["items"]
+    items = {}
+    if key[1] is not None:
+        try:
+            with open(CACHE_FILE, 'r') as f:
+                data = json.load(f)
+            # Version 1 was a flat {wid: entry} dict
+            items = data.get("items", {}) if "version" in data else data
+        except Exception:
+            items = {}
+    _disk["key"], _disk["items"] = key, items
+    return items
+
+def _newer(a, b):
+    return (a or {}).get("fetched_at", 0) >= (b or {}).get("fetched_at", 0)
+
+def referenced_workshop_ids():
+    """ WorkshopItems of every instance's server ini. """
+    ids = set()
+    if not os.path.isdir(INSTANCES_DIR):
+        return ids
+    for fname in os.listdir(INSTANCES_DIR):
+        if not fname.endswith(".json"): continue
+        try:
+            with open(os.path.join(INSTANCES_DIR, fname), 'r') as f:
+                cfg = json.load(f)
+            ini = os.path.join(cfg["install_dir"], f"Zomboid/Server/{cfg['server_name']}.ini")
+            with open(ini, 'r', errors='ignore') as f:
+                for line in f:
+                    if line.strip().startswith("WorkshopItems="):
+                        ids.update(x for x in line.split("=", 1)[1].strip().split(";") if x)
+        except (OSError, ValueError, KeyError):
+            continue
+    return ids
 
 class SteamIntegration:
-    def __init__(self):
+    def __init__(self, api_url=None, max_workers=API_WORKERS):
+        # PZ_STEAM_API_URL points every instance at another endpoint (e.g. steam_stub)
+        self.api_url = api_url or os.environ.get("PZ_STEAM_API_URL") or STEAM_API_URL
+        self.max_workers = max_workers
+        self._local = threading.local()
+        self._conns = set() # Every open worker connection, so close() can reach them
+        self._conns_lock = threading.Lock()
+        self._pool = None
         self.cache = {}
+        self._dirty = set()
+        self._cache_key = None
         self.load_cache()
 
     def load_cache(self):
-        if os.path.exists(CACHE_FILE):
-            try:
-                with open(CACHE_FILE, 'r') as f:
-                    self.cache = json.load(f)
-            except:
-                self.cache = {}
+        self.cache = dict(_read_cache())
+        self._cache_key = _cache_key()
+
+    def _sync_cache(self):
+        # Another process saved since we loaded: take its newer entries
+        if _cache_key() == self._cache_key:
+            return
+        for wid, entry in _read_cache().items():
+            if wid not in self.cache or not _newer(self.cache[wid], entry):
+                self.cache[wid] = entry
+        self._cache_key = _cache_key()
 
-    def save_cache(self):
+    def save_cache(self, evict=()):
+        """ Merges our changed entries into the file under the lock. evict: IDs to drop. """
         try:
-            os.makedirs(CONFIG_DIR, exist_ok=True)
-            with open(CACHE_FILE, 'w') as f:
-                json.dump(self.cache, f, indent=4)
-        except: pass
+            with file_lock(CACHE_FILE + ".lock"):
+                items = dict(_read_cache())
+                for wid in self._dirty:
+                    if wid in self.cache and _newer(self.cache[wid], items.get(wid)):
+                        items[wid] = self.cache[wid]
+                for wid in evict:
+                    items.pop(wid, None)
+                atomic_write_json(CACHE_FILE, {"version": CACHE_VERSION, "items": items})
+            self._dirty.clear()
+            self.cache = dict(items)
+            self._cache_key = _cache_key()
+        except Exception as e:
+            print(f"Could not save workshop cache: {e}")
 
-    def get_item_details(self, workshop_ids, force_refresh=False):
+    def _store(self, wid, data, now):
+        data['fetched_at'] = now
+        self.cache[wid] = data
+        self._dirty.add(wid)
+
+    @staticmethod
+    def is_fresh(entry, fields=DEFAULT_FIELDS, now=None):
+        if not entry: return False
+        age = (now or time.time()) - entry.get('fetched_at', 0)
+        return all(age < FIELD_TTL.get(f, CACHE_DURATION) for f in fields)
+
+    def get_item_details(self, workshop_ids, force_refresh=False, fields=DEFAULT_FIELDS):
         """
         Fetch details for a list of workshop IDs. 
         Returns a dict mapping ID (str) -> details (dict).
-        Uses cache if valid and force_refresh is False.
+        Uses cache if the requested fields are within their TTL and force_refresh is False.
         """
         now = time.time()
         results = {}
         missing_ids = []
+        self._sync_cache()
         
         # Check cache
         for wid in workshop_ids:
             wid = str(wid)
             entry = self.cache.get(wid)
-            # Entry structure in cache seems to stem from whatever _fetch_from_api returned + 'fetched_at'
-            # But the original code I replaced was storing as:
-            # { "fetched_at": ..., "key": "value" ... } mixed
-            # Wait, let's look at how I implemented _fetch_from_api in previous turns or if it's visible.
-            # In the read_file output, save_cache dumps self.cache.
-            
-            # Let's standardize on: top level cache dict keys are WIDs. 
-            # Values are dicts containing the data + 'fetched_at' timestamp.
-            
-            if not force_refresh and entry and (now - entry.get('fetched_at', 0) < CACHE_DURATION):
+            if not force_refresh and self.is_fresh(entry, fields, now):
                 results[wid] = entry
             else:
                 missing_ids.append(wid)
@@ -61,10 +164,7 @@ class SteamIntegration:
         if missing_ids:
             fetched = self._fetch_from_api(missing_ids)
             for wid, data in fetched.items():
-                # data is the clean dict from API
-                # We add our metadata
-                data['fetched_at'] = now
-                self.cache[wid] = data
+                self._store(wid, data, now)
                 results[wid] = data
             
             if fetched:
@@ -72,71 +172,183 @@ class SteamIntegration:
             
         return results
 
+    def evict_unreferenced(self, keep_ids=None):
+        """
+        Drops entries no instance uses anymore: anything outside keep_ids (default:
+        every instance's WorkshopItems) and their cached dependencies, once older
+        than EVICT_AFTER. Returns the number removed.
+        """
+        self._sync_cache()
+        keep = set(str(w) for w in (referenced_workshop_ids() if keep_ids is None else keep_ids))
+        todo = list(keep)
+        while todo:
+            for dep in self.cache.get(todo.pop(), {}).get("dependencies", []):
+                if dep not in keep:
+                    keep.add(dep)
+                    todo.append(dep)
+        now = time.time()
+        stale = [w for w, e in self.cache.items() if w not in keep and now - e.get("fetched_at", 0) > EVICT_AFTER]
+        if stale:
+            self.save_cache(evict=stale)
+        return len(stale)
+
+    def _get_pool(self):
+        # Kept for the lifetime of the object so worker connections stay open between calls
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="steam-api")
+        return self._pool
+
+    def close(self):
+        """ Stops the worker threads and closes their connections. Usable again afterwards. """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        with self._conns_lock:
+            conns, self._conns = self._conns, set()
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+    def _get_conn(self):
+        # One keep-alive connection per worker thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            u = urllib.parse.urlsplit(self.api_url)
+            cls = http.client.HTTPSConnection if u.scheme == "https" else http.client.HTTPConnection
+            conn = cls(u.netloc, timeout=API_TIMEOUT)
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.add(conn)
+        return conn
+
+    def _drop_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+            with self._conns_lock:
+                self._conns.discard(conn)
+
+    def _post(self, body):
+        """ POSTs to the API, retrying 429/5xx and dropped connections with backoff. Returns parsed JSON or None. """
+        path = urllib.parse.urlsplit(self.api_url).path or "/"
+        headers = {"Content-Type": "application/x-www-form-urlencoded", "Connection": "keep-alive"}
+        delay = API_BACKOFF
+        for attempt in range(API_RETRIES + 1):
+            retry_after = None
+            try:
+                conn = self._get_conn()
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read() # Always drain, so the connection can be reused
+                if resp.status == 200:
+                    return json.loads(data.decode('utf-8'))
+                if resp.status != 429 and resp.status < 500:
+                    print(f"Steam API Error: HTTP {resp.status}")
+                    return None
+                retry_after = resp.getheader("Retry-After")
+                err = f"HTTP {resp.status}"
+            except (http.client.HTTPException, OSError, ValueError) as e:
+                self._drop_conn()
+                err = str(e)
+            if attempt == API_RETRIES:
+                print(f"Steam API Error: {err} (gave up after {attempt + 1} tries)")
+                return None
+            try:
+                pause = float(retry_after) if retry_after else delay
+            except ValueError:
+                pause = delay
+            time.sleep(min(pause, API_MAX_BACKOFF))
+            delay *= 2
+        return None
+
+    def _fetch_chunk(self, chunk):
+        data = {
+            "itemcount": len(chunk)
+        }
+        for idx, wid in enumerate(chunk):
+            data[f"publishedfileids[{idx}]"] = str(wid)
+
+        api_results = {}
+        res_json = self._post(urllib.parse.urlencode(data).encode('utf-8'))
+        if not res_json:
+            return api_results
+
+        details = res_json.get("response", {}).get("publishedfiledetails", [])
+        for item in details:
+            if item.get("result") == 1:
+                wid = str(item.get("publishedfileid"))
+
+                # Parse Children (Dependencies)
+                # "children": [ { "publishedfileid": "..." }, ... ]
+                dependencies = []
+                if "children" in item:
+                    for child in item["children"]:
+                        dependencies.append(str(child.get("publishedfileid")))
+
+                api_results[wid] = {
+                    "title": item.get("title", "Unknown"),
+                    "time_updated": item.get("time_updated", 0),
+                    "dependencies": dependencies
+                }
+        return api_results
+
     def _fetch_from_api(self, workshop_ids):
-        # API Limit is usually around 100 items per request, but let's batch if needed
-        # For now assume list is small enough or implement simple chunking
-        chunk_size = 50
+        # Chunks of CHUNK_SIZE IDs, fetched concurrently over keep-alive connections
+        chunks = [workshop_ids[i:i+CHUNK_SIZE] for i in range(0, len(workshop_ids), CHUNK_SIZE)]
         api_results = {}
-        
-        for i in range(0, len(workshop_ids), chunk_size):
-            chunk = workshop_ids[i:i+chunk_size]
-            url = "https://api.steampowered.com/ISteamRemoteStorage/GetPublishedFileDetails/v1/"
-            data = {
-                "itemcount": len(chunk)
-            }
-            for idx, wid in enumerate(chunk):
-                data[f"publishedfileids[{idx}]"] = str(wid)
-                
-            try:
-                post_data = urllib.parse.urlencode(data).encode('utf-8')
-                req = urllib.request.Request(url, data=post_data)
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    if response.status != 200: continue
-                    res_json = json.loads(response.read().decode('utf-8'))
-                    
-                    details = res_json.get("response", {}).get("publishedfiledetails", [])
-                    for item in details:
-                        if item.get("result") == 1:
-                            wid = str(item.get("publishedfileid"))
-                            
-                            # Parse Children (Dependencies)
-                            # "children": [ { "publishedfileid": "..." }, ... ]
-                            dependencies = []
-                            if "children" in item:
-                                for child in item["children"]:
-                                    dependencies.append(str(child.get("publishedfileid")))
-                            
-                            api_results[wid] = {
-                                "title": item.get("title", "Unknown"),
-                                "time_updated": item.get("time_updated", 0),
-                                "dependencies": dependencies
-                            }
-            except Exception as e:
-                print(f"Steam API Error: {e}")
-                
+        if len(chunks) <= 1:
+            for chunk in chunks:
+                api_results.update(self._fetch_chunk(chunk))
+            return api_results
+
+        for res in self._get_pool().map(self._fetch_chunk, chunks):
+            api_results.update(res)
         return api_results
 
     def resolve_dependencies(self, workshop_ids):
         """
         Recursively finds all dependencies for the given list of workshop IDs.
         Returns a set of all required IDs (including the original ones).
+        New dependencies are requested as soon as the chunk that names them
+        returns, instead of waiting for the whole level.
         """
         resolved = set(str(x) for x in workshop_ids)
+        now = time.time()
         to_check = list(resolved)
-        
-        while to_check:
-            current_batch = to_check[:]
-            to_check = []
-            
-            # Get details for this batch
-            details = self.get_item_details(current_batch)
-            
-            for wid, info in details.items():
-                deps = info.get("dependencies", [])
-                for dep in deps:
-                    if dep not in resolved:
-                        resolved.add(dep)
-                        to_check.append(dep)
-        
+        fetched_any = False
+        self._sync_cache()
+
+        pool = self._get_pool()
+        pending = set()
+        while to_check or pending:
+            # Cached entries expand right away, the rest is fetched in chunks
+            missing = []
+            while to_check:
+                wid = to_check.pop()
+                entry = self.cache.get(wid)
+                if self.is_fresh(entry, ("dependencies",), now):
+                    self._add_deps(entry, resolved, to_check)
+                else:
+                    missing.append(wid)
+            for i in range(0, len(missing), CHUNK_SIZE):
+                pending.add(pool.submit(self._fetch_chunk, missing[i:i+CHUNK_SIZE]))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                for wid, data in fut.result().items():
+                    self._store(wid, data, now)
+                    fetched_any = True
+                    self._add_deps(data, resolved, to_check)
+
+        if fetched_any:
+            self.save_cache()
         return resolved
 
+    def _add_deps(self, info, resolved, to_check):
+        for dep in info.get("dependencies", []):
+            if dep not in resolved:
+                resolved.add(dep)
+                to_check.append(dep)
@@ -0,0 +1,192 @@
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from . import steam_integration
+from .steam_integration import SteamIntegration
+
+# Local stand-in for ISteamRemoteStorage/GetPublishedFileDetails, to exercise
+# and benchmark SteamIntegration offline.
+#
+#   python3 -m pzmanager.steam_stub --serve --port 8765
+#   PZ_STEAM_API_URL=http://127.0.0.1:8765/ISteamRemoteStorage/GetPublishedFileDetails/v1/ python3 pz_manager.py
+#   python3 -m pzmanager.steam_stub --bench --items 2000 --latency 0.08 --error-rate 0.05
+#
+# Item N (N >= 1) depends on items 2N and 2N+1 while those are <= items, so
+# resolving item 1 walks a binary tree of the whole catalogue.
+
+API_PATH = "/ISteamRemoteStorage/GetPublishedFileDetails/v1/"
+BASE_ID = 3000000000 # Keeps IDs looking like real workshop IDs
+
+class StubState:
+    def __init__(self, items=1000, latency=0.0, error_rate=0.0, seed=1):
+        self.items = items
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+
+    def details(self, wid):
+        n = int(wid) - BASE_ID
+        if not 1 <= n <= self.items:
+            return {"publishedfileid": wid, "result": 9}
+        children = [{"publishedfileid": str(BASE_ID + c)} for c in (2 * n, 2 * n + 1) if c <= self.items]
+        item = {"publishedfileid": wid, "result": 1, "title": f"Stub Mod {n}", "time_updated": 1700000000 + n}
+        if children: item["children"] = children
+        return item
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive
+
+        def setup(self):
+            super().setup()
+            with state.lock: state.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body, headers=None):
+            data = body.encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            form = urllib.parse.parse_qs(self.rfile.read(length).decode('utf-8'))
+            with state.lock:
+                state.requests += 1
+                fail = state.rng.random() < state.error_rate
+                if fail: state.errors += 1
+            if state.latency:
+                time.sleep(state.latency)
+            if self.path != API_PATH:
+                return self._send(404, "{}")
+            if fail:
+                # Alternate between rate limiting and server errors
+                if state.errors % 2:
+                    return self._send(429, "{}", {"Retry-After": "0"})
+                return self._send(503, "{}")
+            count = int(form.get("itemcount", ["0"])[0])
+            ids = [form.get(f"publishedfileids[{i}]", [""])[0] for i in range(count)]
+            body = {"response": {"result": 1, "resultcount": count,
+                                 "publishedfiledetails": [state.details(w) for w in ids]}}
+            self._send(200, json.dumps(body))
+
+    return Handler
+
+class SteamStubServer:
+    def __init__(self, host="127.0.0.1", port=0, **opts):
+        self.state = StubState(**opts)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.state))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="steam-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+# --- Benchmark ---
+
+def _legacy_resolve(si, root_ids):
+    # The previous behaviour: one chunk after another, one level after another
+    resolved = set(root_ids)
+    to_check = list(resolved)
+    while to_check:
+        batch, to_check = to_check, []
+        details = {}
+        for i in range(0, len(batch), steam_integration.CHUNK_SIZE):
+            details.update(si._fetch_chunk(batch[i:i + steam_integration.CHUNK_SIZE]))
+            si._drop_conn() # urlopen opened a new connection per request
+        for info in details.values():
+            for dep in info["dependencies"]:
+                if dep not in resolved:
+                    resolved.add(dep)
+                    to_check.append(dep)
+    return resolved
+
+def run_benchmark(items=1000, latency=0.05, error_rate=0.0, workers=steam_integration.API_WORKERS):
+    """ Resolves the dependency tree of the stub catalogue sequentially and concurrently. """
+    server = SteamStubServer(items=items, latency=latency, error_rate=error_rate).start()
+    old_cache, old_backoff = steam_integration.CACHE_FILE, steam_integration.API_BACKOFF
+    res = {}
+    try:
+        # Throwaway cache file and short backoff so runs are comparable
+        steam_integration.CACHE_FILE = tempfile.mktemp(prefix="pz_stub_cache_")
+        steam_integration.API_BACKOFF = 0.05
+        roots = [str(BASE_ID + 1)]
+
+        for name, fn in (("sequential", lambda si: _legacy_resolve(si, roots)),
+                         ("concurrent", lambda si: si.resolve_dependencies(roots))):
+            si = SteamIntegration(api_url=server.url, max_workers=1 if name == "sequential" else workers)
+            si.cache = {}
+            before = (server.state.requests, server.state.connections)
+            t0 = time.perf_counter()
+            found = fn(si)
+            res[name] = {
+                "seconds": time.perf_counter() - t0,
+                "items": len(found),
+                "requests": server.state.requests - before[0],
+                "connections": server.state.connections - before[1]
+            }
+    finally:
+        steam_integration.CACHE_FILE, steam_integration.API_BACKOFF = old_cache, old_backoff
+        server.stop()
+    return res
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Steam Web API stub / SteamIntegration benchmark")
+    parser.add_argument("--serve", action="store_true", help="Run the stub until Ctrl+C")
+    parser.add_argument("--bench", action="store_true", help="Benchmark dependency resolution")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--items", type=int, default=1000, help="Size of the synthetic catalogue")
+    parser.add_argument("--latency", type=float, default=0.05, help="Delay per request in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered 429/503")
+    parser.add_argument("--workers", type=int, default=steam_integration.API_WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        res = run_benchmark(args.items, args.latency, args.error_rate, args.workers)
+        for name, r in res.items():
+            print(f"{name:>10}: {r['items']} items in {r['seconds']:.2f}s "
+                  f"({r['requests']} requests, {r['connections']} connections)")
+        print(f"   speedup: {res['sequential']['seconds'] / res['concurrent']['seconds']:.1f}x")
+    elif args.serve:
+        server = SteamStubServer(port=args.port, items=args.items, latency=args.latency, error_rate=args.error_rate)
+        print(f"Steam API stub on {server.url}. Ctrl+C to stop.")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
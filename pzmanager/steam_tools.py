@@ -2,8 +2,12 @@ import os
 import shutil
 import json
 import re
+import io
 import subprocess
+import tempfile
+import time
 from .const import *
+from . import vdf
 from .utils import print_header, run_cmd, InteractiveMenu, safe_input
 
 def ensure_steamcmd(mgr):
@@ -104,34 +108,28 @@ def fetch_branches(mgr):
         return []
 
 def parse_branches_from_vdf(text):
-    # Rudimentary VDF parsing to find "branches" block
+    """ Branch names from an app_info_print dump (<appid> > depots > branches). """
     if not text: return []
     
-    # regex to find "branches" followed accurately by {
-    # We strip whitespace to be safe
-    
-    # 1. Try to find the branches block
-    m = re.search(r'"branches"\s*\{', text)
-    if not m: 
-        # Fallback: sometimes the dedicated server app info structure is slightly different
+    # app_info_print prints some status lines before the KeyValues block
+    m = re.search(r'"\d+"\s*\{', text)
+    if not m:
         return []
-    
-    start_idx = m.end()
-    
-    # block extraction
-    open_braces = 1
-    idx = start_idx
-    while open_braces > 0 and idx < len(text):
-        if text[idx] == '{': open_braces += 1
-        elif text[idx] == '}': open_braces -= 1
-        idx += 1
-        
-    block = text[start_idx : idx-1]
-    
-    # Find all keys that look like "branch_name" {
-    # Exclude complex nested keys if possible, but usually branches are 1 level deep
-    keys = re.findall(r'"([^"]+)"\s*\{', block)
-    return keys
+
+    branches = []
+    path = []
+    try:
+        for ev in vdf.events(io.StringIO(text[m.start():])):
+            if ev[0] == "open":
+                if path and path[-1] == "branches":
+                    branches.append(ev[1])
+                path.append(ev[1])
+            elif ev[0] == "close":
+                path.pop()
+                if not path: break # End of the app block, ignore what follows
+    except (ValueError, IndexError):
+        pass
+    return branches
 
 
 def execute_steam_update(mgr, branch, validate=False):
@@ -164,6 +162,94 @@ def execute_steam_update(mgr, branch, validate=False):
     print(f"\n{C_GREEN}Operation complete.{C_RESET}")
     mgr.wait_input("Press Enter...")
 
+# --- Workshop downloads ---
+
+# steamcmd reports every item on one line, e.g.
+#   Success. Downloaded item 2392709985 to "..." (123456 bytes)
+#   ERROR! Download item 2392709985 failed (Timeout).
+#   ERROR! Timeout downloading item 2392709985
+WORKSHOP_OK_RE = re.compile(r'Success\. Downloaded item (\d+) to .*?(?:\((\d+) bytes\))?\s*$')
+WORKSHOP_FAIL_RE = re.compile(r'ERROR! (?:Download item (\d+) failed \(([^)]*)\)|(Timeout) downloading item (\d+))')
+
+def parse_workshop_output(text):
+    """ Returns ({wid: bytes}, {wid: reason}) from steamcmd output. """
+    ok, failed = {}, {}
+    for line in (text or "").splitlines():
+        m = WORKSHOP_OK_RE.search(line)
+        if m:
+            ok[m.group(1)] = int(m.group(2) or 0)
+            failed.pop(m.group(1), None)
+            continue
+        m = WORKSHOP_FAIL_RE.search(line)
+        if m:
+            wid = m.group(1) or m.group(4)
+            if wid not in ok: failed[wid] = m.group(2) or m.group(3)
+    return ok, failed
+
+def write_workshop_script(install_dir, wids, path):
+    # One login, then every item; steamcmd runs it with +runscript
+    lines = ["@ShutdownOnFailedCommand 0", "@NoPromptForPassword 1",
+             f'force_install_dir "{install_dir}"', "login anonymous"]
+    lines += [f"workshop_download_item {APP_ID} {wid}" for wid in wids]
+    lines.append("quit")
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+def download_workshop_items(steamcmd_dir, install_dir, wids, retries=1, verbose=True):
+    """
+    Downloads many workshop items in a single steamcmd session per pass, using a
+    generated runscript. Items that failed are retried in a new session up to
+    'retries' times. Returns a dict with ok ({wid: bytes}), failed ({wid: reason}),
+    seconds, sessions and items_per_sec.
+    """
+    steam_cmd = os.path.join(steamcmd_dir, "steamcmd.sh")
+    todo = list(dict.fromkeys(str(w) for w in wids))
+    ok, failed = {}, {}
+    sessions = 0
+    start = time.time()
+
+    while todo and sessions <= retries:
+        sessions += 1
+        fd, script = tempfile.mkstemp(prefix="pz_workshop_", suffix=".txt")
+        os.close(fd)
+        try:
+            write_workshop_script(install_dir, todo, script)
+            if verbose: print(f"[SteamCMD] Session {sessions}: {len(todo)} workshop items...")
+            proc = subprocess.Popen([steam_cmd, "+runscript", script], stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, text=True, errors='ignore')
+            out = []
+            for line in proc.stdout:
+                out.append(line)
+                if verbose and ("Success. Downloaded item" in line or "ERROR!" in line):
+                    print(f"[SteamCMD] {line.strip()}")
+            proc.wait()
+        finally:
+            os.remove(script)
+
+        got, bad = parse_workshop_output("".join(out))
+        ok.update(got)
+        # Items without any result line count as failed too (session died, ...)
+        for wid in todo:
+            if wid not in got:
+                failed[wid] = bad.get(wid, f"no result (steamcmd exit {proc.returncode})")
+            else:
+                failed.pop(wid, None)
+        todo = [w for w in todo if w in failed]
+
+    seconds = time.time() - start
+    res = {
+        "ok": ok,
+        "failed": failed,
+        "seconds": seconds,
+        "sessions": sessions,
+        "bytes": sum(ok.values()),
+        "items_per_sec": len(ok) / seconds if seconds > 0 else 0.0
+    }
+    if verbose:
+        print(f"[SteamCMD] {len(ok)} downloaded, {len(failed)} failed in {seconds:.1f}s "
+              f"({res['items_per_sec']:.2f} items/s, {res['bytes'] / 1048576:.1f} MB, {sessions} session(s)).")
+    return res
+
 def detect_rcon_settings(mgr):
     sname = mgr.config.get('server_name', 'servertest')
     ini = os.path.join(mgr.config["install_dir"], f"Zomboid/Server/{sname}.ini")
@@ -0,0 +1,167 @@
+import time
+import heapq
+import itertools
+import threading
+
+# Deadline-driven job queue for the scheduler.
+#
+# Jobs sit in a heap ordered by (deadline, seq) on the monotonic clock, and the
+# loop sleeps exactly until the first one is due. Jobs tied to a wall-clock
+# time (scheduled restarts) also remember that time; if the wall clock jumps
+# away from the monotonic clock (NTP step, suspend/resume, manual change) their
+# deadlines are recomputed.
+#
+# Catch-up after a stall is deterministic: due jobs run once each, in deadline
+# order. A job with a grace period is dropped instead of run if it is more
+# than grace seconds late (stale warnings), and repeating jobs skip the ticks
+# they missed rather than firing in a burst.
+
+MAX_SLEEP = 60 # Cap on one wait, so wall clock jumps are noticed
+CLOCK_JUMP = 2.0 # Seconds of wall/monotonic disagreement treated as a jump
+
+class Job:
+    """ A queued callback. deadline is on the monotonic clock, wall is the matching time.time() (or None). """
+    __slots__ = ("name", "fn", "deadline", "wall", "grace", "interval", "seq", "cancelled")
+
+    def __init__(self, name, fn, deadline, wall=None, grace=None, interval=None):
+        self.name = name
+        self.fn = fn
+        self.deadline = deadline
+        self.wall = wall
+        self.grace = grace
+        self.interval = interval
+        self.seq = 0
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+    def __repr__(self):
+        return f"<Job {self.name} in {self.deadline - time.monotonic():.1f}s>"
+
+class TimerQueue:
+    def __init__(self, on_error=None, on_skip=None, clock=time.monotonic, wall_clock=time.time):
+        self.on_error = on_error
+        self.on_skip = on_skip
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._mark = (clock(), wall_clock())
+
+    # --- Scheduling ---
+
+    def _push(self, job):
+        with self._lock:
+            job.seq = next(self._seq)
+            heapq.heappush(self._heap, job)
+        self._wake.set()
+        return job
+
+    def call_later(self, delay, name, fn, grace=None):
+        return self._push(Job(name, fn, self.clock() + max(0, delay), grace=grace))
+
+    def call_at(self, wall_ts, name, fn, grace=None):
+        """ Runs fn at a time.time() timestamp. """
+        delay = wall_ts - self.wall_clock()
+        return self._push(Job(name, fn, self.clock() + delay, wall=wall_ts, grace=grace))
+
+    def call_every(self, interval, name, fn, first=None):
+        """ Runs fn every interval seconds, first after 'first' seconds (default: interval). """
+        delay = interval if first is None else first
+        return self._push(Job(name, fn, self.clock() + max(0, delay), interval=interval))
+
+    def cancel(self, job):
+        # Lazy removal, the job is skipped when it reaches the top
+        if job is not None:
+            job.cancelled = True
+
+    def cancel_where(self, pred):
+        """ Cancels every pending job matching pred(job). Returns how many. """
+        count = 0
+        with self._lock:
+            for job in self._heap:
+                if not job.cancelled and pred(job):
+                    job.cancelled = True
+                    count += 1
+        return count
+
+    def pending(self):
+        """ Live jobs, soonest first. """
+        with self._lock:
+            return sorted(j for j in self._heap if not j.cancelled)
+
+    # --- Running ---
+
+    def _resync(self):
+        # Wall clock moved differently from the monotonic one: re-anchor wall jobs
+        mono, wall = self.clock(), self.wall_clock()
+        last_mono, last_wall = self._mark
+        self._mark = (mono, wall)
+        if abs((wall - last_wall) - (mono - last_mono)) < CLOCK_JUMP:
+            return False
+        with self._lock:
+            for job in self._heap:
+                if job.wall is not None:
+                    job.deadline = mono + (job.wall - wall)
+            heapq.heapify(self._heap)
+        return True
+
+    def next_delay(self):
+        """ Seconds until the next live job, or None when the queue is empty. """
+        with self._lock:
+            while self._heap and self._heap[0].cancelled:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0].deadline - self.clock())
+
+    def run_due(self):
+        """ Runs every job that is due now, in deadline order. Returns the number run. """
+        self._resync()
+        now = self.clock()
+        ran = 0
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0].deadline > now:
+                    break
+                job = heapq.heappop(self._heap)
+            if job.cancelled:
+                continue
+
+            late = now - job.deadline
+            if job.grace is not None and late > job.grace:
+                if self.on_skip: self.on_skip(job, late)
+            else:
+                try:
+                    job.fn()
+                    ran += 1
+                except Exception as e:
+                    if self.on_error: self.on_error(job, e)
+
+            if job.interval and not job.cancelled:
+                # Next tick after now, skipping any that were missed
+                missed = int((self.clock() - job.deadline) // job.interval)
+                job.deadline += job.interval * (max(missed, 0) + 1)
+                self._push(job)
+        return ran
+
+    def wake(self):
+        """ Interrupts the current wait, e.g. after jobs were changed from another thread. """
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def run_forever(self):
+        self._stopped = False
+        while not self._stopped:
+            self.run_due()
+            delay = self.next_delay()
+            timeout = MAX_SLEEP if delay is None else min(delay, MAX_SLEEP)
+            self._wake.wait(timeout)
+            self._wake.clear()
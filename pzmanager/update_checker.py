@@ -1,15 +1,25 @@
 import os
-import re
+from . import vdf
 from .mod_manager import InternalModManager
 from .steam_integration import SteamIntegration
 
 class ModUpdateChecker:
     def __init__(self, mgr):
-        self.mgr = mgr
-        self.install_dir = mgr.config['install_dir']
-        # Location of appworkshop_108600.acf
-        self.acf_path = os.path.join(self.install_dir, "steamapps", "workshop", "appworkshop_108600.acf")
+        self.mgr = mgr # Can be swapped for a reloaded config, the paths follow it
         self.steam_int = SteamIntegration()
+        self.last_remote = {} # Details used by the last check()
+
+    @property
+    def install_dir(self):
+        return self.mgr.config['install_dir']
+
+    @property
+    def acf_path(self):
+        # Location of appworkshop_108600.acf
+        return os.path.join(self.install_dir, "steamapps", "workshop", "appworkshop_108600.acf")
+
+    def close(self):
+        self.steam_int.close()
 
     def get_installed_workshop_ids(self):
         # Use InternalModManager to parse .ini
@@ -20,47 +30,13 @@ class ModUpdateChecker:
 
     def parse_acf(self):
         """ Parses the ACF file to get local timestamp for each mod. """
-        if not os.path.exists(self.acf_path):
-            return {}
-        
-        local_timestamps = {}
-        
-        try:
-            with open(self.acf_path, 'r', errors='ignore') as f:
-                content = f.read()
-            
-            lines = content.split('\n')
-            current_id = None
-            in_installed = False
-            
-            for line in lines:
-                clean = line.strip()
-                if not clean: continue
-                
-                # Detect start of installed block
-                if '"WorkshopItemsInstalled"' in clean:
-                    in_installed = True
-                    continue
-                
-                # If we are in the block
-                if in_installed:
-                    m_id = re.match(r'^"(\d+)"$', clean)
-                    if m_id:
-                        current_id = m_id.group(1)
-                        continue
-                        
-                    m_time = re.match(r'^"timeupdated"\s+"(\d+)"', clean)
-                    if m_time and current_id:
-                        local_timestamps[current_id] = int(m_time.group(1))
-                        # We don't reset current_id because other keys might follow
-                        continue
-                        
-        except Exception as e:
-            print(f"Error parsing ACF: {e}")
-            
-        return local_timestamps
+        return vdf.parse_workshop_acf(self.acf_path)
 
-    def check(self):
+    def check(self, remote_data=None):
+        """
+        Returns (has_updates, ids). remote_data can be passed in when details were
+        already fetched for several instances at once.
+        """
         active_ids = self.get_installed_workshop_ids()
         if not active_ids: return False, []
         
@@ -70,9 +46,11 @@ class ModUpdateChecker:
             return False, []
             
         # Get fresh remote info
-        remote_data = self.steam_int.get_item_details(active_ids, force_refresh=True)
+        if remote_data is None:
+            remote_data = self.steam_int.get_item_details(active_ids, force_refresh=True)
         if not remote_data:
              return False, []
+        self.last_remote = remote_data
         
         updates = []
         
@@ -4,6 +4,9 @@ import subprocess
 import tty
 import termios
 import select
+import fcntl
+import json
+import contextlib
 from .const import *
 
 def get_key():
@@ -180,6 +183,74 @@ def run_cmd(cmd, shell=False, check=True, interactive=True):
             sys.exit(1)
         return None
 
+@contextlib.contextmanager
+def file_lock(lock_path, exclusive=True, blocking=True):
+    """
+    Advisory flock() on a dedicated lock file.
+    Shared locks can be held by several readers, exclusive blocks everyone else.
+    blocking=False raises BlockingIOError instead of waiting for a held lock.
+    """
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f.fileno(), (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB))
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def atomic_write_json(path, data, indent=None):
+    """
+    Writes JSON to a temp file in the same directory and renames it over path,
+    so readers never see a half written file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w') as f:
+            if indent is None:
+                json.dump(data, f, separators=(',', ':'))
+            else:
+                json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+def file_stamp(path):
+    """ (mtime_ns, size) of path, None if it doesn't exist. """
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def save_json_merged(path, data, base, indent=4):
+    """
+    Writes data to path under its lock. Keys equal to base (what we loaded or
+    last wrote) are not ours to change, so edits another process made to them
+    since are kept. base=None writes data as is.
+    Returns (what was written, its file_stamp).
+    """
+    with file_lock(path + ".lock"):
+        merged = dict(data)
+        if base is not None:
+            try:
+                with open(path, 'r') as f:
+                    disk = json.load(f)
+            except (OSError, ValueError):
+                disk = {}
+            merged = dict(disk)
+            for k, v in data.items():
+                if k not in base or base[k] != v:
+                    merged[k] = v
+            for k in base:
+                if k not in data:
+                    merged.pop(k, None)
+        atomic_write_json(path, merged, indent=indent)
+        return merged, file_stamp(path)
+
 def format_info_box(items_dict):
     import re
     if isinstance(items_dict, dict):
@@ -0,0 +1,149 @@
+import io
+import os
+import re
+
+# Streaming reader for Valve KeyValues text (.acf, .vdf, app_info_print output).
+#
+#   "AppWorkshop"
+#   {
+#       "WorkshopItemsInstalled"
+#       {
+#           "2392709985" { "size" "1234" "timeupdated" "1700000000" }
+#       }
+#   }
+#
+# The file is read in chunks and turned into a flat stream of events, so a
+# caller looking for a few keys never builds the whole tree.
+#   ("open", key)         key {
+#   ("close", None)       }
+#   ("pair", key, value)  key value
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading whitespace/comments are consumed with the token, so one match = one token.
+# Each run of whitespace and each comment (through its newline) can be matched
+# only one way; (?:\s+|//[^\n]*)* backtracked exponentially in the length of the
+# whitespace whenever the token failed, and could end a comment cut off by the
+# chunk boundary early and read the rest of it as a bare token.
+_TOKEN_RE = re.compile(r'''
+    \s*(?://[^\n]*\n\s*)*
+    (?:
+        "((?:[^"\\]|\\.)*)"     # 1 quoted
+      | (\{)                     # 2 open
+      | (\})                     # 3 close
+      | (\[[^\]\n]*\])           # 4 [$CONDITIONAL], skipped
+      | ([^\s{}"\[\]/]+(?:/(?!/)[^\s{}"\[\]/]*)*)  # 5 bare
+    )
+''', re.VERBOSE | re.DOTALL)
+_TRAILING_RE = re.compile(r'\s*(?://[^\n]*\n\s*)*(?://[^\n]*)?\Z')
+
+_ESCAPES = {"n": "\n", "t": "\t", "\\": "\\", '"': '"'}
+_ESCAPE_RE = re.compile(r'\\(.)')
+
+OPEN = "{"
+CLOSE = "}"
+
+def _unescape(s):
+    if "\\" not in s: return s
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(0)), s)
+
+def tokenize(f, chunk_size=CHUNK_SIZE):
+    """ Yields strings and OPEN/CLOSE markers from a text file object. Strings are returned as (value,) tuples. """
+    buf = ""
+    eof = False
+    while True:
+        if not eof:
+            data = f.read(chunk_size)
+            if data: buf += data
+            else: eof = True
+        pos = 0
+        n = len(buf)
+        match = _TOKEN_RE.match
+        while pos < n:
+            m = match(buf, pos)
+            # A token touching the end of the buffer may continue in the next chunk
+            if m is None or (m.end() == n and not eof):
+                if m is None and eof:
+                    if _TRAILING_RE.match(buf, pos):
+                        pos = n
+                        break
+                    raise ValueError(f"Unterminated token near: {buf[pos:pos + 40]!r}")
+                break
+            pos = m.end()
+            i = m.lastindex
+            if i == 1: yield (_unescape(m.group(1)),)
+            elif i == 5: yield (m.group(5),)
+            elif i == 2: yield OPEN
+            elif i == 3: yield CLOSE
+        buf = buf[pos:]
+        if eof and not buf:
+            return
+
+def events(f):
+    """ Yields ("open", key), ("close", None) and ("pair", key, value) events. """
+    key = None
+    for tok in tokenize(f):
+        if tok is OPEN:
+            yield ("open", key)
+            key = None
+        elif tok is CLOSE:
+            key = None
+            yield ("close", None)
+        elif key is None:
+            key = tok[0]
+        else:
+            yield ("pair", key, tok[0])
+            key = None
+
+def load(f):
+    """ Parses a whole KeyValues stream into nested dicts. Repeated keys: last one wins. """
+    root = {}
+    stack = [root]
+    for ev in events(f):
+        if ev[0] == "pair":
+            stack[-1][ev[1]] = ev[2]
+        elif ev[0] == "open":
+            d = {}
+            stack[-1][ev[1]] = d
+            stack.append(d)
+        elif len(stack) > 1:
+            stack.pop()
+    return root
+
+def loads(text):
+    return load(io.StringIO(text))
+
+# --- Workshop ACF ---
+
+# path -> ((mtime_ns, size), {wid: timeupdated}); an unchanged ACF costs one stat
+_acf_cache = {}
+
+def parse_workshop_acf(path):
+    """ {workshop id: timeupdated} from the WorkshopItemsInstalled block of an appworkshop ACF. """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}
+    stamp = (st.st_mtime_ns, st.st_size)
+    hit = _acf_cache.get(path)
+    if hit and hit[0] == stamp:
+        return dict(hit[1])
+
+    local_timestamps = {}
+    try:
+        path_keys = []
+        with open(path, 'r', errors='ignore') as f:
+            for ev in events(f):
+                if ev[0] == "open":
+                    path_keys.append(ev[1])
+                elif ev[0] == "close":
+                    if path_keys: path_keys.pop()
+                # ... "WorkshopItemsInstalled" { "<id>" { "timeupdated" "<ts>" } }
+                elif ev[1] == "timeupdated" and len(path_keys) >= 2 and path_keys[-2] == "WorkshopItemsInstalled":
+                    local_timestamps[path_keys[-1]] = int(ev[2])
+    except Exception as e:
+        print(f"Error parsing ACF: {e}")
+        return local_timestamps
+
+    _acf_cache[path] = (stamp, local_timestamps)
+    return dict(local_timestamps)
@@ -0,0 +1,68 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from pzmanager import core
+
+class BrokenConfigTest(unittest.TestCase):
+    """ An unreadable instance file is reported and left alone, never replaced with defaults. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        inst = os.path.join(self.tmp, "instances")
+        self.path = os.path.join(inst, "a.json")
+        for name, value in (("INSTANCES_DIR", inst), ("GLOBAL_CONFIG_FILE", os.path.join(self.tmp, "global.json")),
+                            ("OLD_CONFIG_FILE", os.path.join(self.tmp, "config.json"))):
+            p = mock.patch.object(core, name, value)
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _load(self):
+        return core.PZManager(interactive=False, instance_name="a", remember_instance=False)
+
+    def _edit(self, text):
+        with open(self.path, 'w') as f:
+            f.write(text)
+        os.utime(self.path, ns=(0, 0)) # New stamp even within the same mtime tick
+
+    def test_missing_file_gets_defaults(self):
+        mgr = self._load()
+        self.assertIsNone(mgr.config_error)
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)["install_dir"], core.DEFAULT_INSTALL_DIR)
+
+    def test_reload_keeps_config(self):
+        mgr = self._load()
+        mgr.config.update(install_dir="/srv/pz", rcon_password="secret")
+        mgr.save_config()
+        broken = '{"install_dir": "/srv/pz2",, "rcon_password": "secret"}'
+        self._edit(broken)
+
+        self.assertIsNotNone(mgr.reload_if_changed())
+        self.assertTrue(mgr.config_error)
+        self.assertEqual((mgr.config["install_dir"], mgr.config["rcon_password"]), ("/srv/pz", "secret"))
+        self.assertFalse(mgr.save_config())
+        with open(self.path) as f:
+            self.assertEqual(f.read(), broken)
+
+        # Fixed by hand: picked up as usual
+        self._edit('{"install_dir": "/srv/pz2", "rcon_password": "secret"}')
+        mgr.reload_if_changed()
+        self.assertIsNone(mgr.config_error)
+        self.assertEqual(mgr.config["install_dir"], "/srv/pz2")
+
+    def test_fresh_load_of_broken_file(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._edit('{"install_dir": ')
+        mgr = self._load()
+        self.assertTrue(mgr.config_error)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), '{"install_dir": ')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from pzmanager import map_footprint
+
+class EmptyCellsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.mgr = SimpleNamespace(config={"install_dir": self.tmp, "server_name": "servertest"})
+        save = os.path.join(self.tmp, "Zomboid/Saves/Multiplayer/servertest")
+        os.makedirs(save)
+        for name in ("map_0_0.bin", "map_3_2.bin"):
+            open(os.path.join(save, name), 'wb').close()
+        p = mock.patch.object(map_footprint, "CACHE_FILE", os.path.join(self.tmp, "cache.json"))
+        p.start()
+        self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_zero_byte_cells(self):
+        fp = map_footprint.run_report(self.mgr)
+        self.assertEqual(fp.files, 2)
+        self.assertEqual(map_footprint.heatmap(fp), [])
+
+    def test_unwritable_out(self):
+        out = os.path.join(self.tmp, "missing", "cells.csv")
+        self.assertIsNotNone(map_footprint.run_report(self.mgr, out=out))
+        self.assertFalse(os.path.exists(out))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from pzmanager import map_prune
+
+class DeleteStaleTest(unittest.TestCase):
+    """ Deleting what a dry run listed, not a fresh scan. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.mgr = SimpleNamespace(config={"install_dir": self.tmp, "server_name": "servertest"})
+        self.save = os.path.join(self.tmp, "Zomboid/Saves/Multiplayer/servertest")
+        os.makedirs(self.save)
+        old = time.time() - 60 * 86400
+        for x in range(3):
+            for prefix in ("map", "chunkdata"):
+                self._write(f"{prefix}_{x}_0.bin", old)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, name, mtime=None):
+        p = os.path.join(self.save, name)
+        with open(p, 'wb') as f:
+            f.write(b"x" * 10)
+        if mtime is not None:
+            os.utime(p, (mtime, mtime))
+
+    def test_only_confirmed_cells(self):
+        stats = map_prune.prune_stale_cells(self.mgr, days=30, dry_run=True)
+        self.assertEqual(sorted(stats["stale"]), [(0, 0), (1, 0), (2, 0)])
+        # Between the dry run and the confirmation: one cell is visited, one goes stale
+        self._write("map_1_0.bin")
+        self._write("map_5_0.bin", time.time() - 60 * 86400)
+
+        stats = map_prune.delete_stale(stats)
+        self.assertEqual((stats["deleted"], stats["skipped"], stats["errors"]), (4, 1, []))
+        self.assertEqual(sorted(os.listdir(self.save)), ["chunkdata_1_0.bin", "map_1_0.bin", "map_5_0.bin"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from pzmanager import archive_writer, partial_restore
+
+class StreamingFallbackTest(unittest.TestCase):
+    """ Partial restore of archives without a member index. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.data = os.path.join(self.tmp, "Zomboid")
+        self.save = os.path.join(self.data, "Saves/Multiplayer/servertest")
+        os.makedirs(self.save)
+        # Random payload, so the tar stream spans several compressed blocks
+        for x in range(6):
+            with open(os.path.join(self.save, f"map_{x}_0.bin"), 'wb') as f:
+                f.write(os.urandom(200 * 1024))
+        with open(os.path.join(self.save, "players.db"), 'wb') as f:
+            f.write(b"players")
+        self.old_block = archive_writer.BLOCK_SIZE
+        archive_writer.BLOCK_SIZE = 64 * 1024
+
+    def tearDown(self):
+        archive_writer.BLOCK_SIZE = self.old_block
+        shutil.rmtree(self.tmp)
+
+    def _restore(self, archive):
+        dest = os.path.join(self.tmp, "out")
+        select = partial_restore.build_selector("Zomboid/Saves/Multiplayer/servertest", rects=[(4, 0, 5, 0)])
+        count = partial_restore.restore_selected(archive, select, dest)
+        return count, dest
+
+    def _check(self, count, dest):
+        self.assertEqual(count, 2)
+        for x in (4, 5):
+            rel = f"Saves/Multiplayer/servertest/map_{x}_0.bin"
+            with open(os.path.join(dest, "Zomboid", rel), 'rb') as a, open(os.path.join(self.data, rel), 'rb') as b:
+                self.assertEqual(a.read(), b.read())
+        self.assertFalse(os.path.exists(os.path.join(dest, "Zomboid/Saves/Multiplayer/servertest/map_0_0.bin")))
+
+    def test_parallel_archive_without_index(self):
+        for codec in archive_writer.CODECS:
+            with self.subTest(codec=codec):
+                archive = os.path.join(self.tmp, "backup" + archive_writer.get_extension(codec))
+                archive_writer.write_archive(self.data, archive, codec=codec, level=1, workers=2)
+                os.remove(archive + archive_writer.INDEX_SUFFIX)
+                self._check(*self._restore(archive))
+                shutil.rmtree(os.path.join(self.tmp, "out"))
+
+    def test_plain_tar(self):
+        for mode, ext in (("w:gz", ".tar.gz"), ("w", ".tar")):
+            with self.subTest(mode=mode):
+                archive = os.path.join(self.tmp, "plain" + ext)
+                with tarfile.open(archive, mode) as tar:
+                    tar.add(self.data, arcname="Zomboid")
+                self._check(*self._restore(archive))
+                shutil.rmtree(os.path.join(self.tmp, "out"))
+
+if __name__ == "__main__":
+    unittest.main()
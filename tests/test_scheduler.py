@@ -0,0 +1,72 @@
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from pzmanager import scheduler
+from pzmanager.timer_queue import TimerQueue
+
+class FakeRCON:
+    def __init__(self):
+        self.sent = []
+    def broadcast(self, msg):
+        self.sent.append(msg)
+        return True
+    def tick(self): pass
+    def close(self): pass
+
+class FakeChecker:
+    def __init__(self, mgr): self.mgr = mgr
+    def close(self): pass
+
+class RestartWorkerTest(unittest.TestCase):
+    """ A slow restart of one instance must not hold up the queue. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.restarted = []
+        def slow_restart(mgr, inst):
+            time.sleep(0.5) # Stop, backup, start
+            self.restarted.append(inst)
+        for name, value in (("LOGS_DIR", self.tmp), ("ModUpdateChecker", FakeChecker),
+                            ("create_rcon_session", lambda mgr: FakeRCON()),
+                            ("announce_restart_now", lambda mgr, rcon, msg: None),
+                            ("restart_service_process", slow_restart)):
+            p = mock.patch.object(scheduler, name, value)
+            p.start()
+            self.addCleanup(p.stop)
+        self.queue = TimerQueue()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _sched(self, name):
+        mgr = SimpleNamespace(current_instance=name, config={"restart_times": []})
+        return scheduler.InstanceScheduler(mgr, self.queue, mod_check=False)
+
+    def test_other_instance_runs_on_time(self):
+        a, b = self._sched("a"), self._sched("b")
+        now = self.queue.wall_clock()
+        a.request_restart(now + 0.1, "mods", [])
+        ran = []
+        # Stands in for one of b's warnings, due while a is still restarting
+        self.queue.call_later(0.3, "b:warn", lambda: ran.append(time.monotonic()), grace=0.1)
+        t0 = time.monotonic()
+
+        runner = threading.Thread(target=self.queue.run_forever)
+        runner.start()
+        time.sleep(0.9)
+        self.queue.stop()
+        runner.join()
+
+        self.assertEqual(len(ran), 1)
+        self.assertLess(ran[0] - t0, 0.45)
+        self.assertEqual(self.restarted, ["a"])
+        self.assertFalse(a.restarting)
+        self.assertGreater(a.last_restart, now)
+        a.close(); b.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from pzmanager import backup_tools, backup_catalog
+
+class SnapshotTest(unittest.TestCase):
+    """ Snapshot backups are named after the snapshot, and leftovers are swept. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.backups = os.path.join(self.tmp, "backups")
+        os.makedirs(os.path.join(self.tmp, "server", "Zomboid", "Saves"))
+        with open(os.path.join(self.tmp, "server", "Zomboid", "Saves", "map_0_0.bin"), 'wb') as f:
+            f.write(b"cell")
+        self.mgr = SimpleNamespace(current_instance="a", interactive=False, config={
+            "install_dir": os.path.join(self.tmp, "server"), "backup_dir": self.backups,
+            "backup_format": "parallel", "backup_retention": 10})
+        catalog = os.path.join(self.tmp, "catalog.json")
+        for name, value in (("CATALOG_FILE", catalog), ("LOCK_FILE", catalog + ".lock")):
+            p = mock.patch.object(backup_catalog, name, value)
+            p.start()
+            self.addCleanup(p.stop)
+        self.staging = backup_tools.get_staging_dir(self.mgr)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _backups(self):
+        return sorted(n for n in os.listdir(self.backups) if n.endswith(".tar.gz"))
+
+    def test_archive_named_after_snapshot(self):
+        snap = backup_tools.create_snapshot(self.mgr)
+        ts = os.path.basename(os.path.dirname(snap))[len("a_"):]
+        with mock.patch.object(backup_tools, "datetime") as dt:
+            dt.now.return_value.strftime.return_value = "20991231_235959" # Archived much later
+            backup_tools.archive_snapshot(self.mgr, snap)
+        self.assertEqual(self._backups(), [f"pz_backup_a_auto_{ts}.tar.gz"])
+        self.assertEqual(os.listdir(self.staging), [])
+
+    def test_sweep_leftovers(self):
+        done = os.path.join(self.staging, "a_20260101_000000")
+        shutil.copytree(os.path.join(self.tmp, "server", "Zomboid"), os.path.join(done, "Zomboid"))
+        open(os.path.join(done, backup_tools.SNAPSHOT_COMPLETE), 'w').close()
+        cut_off = os.path.join(self.staging, "a_20260102_000000")
+        os.makedirs(os.path.join(cut_off, "Zomboid"))
+        busy = os.path.join(self.staging, "a_20260103_000000")
+        os.makedirs(os.path.join(busy, "Zomboid"))
+        other = os.path.join(self.staging, "b_20260101_000000")
+        os.makedirs(other)
+
+        msgs = []
+        with backup_tools._snapshot_lock(busy): # Another process is still copying it
+            self.assertEqual(backup_tools.sweep_snapshots(self.mgr, on_done=msgs.append), 2)
+            backup_tools.wait_for_background_archives()
+
+        self.assertEqual(self._backups(), ["pz_backup_a_auto_20260101_000000.tar.gz"])
+        left = sorted(n for n in os.listdir(self.staging) if os.path.isdir(os.path.join(self.staging, n)))
+        self.assertEqual(left, ["a_20260103_000000", "b_20260101_000000"])
+        self.assertEqual(len(msgs), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import io
+import time
+import unittest
+from pzmanager import vdf
+
+ACF = """"AppWorkshop"
+{
+\t"WorkshopItemsInstalled"
+\t{
+\t\t"2392709985"
+\t\t{
+\t\t\t"size"\t\t"1234" // bytes
+\t\t\t"timeupdated"\t\t"1700000000"
+\t\t}
+\t}
+}
+"""
+
+class TokenizeTest(unittest.TestCase):
+
+    def test_every_chunk_split(self):
+        # Each split point, including inside indented quoted strings and the comment
+        whole = list(vdf.tokenize(io.StringIO(ACF)))
+        self.assertEqual(vdf.loads(ACF)["AppWorkshop"]["WorkshopItemsInstalled"]["2392709985"]["timeupdated"], "1700000000")
+        for size in range(1, 40):
+            self.assertEqual(list(vdf.tokenize(io.StringIO(ACF), chunk_size=size)), whole, f"chunk_size={size}")
+
+    def test_split_after_long_indent(self):
+        # A chunk ending inside a quoted token after deep indentation used to backtrack exponentially
+        text = "{\n" + " " * 64 + '"key" "value"\n}\n'
+        t0 = time.time()
+        toks = list(vdf.tokenize(io.StringIO(text), chunk_size=70))
+        self.assertLess(time.time() - t0, 1.0)
+        self.assertEqual(toks, [vdf.OPEN, ("key",), ("value",), vdf.CLOSE])
+
+    def test_unterminated(self):
+        t0 = time.time()
+        with self.assertRaises(ValueError):
+            list(vdf.tokenize(io.StringIO(" " * 64 + '"abc'), chunk_size=16))
+        self.assertLess(time.time() - t0, 1.0)
+
+if __name__ == "__main__":
+    unittest.main()